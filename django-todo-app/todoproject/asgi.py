@@ -10,7 +10,16 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 import os
 
 from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'todoproject.settings')
+# Serve the live event stream (todos.views.todo_events); see settings.
+os.environ.setdefault('TODO_LIVE_EVENTS', '1')
 
 application = get_asgi_application()
+
+from todos.warmup import preload  # noqa: E402
+
+# The warm-up requests run through a WSGI handler; what they warm (URLs,
+# templates, translations) is shared by the whole process.
+preload(get_wsgi_application())
@@ -0,0 +1,21 @@
+"""
+Gunicorn configuration: ``gunicorn -c todoproject/gunicorn.conf.py``.
+
+The master imports the application once (``preload_app``), which warms it
+up (todos/warmup.py), and then forks the workers, so each starts with URLs,
+templates and reference data loaded and only opens its own database
+connections. Set PORT and WEB_CONCURRENCY to override the defaults.
+"""
+import multiprocessing
+import os
+
+
+wsgi_app = 'todoproject.wsgi:application'
+bind = f'0.0.0.0:{os.environ.get("PORT", "8000")}'
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+preload_app = True
+
+
+def post_fork(server, worker):
+    from todos.warmup import after_fork
+    after_fork()
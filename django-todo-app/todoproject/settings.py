@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'todos.middleware.PrecompressedStaticMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -75,13 +77,139 @@ WSGI_APPLICATION = 'todoproject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connections are kept for CONN_MAX_AGE seconds, so the ones a worker opens
+# at startup (todos/warmup.py) serve its first requests.
+CONN_MAX_AGE = int(os.environ.get('DJANGO_CONN_MAX_AGE', '60'))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# Owner sharding for the todos app (see todos/routers.py). Set
+# TODO_SHARD_COUNT=N to spread owners across N SQLite files; migrate each
+# extra shard with `python manage.py migrate --database shard<i>`.
+TODO_SHARDS = ['default']
+for shard_index in range(1, int(os.environ.get('TODO_SHARD_COUNT', '1'))):
+    DATABASES[f'shard{shard_index}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / f'db_shard{shard_index}.sqlite3',
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+    }
+    TODO_SHARDS.append(f'shard{shard_index}')
+
+DATABASE_ROUTERS = ['todos.routers.OwnerShardRouter']
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+#
+# The default cache carries the invalidation version keys of the TODO
+# reference-data cache (todos/cache.py) and the cached list counts
+# (todos/pagination.py). LocMemCache is per process, so with several worker
+# processes (todoproject/gunicorn.conf.py) set DJANGO_REDIS_URL to share
+# them (needs the redis package).
+
+if os.environ.get('DJANGO_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['DJANGO_REDIS_URL'],
+        }
     }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Sessions and flash messages
+# https://docs.djangoproject.com/en/5.2/topics/http/sessions/
+#
+# TODO_SESSION_MODE=db (default) keeps Django's database sessions.
+# "cached_db" reads sessions through the cache and only writes the table on
+# change; "cache" keeps them in the cache alone (shared backend required with
+# several processes, and sessions are lost when it is flushed). Both modes
+# keep flash messages in a signed cookie so the write paths never touch
+# django_session. Compare with `manage.py measure_requests`.
+
+TODO_SESSION_MODE = os.environ.get('TODO_SESSION_MODE', 'db')
+if TODO_SESSION_MODE == 'cache':
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
+elif TODO_SESSION_MODE == 'cached_db':
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+if TODO_SESSION_MODE != 'db':
+    MESSAGE_STORAGE = 'django.contrib.messages.storage.cookie.CookieStorage'
+
+# Maximum categories held per process, how many seconds a process may serve
+# a row before re-checking the version key, and how many seconds it may
+# serve a row at all (the bound when the cache is not shared).
+TODO_REFERENCE_CACHE_SIZE = 5000
+TODO_REFERENCE_CACHE_TTL = 5
+TODO_REFERENCE_CACHE_MAX_AGE = 60
+
+# The sync feed (/api/changes/) holds back changes younger than this many
+# seconds so slow transactions commit before a cursor moves past them.
+TODO_SYNC_SETTLE_SECONDS = 1
+
+# Webhook delivery and the outbox event backend likewise read only outbox
+# events older than this many seconds.
+TODO_OUTBOX_SETTLE_SECONDS = 1
+
+# Resolved TODOs unchanged for this many days are moved to the archive
+# table by `manage.py archive_todos` (run it from cron).
+TODO_ARCHIVE_AFTER_DAYS = 90
+
+# `manage.py purge_todos` enforces the retention policies (see the admin) and
+# drops sync tombstones older than this; sync clients idle for longer must
+# do a full resync.
+TODO_TOMBSTONE_RETENTION_DAYS = 30
+# ... and outbox events older than this, delivered or not.
+TODO_OUTBOX_RETENTION_DAYS = 7
+
+# `manage.py send_reminders` reports TODOs due within the lead time and
+# TODOs that became overdue. The sink is any class with a send(reminders)
+# method: todos.reminders.LogSink, FileSink (path=...) or EmailSink, which
+# uses EMAIL_BACKEND.
+TODO_REMINDER_LEAD_MINUTES = 60
+TODO_REMINDER_SINK = 'todos.reminders.LogSink'
+TODO_REMINDER_SINK_OPTIONS = {}
+
+# TODO forms warn about existing TODOs whose titles are at least this
+# similar (shared trigrams, 0 to 1); `manage.py dedup_report` lists them all.
+TODO_DUPLICATE_THRESHOLD = 0.5
+
+# Seconds of database time the list page and the JSON list API may spend
+# on their user-controlled queries (SQLite and PostgreSQL abort the query,
+# and the page asks for a narrower search). Keys are URL names.
+TODO_QUERY_BUDGETS = {
+    'default': 2.0,
 }
 
+# List and API page counts are cached until the owner's TODOs change; counts
+# of at least this many rows are then shown as estimates ("about 120,000")
+# for a few minutes instead of being recounted after every change.
+TODO_APPROXIMATE_COUNT_FROM = 10000
+
+# Live list updates (server-sent events, served under ASGI). LocalBackend
+# only reaches streams in the process that made the change; with several
+# server processes use todos.events.OutboxBackend, which polls the outbox
+# every TODO_EVENT_POLL_INTERVAL seconds.
+TODO_EVENT_BACKEND = 'todos.events.LocalBackend'
+TODO_EVENT_POLL_INTERVAL = 1
+
+# The stream holds a worker for as long as a page is open, so it is only
+# served (and only subscribed to by list pages) when this is on:
+# todoproject/asgi.py turns it on, WSGI servers (runserver, gunicorn) leave
+# it off and /events/ answers 204 No Content.
+TODO_LIVE_EVENTS = os.environ.get('TODO_LIVE_EVENTS', '0') == '1'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -118,6 +246,31 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/5.2/howto/static-files/
 
 STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# Outside DEBUG, `collectstatic` fingerprints file names and writes .gz (and
+# .br with the brotli package installed) variants next to them. Without a
+# CDN or web server in front, TODO_SERVE_STATIC serves STATIC_ROOT from the
+# app (todos/middleware.py) with far-future caching for fingerprinted names.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG
+            else 'todos.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+TODO_SERVE_STATIC = not DEBUG
+
+# Serving processes load URLs and templates and run TODO_WARMUP_PATHS before
+# their first request, and workers open their database connections as they
+# start (todos/warmup.py, todoproject/gunicorn.conf.py). TODO_WARMUP=0/1 in
+# the environment overrides the default (on outside DEBUG).
+TODO_WARMUP = os.environ.get('TODO_WARMUP', '0' if DEBUG else '1') == '1'
+TODO_WARMUP_PATHS = ('/',)
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'todoproject.settings')
 
 application = get_wsgi_application()
+
+from todos.warmup import preload  # noqa: E402
+
+preload(application)
@@ -1,21 +1,123 @@
-from django.contrib import admin
-from .models import Todo, Category, Tag
+from datetime import datetime
+
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin import helpers
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from django.utils.html import format_html
+from . import archive, bulk
+from .models import ArchivedTodo, RetentionPolicy, Todo, Category, Tag, WebhookEndpoint
+from .pagination import CachedCountPaginator, touch_owners_of
+
+
+class TodoActionForm(helpers.ActionForm):
+    # Names, not rows: categories and tags belong to an owner, so they are
+    # looked up per owner of the selected TODOs (see TodoAdmin.per_owner).
+    category = forms.CharField(
+        required=False,
+        help_text='Category name; leave empty to clear',
+    )
+    tags = forms.CharField(
+        required=False,
+        help_text='Comma-separated tag names',
+    )
+
+
+class CreatedMonthFilter(admin.SimpleListFilter):
+    """
+    Month drill-down for ``created_at``.
+
+    Unlike ``date_hierarchy`` this never runs ``SELECT DISTINCT`` over the
+    table: the month choices come from two index seeks (oldest and newest
+    row) and the selected month is applied as an indexed range.
+    """
+    title = 'created month'
+    parameter_name = 'created_month'
+    max_months = 24
+
+    def lookups(self, request, model_admin):
+        dates = model_admin.get_queryset(request).order_by('created_at')
+        first = dates.values_list('created_at', flat=True).first()
+        last = dates.reverse().values_list('created_at', flat=True).first()
+        if first is None:
+            return []
+        first, last = timezone.localtime(first), timezone.localtime(last)
+        year, month = last.year, last.month
+        choices = []
+        while (year, month) >= (first.year, first.month) and len(choices) < self.max_months:
+            choices.append((f'{year}-{month:02d}', f'{year}-{month:02d}'))
+            year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+        return choices
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        try:
+            start = datetime.strptime(self.value(), '%Y-%m')
+        except ValueError:
+            return queryset
+        if start.month == 12:
+            end = start.replace(year=start.year + 1, month=1)
+        else:
+            end = start.replace(month=start.month + 1)
+        return queryset.filter(
+            created_at__gte=timezone.make_aware(start),
+            created_at__lt=timezone.make_aware(end),
+        )
+
+
+class CategoryIdFilter(admin.SimpleListFilter):
+    """
+    Filter by category id, set from the links in the category column.
+
+    ``RelatedFieldListFilter`` would load every category of every owner on
+    each changelist render; this one only looks up the selected category.
+    """
+    title = 'category'
+    parameter_name = 'category'
+
+    def lookups(self, request, model_admin):
+        if not (self.value() or '').isdigit():
+            return []
+        name = Category.objects.filter(pk=self.value()).values_list('name', flat=True).first()
+        return [(self.value(), name or f'#{self.value()}')]
+
+    def queryset(self, request, queryset):
+        if (self.value() or '').isdigit():
+            return queryset.filter(category_id=self.value())
+        return queryset
 
 
 @admin.register(Todo)
 class TodoAdmin(admin.ModelAdmin):
-    list_display = ['title', 'category', 'due_date', 'is_resolved', 'created_at']
-    list_filter = ['is_resolved', 'category', 'created_at']
-    search_fields = ['title', 'description']
-    date_hierarchy = 'created_at'
+    # The admin works on the default database; with several TODO_SHARDS it
+    # only sees the owners placed on the first shard.
+    list_display = ['title', 'owner', 'category_link', 'due_date', 'is_resolved', 'created_at']
+    list_filter = ['is_resolved', CategoryIdFilter, CreatedMonthFilter]
+    list_select_related = ['owner', 'category']
+    search_fields = ['title']
+    search_help_text = 'Search by title prefix or exact ID.'
     ordering = ['-created_at']
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+    action_form = TodoActionForm
+    actions = [
+        'resolve_selected',
+        'reopen_selected',
+        'set_category',
+        'add_tags',
+        'remove_tags',
+        'purge_selected',
+    ]
+    bulk_chunk_size = bulk.CHUNK_SIZE
     
     fieldsets = (
         ('Basic Information', {
             'fields': ('title', 'description')
         }),
         ('Details', {
-            'fields': ('category', 'tags', 'due_date', 'is_resolved')
+            'fields': ('owner', 'category', 'tags', 'due_date', 'is_resolved')
         }),
         ('Timestamps', {
             'fields': ('created_at', 'updated_at'),
@@ -24,16 +126,193 @@ class TodoAdmin(admin.ModelAdmin):
     )
     
     readonly_fields = ['created_at', 'updated_at']
-    filter_horizontal = ['tags']
+    autocomplete_fields = ['owner', 'category', 'tags']
+    
+    @admin.display(description='category', ordering='category__name')
+    def category_link(self, obj):
+        if obj.category is None:
+            return '-'
+        return format_html(
+            '<a href="?{}={}">{}</a>', CategoryIdFilter.parameter_name, obj.category_id, obj.category,
+        )
+    
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        results = queryset.title_prefix(search_term)
+        if search_term.isdigit():
+            results |= queryset.filter(pk=int(search_term))
+        return results, False
+    
+    def get_actions(self, request):
+        # delete_selected collects and deletes every object individually;
+        # purge_selected replaces it with chunked set-based deletes.
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+    
+    def report_bulk(self, request, verb, result):
+        self.message_user(
+            request,
+            f'{verb} {result.rows} TODOs in {result.batches} batch(es) '
+            f'of up to {self.bulk_chunk_size}.',
+        )
+    
+    def per_owner(self, queryset):
+        """Yield ``(owner_id, todos)`` for each owner of the selected TODOs."""
+        owner_ids = queryset.order_by().values_list('owner_id', flat=True).distinct()
+        for owner_id in list(owner_ids):
+            yield owner_id, queryset.filter(owner_id=owner_id)
+    
+    def combine(self, results):
+        return bulk.BulkResult(sum(r.rows for r in results), sum(r.batches for r in results))
+    
+    def report_skipped(self, request, skipped, missing):
+        if skipped:
+            self.message_user(
+                request,
+                f'Skipped the TODOs of {skipped} owner(s) without {missing}.',
+                messages.WARNING,
+            )
+    
+    def selected_tag_names(self, request):
+        return [
+            name.strip()
+            for name in request.POST.get('tags', '').split(',')
+            if name.strip()
+        ]
+    
+    def owner_tags(self, queryset, owner_id, names):
+        return list(Tag.objects.using(queryset.db).filter(owner_id=owner_id, name__in=names))
+    
+    @admin.action(description='Mark selected TODOs as resolved', permissions=['change'])
+    def resolve_selected(self, request, queryset):
+        result = bulk.update_todos(queryset, self.bulk_chunk_size, is_resolved=True)
+        self.report_bulk(request, 'Resolved', result)
+    
+    @admin.action(description='Reopen selected TODOs', permissions=['change'])
+    def reopen_selected(self, request, queryset):
+        result = bulk.update_todos(queryset, self.bulk_chunk_size, is_resolved=False)
+        self.report_bulk(request, 'Reopened', result)
+    
+    @admin.action(description='Move selected TODOs to the named category', permissions=['change'])
+    def set_category(self, request, queryset):
+        name = request.POST.get('category', '').strip()
+        results, skipped = [], 0
+        for owner_id, todos in self.per_owner(queryset):
+            category = None
+            if name:
+                category = Category.objects.using(queryset.db).filter(owner_id=owner_id, name=name).first()
+                if category is None:
+                    skipped += 1
+                    continue
+            results.append(bulk.update_todos(todos, self.bulk_chunk_size, category=category))
+        self.report_bulk(request, 'Recategorized', self.combine(results))
+        self.report_skipped(request, skipped, f'a category named {name!r}')
+    
+    @admin.action(description='Add the given tags to selected TODOs', permissions=['change'])
+    def add_tags(self, request, queryset):
+        self.change_tags(request, queryset, bulk.add_tags, 'Tagged')
+    
+    @admin.action(description='Remove the given tags from selected TODOs', permissions=['change'])
+    def remove_tags(self, request, queryset):
+        self.change_tags(request, queryset, bulk.remove_tags, 'Untagged')
+    
+    def change_tags(self, request, queryset, operation, verb):
+        names = self.selected_tag_names(request)
+        if not names:
+            self.message_user(request, 'Enter at least one existing tag name.', messages.WARNING)
+            return
+        results, skipped = [], 0
+        for owner_id, todos in self.per_owner(queryset):
+            tags = self.owner_tags(queryset, owner_id, names)
+            if not tags:
+                skipped += 1
+                continue
+            results.append(operation(todos, tags, self.bulk_chunk_size))
+        self.report_bulk(request, verb, self.combine(results))
+        self.report_skipped(request, skipped, 'any of these tags')
+    
+    @admin.action(description='Purge selected TODOs', permissions=['delete'])
+    def purge_selected(self, request, queryset):
+        if request.POST.get('post'):
+            result = bulk.delete_todos(queryset, self.bulk_chunk_size)
+            self.report_bulk(request, 'Purged', result)
+            return None
+        select_across = request.POST.get('select_across') == '1'
+        return TemplateResponse(request, 'admin/todos/todo/purge_confirmation.html', {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Are you sure?',
+            'count': queryset.count(),
+            'objects_name': self.model._meta.verbose_name_plural,
+            'select_across': select_across,
+            'selected': request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
+        })
+
+
+@admin.register(ArchivedTodo)
+class ArchivedTodoAdmin(admin.ModelAdmin):
+    list_display = ['title', 'owner', 'category', 'created_at', 'archived_at']
+    list_select_related = ['owner', 'category']
+    search_fields = ['title']
+    search_help_text = 'Search by title prefix or exact ID.'
+    ordering = ['-archived_at']
+    paginator = CachedCountPaginator
+    show_full_result_count = False
+    actions = ['restore_selected']
+    readonly_fields = ['id', 'created_at', 'updated_at', 'archived_at']
+    
+    get_search_results = TodoAdmin.get_search_results
+    
+    def has_add_permission(self, request):
+        return False
+    
+    # Archived rows are listed with ?archived=1, so deleting them moves the
+    # owners' dataset versions on like any other change.
+    def delete_model(self, request, obj):
+        touch_owners_of(ArchivedTodo.objects.using(obj._state.db).filter(pk=obj.pk))
+        super().delete_model(request, obj)
+    
+    def delete_queryset(self, request, queryset):
+        touch_owners_of(queryset)
+        super().delete_queryset(request, queryset)
+    
+    @admin.action(description='Restore selected TODOs', permissions=['change'])
+    def restore_selected(self, request, queryset):
+        result = archive.restore_todos(queryset)
+        self.message_user(
+            request,
+            f'Restored {result.rows} TODOs in {result.batches} batch(es).',
+        )
+
+
+@admin.register(RetentionPolicy)
+class RetentionPolicyAdmin(admin.ModelAdmin):
+    list_display = ['name', 'category_name', 'days', 'is_active', 'last_run_at']
+    list_filter = ['is_active']
+    readonly_fields = ['last_run_at']
+
+
+@admin.register(WebhookEndpoint)
+class WebhookEndpointAdmin(admin.ModelAdmin):
+    list_display = ['name', 'url', 'is_active', 'failures', 'last_delivered_at', 'last_error']
+    list_filter = ['is_active']
+    readonly_fields = ['cursors', 'failures', 'next_attempt_at', 'last_delivered_at', 'last_error']
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'color', 'created_at']
-    search_fields = ['name']
+    list_display = ['name', 'owner', 'color', 'created_at']
+    list_select_related = ['owner']
+    search_fields = ['^name']
 
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
-    list_display = ['name', 'slug']
+    list_display = ['name', 'slug', 'owner']
+    list_select_related = ['owner']
+    search_fields = ['^name']
     prepopulated_fields = {'slug': ('name',)}
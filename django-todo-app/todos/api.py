@@ -0,0 +1,408 @@
+import base64
+import binascii
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from django.http import Http404, JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_GET
+
+from .archive import WithArchive
+from .deadline import QueryTimeout, query_deadline
+from .rollups import report, report_days
+from .schedule import MAX_PER_DAY, MAX_RANGE_DAYS, by_due_day, parse_date, week_range
+from .tree import SUBTREE_LIMIT, nested, progress
+from .models import ArchivedTodo, Category, Tag, Todo, TodoTombstone
+from .pagination import FilteredCountPaginator, filter_signature
+from .routers import owner_id_for
+
+
+SYNC_BATCH_SIZE = 100
+SYNC_MAX_BATCH_SIZE = 1000
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Public field name -> column read with QuerySet.values(). ``tags`` is not a
+# column; it is filled from the through table in one extra query.
+TODO_FIELDS = {
+    'id': 'pk',
+    'title': 'title',
+    'description': 'description',
+    'due_date': 'due_date',
+    'is_resolved': 'is_resolved',
+    'category': 'category_id',
+    'tags': None,
+    'parent': 'parent_id',
+    'rank': 'rank',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+    'version': 'version',
+}
+INCLUDES = {'category', 'tags'}
+
+
+def _limit(request, default, maximum):
+    try:
+        return max(1, min(int(request.GET.get('limit', default)), maximum))
+    except ValueError:
+        return default
+
+
+def _csv_param(request, name):
+    return [item.strip() for item in request.GET.get(name, '').split(',') if item.strip()]
+
+
+def _parse_sparse_params(request):
+    fields = _csv_param(request, 'fields') or list(TODO_FIELDS)
+    unknown = [field for field in fields if field not in TODO_FIELDS]
+    if unknown:
+        raise ValueError(f'Unknown fields: {", ".join(unknown)}.')
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    include = _csv_param(request, 'include')
+    unknown = [name for name in include if name not in INCLUDES]
+    if unknown:
+        raise ValueError(f'Unknown includes: {", ".join(unknown)}.')
+    return fields, set(include)
+
+
+def _build_documents(queryset, fields, include):
+    """
+    Serialize ``queryset`` as plain dicts without building model instances.
+
+    Issues one query for the rows plus at most one per relation: tag links,
+    included categories and included tags.
+    """
+    need_tags = 'tags' in fields or 'tags' in include
+    need_category = 'category' in fields or 'category' in include
+    columns = [TODO_FIELDS[field] for field in fields if TODO_FIELDS[field]]
+    if need_category and 'category_id' not in columns:
+        columns.append('category_id')
+    rows = list(queryset.values(*columns))
+
+    tag_ids = {}
+    if need_tags and rows:
+        tags_field = queryset.model._meta.get_field('tags')
+        todo_column = tags_field.m2m_column_name()
+        through = tags_field.remote_field.through.objects.using(queryset.db)
+        for todo_id, tag_id in through.filter(
+            **{f'{todo_column}__in': [row['pk'] for row in rows]}
+        ).values_list(todo_column, 'tag_id'):
+            tag_ids.setdefault(todo_id, []).append(tag_id)
+
+    data = []
+    for row in rows:
+        document = {}
+        for field in fields:
+            if field == 'tags':
+                document['tags'] = sorted(tag_ids.get(row['pk'], []))
+            else:
+                document[field] = row[TODO_FIELDS[field]]
+        data.append(document)
+
+    included = {}
+    if 'category' in include:
+        category_ids = {row['category_id'] for row in rows if row['category_id']}
+        included['categories'] = list(
+            Category.objects.using(queryset.db)
+            .filter(pk__in=category_ids)
+            .values('id', 'name', 'color')
+        ) if category_ids else []
+    if 'tags' in include:
+        all_tag_ids = {tag_id for ids in tag_ids.values() for tag_id in ids}
+        included['tags'] = list(
+            Tag.objects.using(queryset.db)
+            .filter(pk__in=all_tag_ids)
+            .values('id', 'name', 'slug')
+        ) if all_tag_ids else []
+    return data, included
+
+
+def _build_mixed_documents(rows, fields, include):
+    """``_build_documents`` for a page of live and archived todos, in page order."""
+    data, included = {}, {}
+    for model in (Todo, ArchivedTodo):
+        pks = [row.pk for row in rows if isinstance(row, model)]
+        if not pks:
+            continue
+        queryset = model.objects.using(rows[0]._state.db).filter(pk__in=pks)
+        documents, extra = _build_documents(queryset, fields, include)
+        for document in documents:
+            document['archived'] = model is ArchivedTodo
+            data[model, document['id']] = document
+        for name, items in extra.items():
+            merged = {item['id']: item for item in included.get(name, [])}
+            merged.update((item['id'], item) for item in items)
+            included[name] = list(merged.values())
+    return [data[type(row), row.pk] for row in rows if (type(row), row.pk) in data], included
+
+
+@require_GET
+def todo_collection(request):
+    """
+    List todos as JSON.
+
+    Accepts the ``TodoListView`` parameters (filter, search, category,
+    sort) plus ``fields`` (sparse fieldset), ``include`` (``category``,
+    ``tags``), ``page`` and ``page_size``. ``archived=1`` includes the
+    archive tier; each document then says whether it is ``archived``.
+    """
+    try:
+        fields, include = _parse_sparse_params(request)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    try:
+        page_size = max(1, min(int(request.GET.get('page_size', PAGE_SIZE)), MAX_PAGE_SIZE))
+    except ValueError:
+        page_size = PAGE_SIZE
+
+    with_archive = bool(request.GET.get('archived'))
+    queryset = Todo.objects.for_owner(request.user).filter_by_params(request.GET)
+    if with_archive:
+        queryset = WithArchive(
+            queryset, ArchivedTodo.objects.for_owner(request.user).filter_by_params(request.GET),
+        )
+    paginator = FilteredCountPaginator(
+        queryset, page_size,
+        signature=filter_signature(request.GET),
+        owner_id=owner_id_for(request.user),
+    )
+    try:
+        with query_deadline(queryset.db, 'api_todo_list'):
+            page = paginator.page(request.GET.get('page', 1))
+            if with_archive:
+                data, included = _build_mixed_documents(page.object_list, fields, include)
+            else:
+                data, included = _build_documents(page.object_list, fields, include)
+    except InvalidPage as exc:
+        return JsonResponse({'error': str(exc)}, status=404)
+    except QueryTimeout:
+        return JsonResponse({'error': 'The query took too long; refine your search.'}, status=503)
+
+    body = {
+        'data': data,
+        'page': {
+            'number': page.number,
+            'size': page_size,
+            'count': paginator.count,
+            'count_is_estimate': paginator.approximate,
+            'num_pages': paginator.num_pages,
+        },
+    }
+    if include:
+        body['included'] = included
+    return JsonResponse(body)
+
+
+@require_GET
+def todo_resource(request, pk):
+    """Return one todo as JSON; supports ``fields`` and ``include``."""
+    try:
+        fields, include = _parse_sparse_params(request)
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    queryset = Todo.objects.for_owner(request.user).filter(pk=pk)
+    data, included = _build_documents(queryset, fields, include)
+    if not data:
+        raise Http404('No TODO matches the given query.')
+    body = {'data': data[0]}
+    if include:
+        body['included'] = included
+    return JsonResponse(body)
+
+
+def encode_cursor(position):
+    raw = json.dumps(position, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return ``{'t': (ts, id) | None, 'd': (ts, id) | None}`` for a sync cursor."""
+    position = {'t': None, 'd': None}
+    if not token:
+        return position
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        data = json.loads(raw)
+        for stream in position:
+            if data.get(stream):
+                timestamp, pk = data[stream]
+                position[stream] = (parse_datetime(timestamp), int(pk))
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValueError('Invalid cursor.')
+    if any(value and value[0] is None for value in position.values()):
+        raise ValueError('Invalid cursor.')
+    return position
+
+
+def _after(queryset, field, position):
+    if position is None:
+        return queryset
+    timestamp, pk = position
+    return queryset.filter(
+        Q(**{f'{field}__gt': timestamp}) | Q(**{field: timestamp, 'pk__gt': pk})
+    )
+
+
+def serialize_todos(todos):
+    """Full JSON representation of ``todos``, with tag ids fetched in one query."""
+    tag_ids = {}
+    if todos:
+        through = Todo.tags.through.objects.using(todos[0]._state.db)
+        for todo_id, tag_id in through.filter(
+            todo_id__in=[todo.pk for todo in todos]
+        ).values_list('todo_id', 'tag_id'):
+            tag_ids.setdefault(todo_id, []).append(tag_id)
+    return [
+        {
+            'id': todo.pk,
+            'title': todo.title,
+            'description': todo.description,
+            'due_date': todo.due_date,
+            'is_resolved': todo.is_resolved,
+            'category': todo.category_id,
+            'tags': sorted(tag_ids.get(todo.pk, [])),
+            'parent': todo.parent_id,
+            'rank': todo.rank,
+            'created_at': todo.created_at,
+            'updated_at': todo.updated_at,
+            'version': todo.version,
+        }
+        for todo in todos
+    ]
+
+
+@require_GET
+def changes(request):
+    """
+    Incremental sync feed: todos changed and deleted since ``cursor``.
+
+    Changes are returned oldest first in batches of ``limit``; clients keep
+    the returned ``cursor`` and poll again, fetching immediately while
+    ``has_more`` is true. Rows changed within the last
+    ``TODO_SYNC_SETTLE_SECONDS`` are held back so a transaction committing
+    late cannot slip in behind a cursor that was already handed out.
+    """
+    try:
+        position = decode_cursor(request.GET.get('cursor'))
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    limit = _limit(request, SYNC_BATCH_SIZE, SYNC_MAX_BATCH_SIZE)
+    settled = timezone.now() - timedelta(
+        seconds=getattr(settings, 'TODO_SYNC_SETTLE_SECONDS', 1)
+    )
+
+    todos = list(
+        _after(Todo.objects.for_owner(request.user), 'updated_at', position['t'])
+        .filter(updated_at__lt=settled)
+        .order_by('updated_at', 'pk')[:limit + 1]
+    )
+    tombstones = list(
+        _after(TodoTombstone.objects.for_owner(request.user), 'deleted_at', position['d'])
+        .filter(deleted_at__lt=settled)
+        .order_by('deleted_at', 'pk')[:limit + 1]
+    )
+
+    events = sorted(
+        [(todo.updated_at, 't', todo) for todo in todos]
+        + [(tombstone.deleted_at, 'd', tombstone) for tombstone in tombstones],
+        key=lambda event: (event[0], event[1], event[2].pk),
+    )
+    has_more = len(events) > limit
+    events = events[:limit]
+
+    upserts = serialize_todos([obj for _, kind, obj in events if kind == 't'])
+    upserts = iter(upserts)
+    results = []
+    for timestamp, kind, obj in events:
+        position[kind] = (timestamp, obj.pk)
+        if kind == 't':
+            results.append({'type': 'upsert', 'todo': next(upserts)})
+        else:
+            results.append({'type': 'delete', 'id': obj.todo_id, 'deleted_at': timestamp})
+
+    cursor = encode_cursor({
+        stream: [value[0].isoformat(), value[1]] if value else None
+        for stream, value in position.items()
+    })
+    return JsonResponse({'changes': results, 'cursor': cursor, 'has_more': has_more})
+
+
+@require_GET
+def analytics(request):
+    """Daily activity, per-category totals and median time-to-resolve over ``days`` (default 30)."""
+    return JsonResponse(report(request.user, report_days(request.GET.get('days'))))
+
+
+@require_GET
+def calendar(request):
+    """
+    Todos bucketed by due day from ``start`` to ``end`` (ISO dates,
+    inclusive; default this week), at most ``per_day`` per day. Each day
+    reports its full ``total``.
+    """
+    today = timezone.localdate()
+    start = parse_date(request.GET.get('start'), week_range(today)[0])
+    end = parse_date(request.GET.get('end'), start + timedelta(days=6))
+    if not 0 <= (end - start).days < MAX_RANGE_DAYS:
+        return JsonResponse({'error': f'Give an end on or after start, at most {MAX_RANGE_DAYS} days.'}, status=400)
+    try:
+        per_day = max(1, min(int(request.GET.get('per_day', MAX_PER_DAY)), MAX_PER_DAY))
+    except ValueError:
+        per_day = MAX_PER_DAY
+
+    days = by_due_day(Todo.objects.for_owner(request.user), start, end, per_day)
+    return JsonResponse({
+        'start': start,
+        'end': end,
+        'days': [
+            {
+                'date': day,
+                'total': bucket['total'],
+                'todos': [
+                    {
+                        'id': row['id'],
+                        'title': row['title'],
+                        'is_resolved': row['is_resolved'],
+                        'due_date': row['due_date'],
+                        'category': row['category_id'],
+                    }
+                    for row in bucket['todos']
+                ],
+            }
+            for day, bucket in days.items()
+        ],
+    })
+
+
+@require_GET
+def subtree(request, pk):
+    """
+    Everything below a todo, depth first with each row's ``level``, plus
+    open and resolved counts and the completion percentage. ``limit``
+    caps the rows (not the counts).
+    """
+    todo = Todo.objects.for_owner(request.user).filter(pk=pk).first()
+    if todo is None:
+        raise Http404('No TODO matches the given query.')
+    rows = nested(todo, _limit(request, SUBTREE_LIMIT, SUBTREE_LIMIT))
+    return JsonResponse({
+        'id': todo.pk,
+        'progress': progress(todo),
+        'todos': [
+            {
+                'id': row['id'],
+                'title': row['title'],
+                'is_resolved': row['is_resolved'],
+                'due_date': row['due_date'],
+                'parent': row['parent_id'],
+                'level': row['level'],
+            }
+            for row in rows
+        ],
+    })
@@ -0,0 +1,162 @@
+"""
+Archive tier for resolved todos.
+
+Resolved todos untouched for ``TODO_ARCHIVE_AFTER_DAYS`` are moved from
+``Todo`` to ``ArchivedTodo`` so the hot table, and every list, count and
+search over it, only carries live work. Rows move with ``INSERT ... SELECT``
+in primary-key chunks (see ``todos.bulk``): descriptions are copied in their
+stored, possibly compressed, form and never pass through Python. Tag links
+move the same way; categories are plain foreign keys and move with the row.
+Only todos without subtasks are archived; a restored subtask goes back under
+its parent if that is still live. ``WithArchive`` lists both tables as one,
+for the "include archived" option of the list page and API.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Value
+from django.utils import timezone
+
+from . import dedup, outbox, tree
+from .bulk import CHUNK_SIZE, _run_chunked, delete_rows
+from .models import ArchivedTodo, Todo
+from .pagination import touch_owners_of
+
+
+def archive_cutoff(days=None):
+    if days is None:
+        days = getattr(settings, 'TODO_ARCHIVE_AFTER_DAYS', 90)
+    return timezone.now() - timedelta(days=days)
+
+
+def archivable(queryset, days=None):
+    """Resolved todos in ``queryset`` last changed more than ``days`` ago."""
+    return queryset.filter(is_resolved=True, updated_at__lt=archive_cutoff(days))
+
+
+def _copy_rows(source, target, pks, using, overrides):
+    """``INSERT INTO target SELECT ... FROM source`` for ``pks``, tags included."""
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    placeholders = ', '.join(['%s'] * len(pks))
+    target_columns = {field.column for field in target._meta.concrete_fields}
+    columns = [
+        field.column for field in source._meta.concrete_fields
+        if field.column in target_columns and field.column not in overrides
+    ]
+    values = [
+        target._meta.get_field(column).get_db_prep_save(value, connection)
+        for column, value in overrides.items()
+    ]
+    source_tags = source._meta.get_field('tags')
+    target_tags = target._meta.get_field('tags')
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(target._meta.db_table)} '
+            f'({", ".join(quote(column) for column in [*columns, *overrides])}) '
+            f'SELECT {", ".join([quote(column) for column in columns] + ["%s"] * len(overrides))} '
+            f'FROM {quote(source._meta.db_table)} WHERE {quote("id")} IN ({placeholders})',
+            [*values, *pks],
+        )
+        cursor.execute(
+            f'INSERT INTO {quote(target_tags.m2m_db_table())} '
+            f'({quote(target_tags.m2m_column_name())}, {quote(target_tags.m2m_reverse_name())}) '
+            f'SELECT {quote(source_tags.m2m_column_name())}, {quote(source_tags.m2m_reverse_name())} '
+            f'FROM {quote(source_tags.m2m_db_table())} '
+            f'WHERE {quote(source_tags.m2m_column_name())} IN ({placeholders})',
+            pks,
+        )
+
+
+def _move(queryset, target, overrides, chunk_size, event_type=None):
+    source = queryset.model
+    using = queryset.db
+
+    def operation(pks):
+        # Re-check the filter under lock: a todo reopened since its chunk
+        # was listed stays where it is.
+        pks = list(
+            queryset.filter(pk__in=pks).select_for_update()
+            .order_by().values_list('pk', flat=True)
+        )
+        if not pks:
+            return 0
+        _copy_rows(source, target, pks, using, overrides)
+        moved = source.objects.using(using).filter(pk__in=pks)
+        if source is Todo:
+            # Set-wise, with a tombstone so sync clients drop the row and a
+            # todo.archived event (not todo.deleted) for webhooks and pages.
+            delete_rows(moved, event_type=outbox.ARCHIVED)
+        else:
+            touch_owners_of(moved)
+            moved.delete()
+        if target is Todo:
+            tree.reattach(using, pks)
+            dedup.index_todos(using, pks)
+        if event_type:
+            outbox.record_many(using, event_type, pks)
+        return len(pks)
+
+    return _run_chunked(queryset, operation, chunk_size)
+
+
+def archive_todos(queryset, chunk_size=CHUNK_SIZE):
+    """Move the todos in ``queryset`` to the archive."""
+    return _move(queryset.leaves(), ArchivedTodo, {'archived_at': timezone.now()}, chunk_size)
+
+
+def restore_todos(queryset, chunk_size=CHUNK_SIZE):
+    """Move the archived todos in ``queryset`` back to ``Todo`` under their old ids."""
+    # Restoring is a change sync clients must see after the archive's tombstone.
+    return _move(queryset, Todo, {'updated_at': timezone.now(), 'path': ''}, chunk_size, outbox.CREATED)
+
+
+class WithArchive:
+    """
+    Live and archived todos as one ordered list, for ``Paginator``.
+
+    ``live`` and ``archived`` are the same owner's filtered and ordered
+    querysets. A page is read with one ``UNION ALL`` of keys and sort
+    columns over both tables, then each table's rows by primary key; rows
+    tell their table by ``is_archived``. Counting is one ``COUNT`` per table.
+    """
+
+    ordered = True
+
+    def __init__(self, live, archived):
+        self.live = live
+        self.archived = archived
+        ordering = live.query.order_by or live.model._meta.ordering
+        self.ordering = [
+            name.replace('pk', 'id') if name.lstrip('-') == 'pk' else name for name in ordering
+        ] + ['-id']
+        self.db = live.db
+
+    def count(self):
+        return self.live.count() + self.archived.count()
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def keys(self, index):
+        """``(is_archived, pk)`` of the rows in slice ``index``, in list order."""
+        columns = ['id', *{name.lstrip('-') for name in self.ordering} - {'id'}]
+        union = self.live.order_by().values(*columns).annotate(is_archived=Value(False)).union(
+            self.archived.order_by().values(*columns).annotate(is_archived=Value(True)),
+            all=True,
+        )
+        return [(row['is_archived'], row['id']) for row in union.order_by(*self.ordering)[index]]
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        keys = self.keys(index)
+        rows = {
+            is_archived: queryset.order_by().in_bulk([pk for archived, pk in keys if archived == is_archived])
+            for is_archived, queryset in ((False, self.live), (True, self.archived))
+        }
+        return [rows[is_archived][pk] for is_archived, pk in keys if pk in rows[is_archived]]
@@ -0,0 +1,150 @@
+"""
+Set-based bulk operations on todos.
+
+Every operation walks the target queryset in primary-key ordered chunks and
+runs one short transaction per chunk, so a large batch never holds the
+database write lock for long and can be interrupted safely between chunks.
+"""
+from collections import namedtuple
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import dedup, outbox, rollups
+from .models import TitleTrigram, Todo, TodoTombstone
+
+
+CHUNK_SIZE = 1000
+
+BulkResult = namedtuple('BulkResult', ['rows', 'batches'])
+
+
+def iter_pk_chunks(queryset, chunk_size=CHUNK_SIZE):
+    """Yield lists of primary keys of ``queryset`` in ascending order."""
+    queryset = queryset.order_by('pk').values_list('pk', flat=True)
+    last_pk = None
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        pks = list(chunk[:chunk_size])
+        if not pks:
+            return
+        yield pks
+        last_pk = pks[-1]
+
+
+def _run_chunked(queryset, operation, chunk_size):
+    rows = batches = 0
+    for pks in iter_pk_chunks(queryset, chunk_size):
+        with transaction.atomic(using=queryset.db):
+            rows += operation(pks)
+        batches += 1
+    return BulkResult(rows, batches)
+
+
+def update_todos(queryset, chunk_size=CHUNK_SIZE, **values):
+    """``UPDATE`` the todos in ``queryset`` with ``values``, chunk by chunk."""
+    # QuerySet.update() skips auto_now and signals, so stamp the change and
+    # write the outbox events explicitly.
+    changed = [Todo._meta.get_field(name).attname for name in values if name != 'updated_at']
+    event_type = outbox.event_type_for(False, changed)
+    now = values.setdefault('updated_at', timezone.now())
+    resolving = 'is_resolved' in values
+    if resolving:
+        values['resolved_at'] = now if values['is_resolved'] else None
+    # Editors holding a copy from before the update get a version conflict.
+    values['version'] = F('version') + 1
+    manager = Todo.objects.using(queryset.db)
+
+    def operation(pks):
+        if resolving:
+            flipped = list(
+                manager.filter(pk__in=pks).exclude(is_resolved=values['is_resolved'])
+                .values('owner_id', 'category_id', 'created_at')
+            )
+        rows = manager.filter(pk__in=pks).update(**values)
+        outbox.record_many(queryset.db, event_type, pks, changed)
+        if resolving:
+            rollups.record_resolutions(queryset.db, flipped, values['is_resolved'], now)
+        if 'title' in values:
+            dedup.index_todos(queryset.db, pks)
+        return rows
+
+    return _run_chunked(queryset, operation, chunk_size)
+
+
+def add_tags(queryset, tags, chunk_size=CHUNK_SIZE):
+    """
+    Attach ``tags`` to every todo in ``queryset`` with bulk inserts. Like
+    ``update_todos``, each chunk moves ``updated_at`` and ``version`` on, so
+    the sync feed and editors holding an older copy see the change.
+    """
+    through = Todo.tags.through.objects.using(queryset.db)
+    manager = Todo.objects.using(queryset.db)
+
+    def operation(pks):
+        through.bulk_create(
+            [through.model(todo_id=pk, tag_id=tag.pk) for pk in pks for tag in tags],
+            ignore_conflicts=True,
+        )
+        rows = manager.filter(pk__in=pks).update(updated_at=timezone.now(), version=F('version') + 1)
+        outbox.record_many(queryset.db, outbox.UPDATED, pks, ['tags'])
+        return rows
+
+    return _run_chunked(queryset, operation, chunk_size)
+
+
+def remove_tags(queryset, tags, chunk_size=CHUNK_SIZE):
+    """Detach ``tags`` from every todo in ``queryset``."""
+    through = Todo.tags.through.objects.using(queryset.db)
+    manager = Todo.objects.using(queryset.db)
+
+    def operation(pks):
+        through.filter(todo_id__in=pks, tag__in=tags).delete()
+        rows = manager.filter(pk__in=pks).update(updated_at=timezone.now(), version=F('version') + 1)
+        outbox.record_many(queryset.db, outbox.UPDATED, pks, ['tags'])
+        return rows
+
+    return _run_chunked(queryset, operation, chunk_size)
+
+
+def delete_rows(queryset, event_type=outbox.DELETED):
+    """
+    Delete the todos in ``queryset`` and their subtasks set-wise; returns
+    how many. Call inside the chunk's transaction.
+
+    ``QuerySet.delete()`` loads every row (descriptions included) to run
+    the per-instance ``post_delete`` receiver that writes the tombstone and
+    the outbox event. Here the ids and owners are read once, tombstones and
+    events are written with one insert each, and the rows, their tag links
+    and title trigrams are removed with plain ``DELETE`` statements.
+    """
+    using = queryset.db
+    manager = Todo.objects.using(using)
+    rows = list(queryset.order_by().values('pk', 'owner_id'))
+    level = [row['pk'] for row in rows]
+    while level:
+        children = list(manager.filter(parent_id__in=level).values('pk', 'owner_id'))
+        rows.extend(children)
+        level = [row['pk'] for row in children]
+    if not rows:
+        return 0
+    pks = [row['pk'] for row in rows]
+    TodoTombstone.objects.using(using).bulk_create([
+        TodoTombstone(owner_id=row['owner_id'], todo_id=row['pk']) for row in rows
+    ])
+    outbox.record_rows(using, event_type, rows)
+    Todo.tags.through.objects.using(using).filter(todo_id__in=pks).delete()
+    TitleTrigram.objects.using(using).filter(todo_id__in=pks).delete()
+    # No post_delete: the tombstones and events above stand in for it.
+    return manager.filter(pk__in=pks)._raw_delete(using)
+
+
+def delete_todos(queryset, chunk_size=CHUNK_SIZE):
+    """``DELETE`` the todos in ``queryset`` (and their subtasks) chunk by chunk."""
+    manager = Todo.objects.using(queryset.db)
+
+    def operation(pks):
+        return delete_rows(manager.filter(pk__in=pks))
+
+    return _run_chunked(queryset, operation, chunk_size)
@@ -0,0 +1,148 @@
+"""
+Process-local cache for reference data (categories).
+
+Rows are kept in a size-bounded LRU per worker process. Every write to the
+model bumps a version key in the Django cache; each process compares its
+version with the cached one at most every ``TODO_REFERENCE_CACHE_TTL``
+seconds. That only reaches other processes when the cache is shared
+(``DJANGO_REDIS_URL``); with the default per-process LocMemCache, rows are
+also reloaded once they are ``TODO_REFERENCE_CACHE_MAX_AGE`` seconds old,
+which bounds how long any process can serve a stale row.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+
+from .models import Category
+from .routers import get_shards
+
+
+class ReferenceCache:
+    def __init__(self, model):
+        self.model = model
+        self.version_key = f'todos:refdata:{model._meta.label_lower}'
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = None
+
+    @property
+    def max_size(self):
+        return getattr(settings, 'TODO_REFERENCE_CACHE_SIZE', 5000)
+
+    @property
+    def check_interval(self):
+        return getattr(settings, 'TODO_REFERENCE_CACHE_TTL', 5)
+
+    @property
+    def max_age(self):
+        return getattr(settings, 'TODO_REFERENCE_CACHE_MAX_AGE', 60)
+
+    def _sync_version(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        version = cache.get(self.version_key)
+        if version is None:
+            version = uuid.uuid4().hex
+            if not cache.add(self.version_key, version, None):
+                version = cache.get(self.version_key, version)
+        with self._lock:
+            if version != self._version:
+                self._rows.clear()
+                self._version = version
+            self._checked_at = now
+
+    def _store(self, objs, version):
+        with self._lock:
+            # Drop rows read before a concurrent invalidation.
+            if version != self._version:
+                return
+            loaded_at = time.monotonic()
+            for obj in objs:
+                key = (obj._state.db, obj.pk)
+                self._rows[key] = (obj, loaded_at)
+                self._rows.move_to_end(key)
+            while len(self._rows) > self.max_size:
+                self._rows.popitem(last=False)
+
+    def get_many(self, pks, using=DEFAULT_DB_ALIAS):
+        """
+        Return ``{pk: instance}`` for rows of the ``using`` shard. Instances
+        are shared between requests, so treat them as read-only.
+        """
+        self._sync_version()
+        found, missing = {}, []
+        expired = time.monotonic() - self.max_age
+        with self._lock:
+            version = self._version
+            for pk in pks:
+                key = (using, pk)
+                obj, loaded_at = self._rows.get(key, (None, None))
+                if obj is not None and loaded_at > expired:
+                    self._rows.move_to_end(key)
+                    found[pk] = obj
+                else:
+                    missing.append(pk)
+        if missing:
+            objs = list(self.model._default_manager.using(using).filter(pk__in=missing))
+            self._store(objs, version)
+            found.update((obj.pk, obj) for obj in objs)
+        return found
+
+    def get(self, pk, using=DEFAULT_DB_ALIAS):
+        return self.get_many([pk], using).get(pk)
+
+    def warm(self):
+        self._sync_version()
+        version = self._version
+        for using in get_shards():
+            self._store(
+                self.model._default_manager.using(using)[:self.max_size],
+                version,
+            )
+
+    def invalidate(self):
+        version = uuid.uuid4().hex
+        cache.set(self.version_key, version, None)
+        with self._lock:
+            self._rows.clear()
+            self._version = version
+            self._checked_at = time.monotonic()
+
+    def __len__(self):
+        return len(self._rows)
+
+
+category_cache = ReferenceCache(Category)
+
+
+def attach_categories(todos):
+    """Fill each todo's ``category`` from the cache instead of a join."""
+    wanted = {}
+    for todo in todos:
+        if todo.category_id:
+            wanted.setdefault(todo._state.db, set()).add(todo.category_id)
+    categories = {
+        using: category_cache.get_many(pks, using) for using, pks in wanted.items()
+    }
+    for todo in todos:
+        if todo.category_id:
+            todo._meta.get_field('category').set_cached_value(
+                todo, categories[todo._state.db].get(todo.category_id)
+            )
+    return todos
+
+
+def warm_reference_caches():
+    """Preload reference data; called once per process at startup."""
+    try:
+        category_cache.warm()
+    except DatabaseError:
+        # Tables may not exist yet (e.g. before the first migrate).
+        pass
@@ -0,0 +1,125 @@
+"""
+Query time budgets for views driven by user-controlled parameters.
+
+``query_deadline(using, name)`` aborts the queries run inside it once the
+budget for ``name`` (``settings.TODO_QUERY_BUDGETS``, seconds) is spent, in
+the database itself: SQLite through a progress handler, PostgreSQL through
+a transaction-local ``statement_timeout``. An aborted query raises
+``QueryTimeout``; the view then degrades instead of pinning the worker.
+Other backends run unguarded. Aborts are logged and counted per process
+(``aborted_queries()``).
+"""
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import OperationalError, connections, transaction
+
+
+logger = logging.getLogger('todos.deadline')
+
+DEFAULT_BUDGET = 2.0
+
+# SQLite calls the progress handler every this many virtual machine steps.
+PROGRESS_STEPS = 1000
+
+QUERY_CANCELED = '57014'
+
+_aborted = Counter()
+_aborted_lock = threading.Lock()
+
+
+class QueryTimeout(Exception):
+    def __init__(self, name, budget):
+        super().__init__(f'{name} exceeded its {budget}s query budget')
+        self.name = name
+        self.budget = budget
+
+
+def budget_for(name):
+    budgets = getattr(settings, 'TODO_QUERY_BUDGETS', {})
+    return budgets.get(name, budgets.get('default', DEFAULT_BUDGET))
+
+
+def aborted_queries():
+    """Aborted queries per budget name in this process."""
+    with _aborted_lock:
+        return dict(_aborted)
+
+
+def reset_aborted_queries():
+    with _aborted_lock:
+        _aborted.clear()
+
+
+@contextmanager
+def _sqlite(connection, budget, expired):
+    limit = time.monotonic() + budget
+
+    def progress():
+        if time.monotonic() > limit:
+            expired.append(True)
+            return 1
+        return 0
+
+    connection.ensure_connection()
+    connection.connection.set_progress_handler(progress, PROGRESS_STEPS)
+    try:
+        yield
+    finally:
+        connection.connection.set_progress_handler(None, PROGRESS_STEPS)
+
+
+@contextmanager
+def _postgresql(connection, budget, expired):
+    # A canceled statement aborts the transaction, so the guarded block runs
+    # in its own (savepoint) transaction and the setting dies with it.
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT current_setting('statement_timeout'), "
+                "set_config('statement_timeout', %s, true)",
+                [str(int(budget * 1000))],
+            )
+            previous = cursor.fetchone()[0]
+        try:
+            yield
+        except OperationalError as exc:
+            cause = exc.__cause__
+            if QUERY_CANCELED in (getattr(cause, 'sqlstate', None), getattr(cause, 'pgcode', None)):
+                expired.append(True)
+            raise
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT set_config('statement_timeout', %s, true)", [previous])
+
+
+GUARDS = {'sqlite': _sqlite, 'postgresql': _postgresql}
+
+
+@contextmanager
+def query_deadline(using, name, budget=None):
+    """Abort queries on ``using`` that run past the budget for ``name``."""
+    connection = connections[using]
+    guard = GUARDS.get(connection.vendor)
+    if guard is None or getattr(connection, 'todo_deadline', None):
+        # Unsupported backend, or an outer deadline already applies.
+        yield
+        return
+    budget = budget_for(name) if budget is None else budget
+    expired = []
+    connection.todo_deadline = name
+    try:
+        with guard(connection, budget, expired):
+            yield
+    except OperationalError as exc:
+        if not expired:
+            raise
+        with _aborted_lock:
+            _aborted[name] += 1
+        logger.warning('Aborted %s query after %ss budget', name, budget)
+        raise QueryTimeout(name, budget) from exc
+    finally:
+        connection.todo_deadline = None
@@ -0,0 +1,147 @@
+"""
+Near-duplicate todo titles.
+
+Every title is indexed as trigrams in ``TitleTrigram`` (kept current on
+save, see ``todos.signals``). Similarity is the share of trigrams two titles
+have in common, as in PostgreSQL's pg_trgm, so "Fix login bug" and "Fix the
+login bug" score 0.78. A lookup only visits the todos sharing enough of the
+new title's trigrams to reach the threshold, found through the
+``(owner, trigram)`` index, instead of comparing against every title.
+The report (``duplicate_pairs``) likewise only compares titles sharing one
+of their rarer trigrams.
+"""
+import math
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .models import TitleTrigram, Todo
+from .routers import owner_id_for, shard_for_owner
+from .search import similarity, trigrams
+
+
+DEFAULT_THRESHOLD = 0.5
+
+# Todos scored exactly per lookup, best trigram overlap first.
+CANDIDATE_LIMIT = 50
+
+# Owners whose trigrams ``duplicate_pairs`` reads in one query.
+OWNERS_PER_QUERY = 100
+
+
+def get_threshold():
+    return getattr(settings, 'TODO_DUPLICATE_THRESHOLD', DEFAULT_THRESHOLD)
+
+
+def index_titles(using, rows):
+    """(Re)index the titles of ``rows``, ``(pk, owner_id, title)`` tuples, on ``using``."""
+    rows = list(rows)
+    if not rows:
+        return
+    manager = TitleTrigram.objects.using(using)
+    manager.filter(todo_id__in=[pk for pk, _, _ in rows]).delete()
+    manager.bulk_create([
+        TitleTrigram(owner_id=owner_id, todo_id=pk, trigram=gram)
+        for pk, owner_id, title in rows
+        for gram in sorted(trigrams(title))
+    ])
+
+
+def index_todos(using, pks):
+    index_titles(using, Todo.objects.using(using).filter(pk__in=pks).values_list('pk', 'owner_id', 'title'))
+
+
+def similar_todos(owner, title, exclude=None, threshold=None, limit=5):
+    """
+    The owner's todos whose titles are at least ``threshold`` similar to
+    ``title``, most similar first, each with a ``similarity`` attribute.
+    """
+    threshold = get_threshold() if threshold is None else threshold
+    grams = trigrams(title)
+    if not grams:
+        return []
+    owner_id = owner_id_for(owner)
+    using = shard_for_owner(owner_id)
+    # similarity >= t needs at least t * len(grams) shared trigrams.
+    candidates = (
+        TitleTrigram.objects.using(using)
+        .filter(owner_id=owner_id, trigram__in=grams)
+        .values('todo_id')
+        .annotate(shared=Count('id'))
+        .filter(shared__gte=math.ceil(threshold * len(grams)))
+        .order_by('-shared')
+    )
+    if exclude is not None:
+        candidates = candidates.exclude(todo_id=exclude)
+    pks = [row['todo_id'] for row in candidates[:CANDIDATE_LIMIT]]
+    if not pks:
+        return []
+    matches = []
+    for todo in Todo.objects.using(using).filter(pk__in=pks).only('pk', 'title', 'owner_id'):
+        todo.similarity = similarity(grams, trigrams(todo.title))
+        if todo.similarity >= threshold:
+            matches.append(todo)
+    matches.sort(key=lambda todo: (-todo.similarity, todo.pk))
+    return matches[:limit]
+
+
+def owner_pairs(titles, threshold):
+    """
+    Pairs ``(todo_id, other_id, similarity)`` at or above ``threshold``
+    among ``titles``, a ``{todo_id: trigram set}`` of one owner.
+
+    Prefix filtering: with each title's trigrams ordered rarest first (by
+    how many of these titles contain them), two titles can only reach
+    ``threshold`` if they share one of the first ``n - ceil(threshold * n)
+    + 1`` trigrams of each. Only those prefixes are indexed and looked up,
+    so trigrams common to most titles ("  a", "ing") never pair every title
+    with every other; the candidates are then scored on all their trigrams.
+    """
+    frequency = Counter(gram for grams in titles.values() for gram in grams)
+    prefixes = defaultdict(list)
+    pairs = []
+    # Shortest titles first: similarity >= t also needs t * n <= the shorter size.
+    for todo_id in sorted(titles, key=lambda pk: (len(titles[pk]), pk)):
+        grams = titles[todo_id]
+        size = len(grams)
+        # The epsilon keeps float rounding (0.7 * 10 = 7.000000000000001) from shortening a prefix.
+        length = size - math.ceil(threshold * size - 1e-9) + 1
+        prefix = sorted(grams, key=lambda gram: (frequency[gram], gram))[:length]
+        candidates = set()
+        for gram in prefix:
+            candidates.update(prefixes[gram])
+            prefixes[gram].append(todo_id)
+        for other_id in candidates:
+            other = titles[other_id]
+            if len(other) < threshold * size:
+                continue
+            score = similarity(grams, other)
+            if score >= threshold:
+                pairs.append((min(todo_id, other_id), max(todo_id, other_id), score))
+    return sorted(pairs)
+
+
+def duplicate_pairs(using, threshold=None, owners_per_query=OWNERS_PER_QUERY):
+    """
+    Yield ``(owner_id, todo_id, other_id, similarity)`` for every pair of
+    one owner's todos on ``using`` at or above ``threshold``.
+
+    Reads the trigram index ``owners_per_query`` owners at a time and pairs
+    each owner's titles with ``owner_pairs``, so the work grows with the
+    pairs that share rare trigrams rather than with every pair of titles.
+    """
+    threshold = get_threshold() if threshold is None else threshold
+    index = TitleTrigram.objects.using(using).order_by()
+    owners = list(index.order_by('owner_id').values_list('owner_id', flat=True).distinct())
+    for start in range(0, len(owners), owners_per_query):
+        chunk = owners[start:start + owners_per_query]
+        in_chunk = Q(owner_id__in=[owner_id for owner_id in chunk if owner_id is not None])
+        if None in chunk:
+            in_chunk |= Q(owner_id__isnull=True)
+        titles = defaultdict(lambda: defaultdict(set))
+        for owner_id, todo_id, gram in index.filter(in_chunk).values_list('owner_id', 'todo_id', 'trigram').iterator():
+            titles[owner_id][todo_id].add(gram)
+        for owner_id in chunk:
+            for todo_id, other_id, score in owner_pairs(titles[owner_id], threshold):
+                yield owner_id, todo_id, other_id, score
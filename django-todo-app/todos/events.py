@@ -0,0 +1,161 @@
+"""
+Live change events for open list pages.
+
+Committed outbox events are fanned out to the server-sent-event streams
+(``todos.views.todo_events``) of this process through ``hub``. How events
+reach the hub is pluggable with ``TODO_EVENT_BACKEND``:
+
+``LocalBackend``
+    Publishes in-process on commit. Enough for a single server process.
+``OutboxBackend``
+    Polls the outbox table, which every process writes, so streams see
+    changes made by any process. Polling only runs while a stream is open,
+    and only settled events are read (``todos.outbox.settled``).
+"""
+import asyncio
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import OutboxEvent
+from .routers import get_shards
+
+
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+
+def compact(event):
+    """The client-facing form of an outbox event: id, type and changed fields."""
+    changed = event.payload.get('changed', [])
+    keys = [name.removesuffix('_id') for name in changed]
+    return {
+        'owner': event.owner_id,
+        'id': event.todo_id,
+        'type': event.event_type,
+        'changed': changed,
+        'fields': {key: event.payload[key] for key in keys if key in event.payload},
+    }
+
+
+class Hub:
+    """Per-process fan-out of events to subscribed asyncio queues, by owner."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, owner_id):
+        queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(owner_id, set()).add(
+                (asyncio.get_running_loop(), queue)
+            )
+        get_backend().start(self)
+        return queue
+
+    def unsubscribe(self, owner_id, queue):
+        with self._lock:
+            subscribers = self._subscribers.get(owner_id, set())
+            subscribers.difference_update({item for item in subscribers if item[1] is queue})
+            if not subscribers:
+                self._subscribers.pop(owner_id, None)
+
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    def dispatch(self, events):
+        """Hand ``events`` (compact dicts) to their owners' queues; thread-safe."""
+        with self._lock:
+            targets = [
+                (loop, queue, event)
+                for event in events
+                for loop, queue in self._subscribers.get(event['owner'], ())
+            ]
+        for loop, queue, event in targets:
+            loop.call_soon_threadsafe(_offer, queue, event)
+
+
+def _offer(queue, event):
+    # A stalled client loses its oldest events rather than growing memory.
+    if queue.full():
+        queue.get_nowait()
+    queue.put_nowait(event)
+
+
+class LocalBackend:
+    def start(self, hub):
+        pass
+
+    def publish(self, events, using):
+        def dispatch():
+            if hub.has_subscribers():
+                hub.dispatch([compact(event) for event in events])
+
+        transaction.on_commit(dispatch, using=using)
+
+
+class OutboxBackend:
+    def __init__(self, interval=None):
+        self.interval = interval or getattr(settings, 'TODO_EVENT_POLL_INTERVAL', 1)
+        self.task = None
+        self.cursors = None
+
+    def start(self, hub):
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.poll(hub))
+
+    def publish(self, events, using):
+        pass
+
+    def fetch(self):
+        if self.cursors is None:
+            # Start from the current end of every shard's outbox.
+            self.cursors = {
+                using: OutboxEvent.objects.using(using).order_by('-pk')
+                .values_list('pk', flat=True).first() or 0
+                for using in get_shards()
+            }
+            return []
+        from .outbox import settled
+        events = []
+        before = settled()
+        for using, cursor in self.cursors.items():
+            rows = list(
+                OutboxEvent.objects.using(using)
+                .filter(pk__gt=cursor, created_at__lt=before)
+                .order_by('pk')[:500]
+            )
+            if rows:
+                self.cursors[using] = rows[-1].pk
+            events.extend(compact(row) for row in rows)
+        return events
+
+    async def poll(self, hub):
+        while hub.has_subscribers():
+            events = await sync_to_async(self.fetch)()
+            if events:
+                hub.dispatch(events)
+            await asyncio.sleep(self.interval)
+        self.cursors = None
+
+
+hub = Hub()
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = import_string(
+            getattr(settings, 'TODO_EVENT_BACKEND', 'todos.events.LocalBackend')
+        )()
+    return _backend
+
+
+def publish(events, using):
+    """Announce freshly recorded outbox ``events``; called inside their transaction."""
+    if events:
+        get_backend().publish(events, using)
@@ -1,13 +1,41 @@
 from django import forms
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from .dedup import similar_todos
 from .models import Todo, Category, Tag
+from .routers import owner_id_for
+from .widgets import LazySelect, LazySelectMultiple
 
 
-class TodoForm(forms.ModelForm):
+class VersionedFormMixin:
+    """
+    Round-trips the todo's ``version`` in a hidden field, so saving a form
+    opened before someone else's save raises ``VersionConflict`` instead of
+    overwriting their change. Forms posted without it only guard the time
+    between loading and saving the row.
+    """
+    
+    def clean_version(self):
+        return self.cleaned_data.get('version') or self.instance.version
+    
+    def add_conflict(self, conflict):
+        """Report ``conflict`` on the form; posting it again overwrites the newer row."""
+        current = conflict.current
+        self.add_error(None, 'This TODO was changed by someone else while you were editing it. '
+                             'Saving again replaces their changes with yours.')
+        for name in self.changed_data:
+            if name not in ('version', 'tags'):
+                stored = getattr(current, name)
+                self.add_error(None, f'{self.fields[name].label} is now: {"(empty)" if stored in (None, "") else stored}')
+        self.data = self.data.copy()
+        self.data['version'] = current.version
+
+
+class TodoForm(VersionedFormMixin, forms.ModelForm):
     class Meta:
         model = Todo
-        fields = ['title', 'description', 'due_date', 'category', 'tags', 'is_resolved']
+        fields = ['title', 'description', 'due_date', 'category', 'tags', 'parent', 'is_resolved', 'version']
+        labels = {'parent': 'Subtask of'}
         
         widgets = {
             'title': forms.TextInput(attrs={
@@ -24,20 +52,34 @@ class TodoForm(forms.ModelForm):
                 'class': 'form-control',
                 'type': 'datetime-local'
             }),
-            'category': forms.Select(attrs={
+            'category': LazySelect('category_autocomplete', attrs={
+                'class': 'form-select'
+            }),
+            'tags': LazySelectMultiple('tag_autocomplete', attrs={
+                'class': 'form-select'
+            }),
+            'parent': LazySelect('todo_autocomplete', attrs={
                 'class': 'form-select'
             }),
-            'tags': forms.CheckboxSelectMultiple(),
             'is_resolved': forms.CheckboxInput(attrs={
                 'class': 'form-check-input'
             }),
+            'version': forms.HiddenInput(),
         }
     
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, owner=None, **kwargs):
         super().__init__(*args, **kwargs)
+        self.owner = owner
+        if self.instance.pk is None:
+            self.instance.owner_id = owner_id_for(owner)
+        self.fields['category'].queryset = Category.objects.for_owner(owner)
+        self.fields['tags'].queryset = Tag.objects.for_owner(owner)
         self.fields['category'].required = False
         self.fields['category'].empty_label = "-- No Category --"
         self.fields['tags'].required = False
+        self.fields['parent'].queryset = Todo.objects.for_owner(owner)
+        self.fields['parent'].empty_label = "-- Top level --"
+        self.fields['version'].required = False
     
     def clean_title(self):
         title = self.cleaned_data.get('title', '').strip()
@@ -48,15 +90,33 @@ class TodoForm(forms.ModelForm):
         if len(title) < 3:
             raise ValidationError('Title must be at least 3 characters long.')
         
-        existing = Todo.objects.filter(title__iexact=title)
+        existing = Todo.objects.for_owner(self.owner).filter(title__iexact=title)
         if self.instance.pk:
             existing = existing.exclude(pk=self.instance.pk)
         
         if existing.exists():
             raise ValidationError('A TODO with this title already exists.')
         
+        # Near-duplicates are only a warning (see similar_todos_warning).
+        self.similar_todos = similar_todos(self.owner, title, exclude=self.instance.pk)
+        
         return title
     
+    def similar_todos_warning(self):
+        similar = getattr(self, 'similar_todos', None)
+        if similar:
+            titles = ', '.join(f'"{todo.title}"' for todo in similar)
+            return f'Similar TODOs already exist: {titles}.'
+        return ''
+    
+    def clean_parent(self):
+        parent = self.cleaned_data.get('parent')
+        try:
+            self.instance.path_under(parent)
+        except ValueError as exc:
+            raise ValidationError(str(exc))
+        return parent
+    
     def clean_due_date(self):
         due_date = self.cleaned_data.get('due_date')
         
@@ -64,3 +124,20 @@ class TodoForm(forms.ModelForm):
             raise ValidationError('Due date cannot be in the past.')
         
         return due_date
+
+
+class TodoTitleForm(VersionedFormMixin, forms.ModelForm):
+    """Inline title edit from the list page, with the same rules as TodoForm."""
+    
+    class Meta:
+        model = Todo
+        fields = ['title', 'version']
+        widgets = {'version': forms.HiddenInput()}
+    
+    def __init__(self, *args, owner=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.owner = owner
+        self.fields['version'].required = False
+    
+    clean_title = TodoForm.clean_title
+    similar_todos_warning = TodoForm.similar_todos_warning
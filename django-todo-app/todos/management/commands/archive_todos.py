@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from todos.archive import archivable, archive_todos
+from todos.bulk import CHUNK_SIZE
+from todos.models import Todo
+from todos.routers import get_shards
+
+
+class Command(BaseCommand):
+    help = 'Move resolved TODOs older than TODO_ARCHIVE_AFTER_DAYS to the archive.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            help='Archive resolved TODOs unchanged for this many days '
+                 '(default: TODO_ARCHIVE_AFTER_DAYS).',
+        )
+        parser.add_argument('--batch-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report how many TODOs would be archived.',
+        )
+
+    def handle(self, *args, days=None, batch_size=CHUNK_SIZE, dry_run=False, **options):
+        for shard in get_shards():
+            queryset = archivable(Todo.objects.using(shard), days)
+            if dry_run:
+                self.stdout.write(f'{shard}: {queryset.count()} TODOs to archive.')
+                continue
+            result = archive_todos(queryset, batch_size)
+            self.stdout.write(self.style.SUCCESS(
+                f'{shard}: archived {result.rows} TODOs in {result.batches} batch(es).'
+            ))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from todos.bulk import CHUNK_SIZE, iter_pk_chunks
+from todos.dedup import duplicate_pairs, get_threshold, index_todos
+from todos.models import Todo
+from todos.routers import get_shards
+
+
+class Command(BaseCommand):
+    help = 'List pairs of TODOs (per owner) whose titles are near-duplicates.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold', type=float,
+            help='Minimum title similarity, 0 to 1 (default: TODO_DUPLICATE_THRESHOLD).',
+        )
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Re-index every title first, e.g. after raw SQL imports.',
+        )
+        parser.add_argument('--batch-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, threshold=None, rebuild=False, batch_size=CHUNK_SIZE, **options):
+        threshold = get_threshold() if threshold is None else threshold
+        total = 0
+        for shard in get_shards():
+            if rebuild:
+                for pks in iter_pk_chunks(Todo.objects.using(shard), batch_size):
+                    index_todos(shard, pks)
+            pairs = list(duplicate_pairs(shard, threshold))
+            titles = dict(
+                Todo.objects.using(shard)
+                .filter(pk__in={pk for pair in pairs for pk in pair[1:3]})
+                .values_list('pk', 'title')
+            )
+            for owner_id, todo_id, other_id, score in sorted(pairs, key=lambda pair: -pair[3]):
+                self.stdout.write(
+                    f'{shard}: {score:.2f} #{todo_id} "{titles[todo_id]}" '
+                    f'~ #{other_id} "{titles[other_id]}"'
+                )
+            total += len(pairs)
+        self.stdout.write(self.style.SUCCESS(
+            f'{total} near-duplicate pair(s) at similarity >= {threshold}.'
+        ))
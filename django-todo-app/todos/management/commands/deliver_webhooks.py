@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from todos.models import WebhookEndpoint
+from todos.webhooks import (
+    DELIVERY_BATCH_SIZE, DELIVERY_TIMEOUT, DELIVERY_WORKERS, deliver_pending, endpoint_lag,
+)
+
+
+class Command(BaseCommand):
+    help = 'Deliver outbox events to the active webhook endpoints and report their lag.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DELIVERY_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=DELIVERY_WORKERS)
+        parser.add_argument('--timeout', type=float, default=DELIVERY_TIMEOUT)
+        parser.add_argument('--loop', action='store_true', help='Keep delivering, one pass per --interval.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds between idle passes with --loop.')
+
+    def handle(self, *args, batch_size, workers, timeout, loop, interval, **options):
+        while True:
+            deliveries = deliver_pending(batch_size, workers, timeout)
+            for delivery in deliveries:
+                if delivery.error:
+                    self.stdout.write(self.style.WARNING(
+                        f'{delivery.endpoint}: {delivery.events} events failed ({delivery.error}), '
+                        f'retry at {delivery.endpoint.next_attempt_at:%H:%M:%S}'
+                    ))
+                else:
+                    self.stdout.write(f'{delivery.endpoint}: delivered {delivery.events} events')
+            if not loop:
+                for endpoint in WebhookEndpoint.objects.filter(is_active=True):
+                    lag = endpoint_lag(endpoint)
+                    self.stdout.write(f'{endpoint}: {lag.pending} pending, lag {lag.seconds:.0f}s')
+                return
+            # Drain a backlog without waiting; sleep only when caught up.
+            if not any(d.events >= batch_size and not d.error for d in deliveries):
+                time.sleep(interval)
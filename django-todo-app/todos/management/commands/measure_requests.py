@@ -0,0 +1,66 @@
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from todos.models import Todo
+from todos.routers import get_shards
+
+
+class Command(BaseCommand):
+    help = (
+        'Count the database queries, and those on django_session, of the main '
+        'TODO requests under the current session settings. Runs in a '
+        'transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='Measure as this user instead of anonymously.')
+
+    def handle(self, *args, username=None, **options):
+        user = None
+        if username:
+            try:
+                user = get_user_model().objects.get(username=username)
+            except get_user_model().DoesNotExist:
+                raise CommandError(f'No user named {username!r}.')
+
+        self.stdout.write(
+            f'SESSION_ENGINE={settings.SESSION_ENGINE}\n'
+            f'MESSAGE_STORAGE={settings.MESSAGE_STORAGE}'
+        )
+        self.stdout.write(f'{"request":<28}{"status":>8}{"queries":>9}{"session":>9}')
+        with ExitStack() as stack:
+            for using in {'default', *get_shards()}:
+                stack.enter_context(transaction.atomic(using=using))
+            client = Client(HTTP_HOST='localhost')
+            if user:
+                client.force_login(user)
+            todo = Todo.objects.create(owner=user, title='measure_requests probe')
+            for label, method, url, data in [
+                ('GET list', 'get', reverse('todo_list'), None),
+                ('POST create + redirect', 'post', reverse('todo_create'),
+                 {'title': 'measure_requests new'}),
+                ('POST toggle + redirect', 'post', reverse('todo_toggle', args=[todo.pk]), None),
+                ('POST toggle (fragment)', 'post', reverse('todo_toggle', args=[todo.pk]), None),
+                ('POST delete + redirect', 'post', reverse('todo_delete', args=[todo.pk]), None),
+            ]:
+                extra = {'HTTP_HX_REQUEST': 'true'} if 'fragment' in label else {}
+                with ExitStack() as capture:
+                    contexts = [
+                        capture.enter_context(CaptureQueriesContext(connections[using]))
+                        for using in {'default', *get_shards()}
+                    ]
+                    response = getattr(client, method)(url, data, follow=True, **extra)
+                queries = [query['sql'] for context in contexts for query in context.captured_queries]
+                session = sum('django_session' in sql for sql in queries)
+                self.stdout.write(
+                    f'{label:<28}{response.status_code:>8}{len(queries):>9}{session:>9}'
+                )
+            for using in {'default', *get_shards()}:
+                transaction.set_rollback(True, using=using)
@@ -0,0 +1,47 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+PROBE = 'import sys, time; started = time.perf_counter(); from todos.warmup import probe; probe(started, sys.argv[1])'
+
+COLUMNS = ('import_ms', 'fork_ms', 'first_request_ms', 'second_request_ms')
+
+
+class Command(BaseCommand):
+    help = (
+        'Time fresh serving processes with and without warm-up: importing the '
+        'WSGI application, the worker start (database connections) and the '
+        'first two requests for --path. Medians of --runs processes each.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--path', default='/')
+
+    def run(self, path, warmup):
+        env = {**os.environ, 'TODO_WARMUP': '1' if warmup else '0'}
+        result = subprocess.run(
+            [sys.executable, '-c', PROBE, path],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(f'The probe process failed:\n{result.stderr}')
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, runs, path, **options):
+        if runs < 1:
+            raise CommandError('--runs must be at least 1.')
+        self.stdout.write(f'{"warm-up":<10}{"status":>8}' + ''.join(f'{column:>20}' for column in COLUMNS))
+        for warmup in (False, True):
+            samples = [self.run(path, warmup) for _ in range(runs)]
+            medians = [statistics.median(sample[column] for sample in samples) for column in COLUMNS]
+            self.stdout.write(
+                f'{"on" if warmup else "off":<10}{samples[0]["status"]:>8}'
+                + ''.join(f'{median:>20.1f}' for median in medians)
+            )
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from todos.models import RetentionPolicy
+from todos.retention import PURGE_CHUNK_SIZE, apply_policy, expired_targets, purge_chunks
+from todos.routers import get_shards
+
+
+class Command(BaseCommand):
+    help = (
+        'Enforce the active retention policies, deleting in small chunks. '
+        'An interrupted run resumes where it stopped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PURGE_CHUNK_SIZE)
+        parser.add_argument(
+            '--pause', type=float, default=0.1,
+            help='Seconds to sleep between batches so other writers get the lock.',
+        )
+        parser.add_argument(
+            '--policy', action='append', dest='policies', default=[],
+            help='Only apply the named policy (repeatable).',
+        )
+        parser.add_argument(
+            '--skip-expired', action='store_true',
+            help='Keep expired sync tombstones and outbox events.',
+        )
+
+    def handle(self, *args, batch_size, pause, policies, skip_expired, **options):
+        queryset = RetentionPolicy.objects.filter(is_active=True)
+        if policies:
+            queryset = queryset.filter(name__in=policies)
+            missing = set(policies) - set(queryset.values_list('name', flat=True))
+            if missing:
+                raise CommandError(f'Unknown or inactive policies: {", ".join(sorted(missing))}')
+
+        for policy in queryset:
+            def progress(key, deleted, total):
+                self.stdout.write(f'{policy}: {key} deleted {deleted} (total {total})')
+
+            total = apply_policy(policy, batch_size, pause, progress)
+            self.stdout.write(self.style.SUCCESS(f'{policy}: purged {total} TODOs.'))
+
+        if not skip_expired:
+            totals = {}
+            for using in get_shards():
+                for model, expired in expired_targets(using):
+                    for _, deleted in purge_chunks(expired, batch_size, pause):
+                        totals[model] = totals.get(model, 0) + deleted
+            for model, total in totals.items():
+                self.stdout.write(self.style.SUCCESS(
+                    f'Purged {total} expired {model._meta.verbose_name_plural}.'
+                ))
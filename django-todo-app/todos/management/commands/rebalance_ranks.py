@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from todos.bulk import CHUNK_SIZE
+from todos.ranks import MAX_RANK_LENGTH, owners_to_rebalance, rebalance
+from todos.routers import get_shards
+
+
+class Command(BaseCommand):
+    help = (
+        'Respace the manual-order ranks of owners whose keys have grown long '
+        '(run periodically, e.g. nightly).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-length', type=int, default=MAX_RANK_LENGTH // 2,
+            help='Rebalance owners with a rank longer than this; 0 rebalances everyone.',
+        )
+        parser.add_argument('--batch-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, max_length=MAX_RANK_LENGTH // 2, batch_size=CHUNK_SIZE, **options):
+        for shard in get_shards():
+            owners = owners_to_rebalance(shard, max_length)
+            rows = sum(rebalance(owner_id, shard, batch_size) for owner_id in owners)
+            self.stdout.write(self.style.SUCCESS(
+                f'{shard}: rebalanced {len(owners)} owner(s), {rows} TODO(s).'
+            ))
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from todos import rollups
+from todos.routers import get_shards
+
+
+class Command(BaseCommand):
+    help = (
+        "Record today's overdue counts in the analytics rollups (run daily), "
+        'or rebuild past days with --backfill.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help='Rebuild the rollups of the last --days days from the TODO tables.',
+        )
+        parser.add_argument('--days', type=int, default=365)
+
+    def handle(self, *args, backfill=False, days=365, **options):
+        today = timezone.localdate()
+        for shard in get_shards():
+            if backfill:
+                rows = rollups.backfill(shard, today - timedelta(days=days - 1), today)
+                self.stdout.write(self.style.SUCCESS(
+                    f'{shard}: rebuilt {days} day(s) into {rows} rollup row(s).'
+                ))
+            else:
+                overdue = rollups.snapshot_overdue(shard)
+                self.stdout.write(self.style.SUCCESS(f'{shard}: {overdue} overdue TODOs today.'))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from todos.reminders import REMINDER_BATCH_SIZE, get_sink, run_pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Send reminders for TODOs that became due soon or overdue since the '
+        'last pass. Run it from cron, or with --loop as a worker.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REMINDER_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true', help='Keep running, one pass per --interval.')
+        parser.add_argument('--interval', type=float, default=60, help='Seconds between passes with --loop.')
+
+    def handle(self, *args, batch_size, loop, interval, **options):
+        sink = get_sink()
+        while True:
+            started = time.monotonic()
+            counts = run_pass(sink, batch_size=batch_size)
+            self.stdout.write(
+                f'Sent {counts["due_soon"]} due-soon and {counts["overdue"]} overdue reminders.'
+            )
+            if not loop:
+                return
+            time.sleep(max(0, interval - (time.monotonic() - started)))
@@ -0,0 +1,173 @@
+"""
+Serve collected static files from the app when no CDN or web server does.
+
+``PrecompressedStaticMiddleware`` answers GET/HEAD requests under
+``STATIC_URL`` from ``STATIC_ROOT``, picking the ``.br`` or ``.gz`` variant
+written by ``todos.storage`` when the client accepts it. Files are read
+through per-process memory maps, fingerprinted names are cached for a year,
+and conditional and single-range requests are honoured. Anything it cannot
+find falls through to the rest of the stack.
+"""
+import mimetypes
+import mmap
+import os
+import re
+import threading
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed, SuspiciousFileOperation
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+
+
+# Preferred first; each suffix matches todos.storage.ENCODINGS.
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+
+# ManifestStaticFilesStorage inserts 12 hex digits of the content hash.
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^/]+$')
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=60'
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def accepted_encodings(header):
+    """The content codings ``header`` (Accept-Encoding) allows, ignoring ``q=0``."""
+    accepted = set()
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        try:
+            quality = float(params.strip().removeprefix('q=') or 1)
+        except ValueError:
+            continue
+        if coding and quality > 0:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def parse_range(header, size):
+    """``(start, end)`` inclusive for a single ``bytes=`` range, or ``None`` if unsatisfiable."""
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes.
+        length = int(last)
+        return (max(size - length, 0), size - 1) if length and size else None
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    return (start, end) if start <= end else None
+
+
+class MappedFile:
+    __slots__ = ('data', 'size', 'mtime', 'etag')
+
+    def __init__(self, path, stat, coding):
+        self.size = stat.st_size
+        self.mtime = int(stat.st_mtime)
+        self.etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}{"-" + coding if coding else ""}"'
+        if self.size:
+            with open(path, 'rb') as handle:
+                self.data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.data = b''
+
+
+class PrecompressedStaticMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'TODO_SERVE_STATIC', False) or not settings.STATIC_ROOT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.root = os.fspath(settings.STATIC_ROOT)
+        self.prefix = settings.STATIC_URL
+        self._lock = threading.Lock()
+        self._files = {}
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path_info.startswith(self.prefix):
+            response = self.serve(request, unquote(request.path_info[len(self.prefix):]))
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def open(self, path, coding):
+        """The mapped file at ``path``, re-mapped if it changed on disk; ``None`` if missing."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isfile(path):
+            return None
+        cached = self._files.get(path)
+        if cached is None or cached.size != stat.st_size or cached.mtime != int(stat.st_mtime):
+            cached = MappedFile(path, stat, coding)
+            with self._lock:
+                self._files[path] = cached
+        return cached
+
+    def serve(self, request, name):
+        try:
+            path = safe_join(self.root, name)
+        except (SuspiciousFileOperation, ValueError):
+            return None
+        original = self.open(path, '')
+        if original is None:
+            return None
+
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        coding, mapped = '', original
+        for candidate, suffix in ENCODINGS:
+            if candidate in accepted:
+                variant = self.open(path + suffix, candidate)
+                if variant is not None:
+                    coding, mapped = candidate, variant
+                    break
+
+        headers = {
+            'Vary': 'Accept-Encoding',
+            'ETag': mapped.etag,
+            'Last-Modified': http_date(original.mtime),
+            'Cache-Control': (
+                IMMUTABLE_CACHE_CONTROL if HASHED_NAME_RE.search(name) else DEFAULT_CACHE_CONTROL
+            ),
+            'Accept-Ranges': 'bytes',
+        }
+        if self.not_modified(request, mapped, original.mtime):
+            response = HttpResponseNotModified()
+            for header, value in headers.items():
+                response.headers[header] = value
+            return response
+
+        content_type, _ = mimetypes.guess_type(name)
+        headers['Content-Type'] = content_type or 'application/octet-stream'
+        if coding:
+            headers['Content-Encoding'] = coding
+
+        status, start, end = 200, 0, mapped.size - 1
+        range_header = request.headers.get('Range')
+        if range_header and request.headers.get('If-Range', mapped.etag) == mapped.etag:
+            byte_range = parse_range(range_header, mapped.size)
+            if byte_range is None:
+                return HttpResponse(status=416, headers={
+                    'Content-Range': f'bytes */{mapped.size}',
+                    'Vary': 'Accept-Encoding',
+                })
+            status, (start, end) = 206, byte_range
+            headers['Content-Range'] = f'bytes {start}-{end}/{mapped.size}'
+
+        body = b'' if request.method == 'HEAD' else mapped.data[start:end + 1]
+        response = HttpResponse(body, status=status, headers=headers)
+        response.headers['Content-Length'] = end - start + 1
+        return response
+
+    def not_modified(self, request, mapped, mtime):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+            return '*' in tags or mapped.etag in tags
+        since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        return since is not None and mtime <= since
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:45
+
+import todos.fields
+from django.db import migrations, models
+
+from todos.search import search_shadow
+
+
+BATCH_SIZE = 500
+
+
+def compress_descriptions(apps, schema_editor):
+    Todo = apps.get_model('todos', 'Todo')
+    field = Todo._meta.get_field('description')
+    manager = Todo.objects.using(schema_editor.connection.alias)
+    last_pk = 0
+    while True:
+        batch = list(
+            manager.filter(pk__gt=last_pk)
+            .order_by('pk')
+            .only('pk', 'description')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        changed = [todo for todo in batch if field.should_compress(todo.description)]
+        for todo in changed:
+            todo.description_search = search_shadow(todo.description)
+        manager.bulk_update(changed, ['description', 'description_search'])
+
+
+def decompress_descriptions(apps, schema_editor):
+    Todo = apps.get_model('todos', 'Todo')
+    connection = schema_editor.connection
+    table = connection.ops.quote_name(Todo._meta.db_table)
+    rows = (
+        Todo.objects.using(connection.alias)
+        .filter(description__startswith=todos.fields.COMPRESSED_PREFIX)
+        .values_list('pk', 'description')
+    )
+    with connection.cursor() as cursor:
+        for pk, description in rows.iterator(chunk_size=BATCH_SIZE):
+            cursor.execute(
+                f'UPDATE {table} SET description = %s WHERE id = %s',
+                [description, pk],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='todo',
+            name='description_search',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AlterField(
+            model_name='todo',
+            name='description',
+            field=todos.fields.CompressedTextField(blank=True),
+        ),
+        migrations.RunPython(compress_descriptions, decompress_descriptions),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:46
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0002_todo_description_compression'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(fields=['created_at'], name='todo_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(django.db.models.functions.text.Lower('title'), name='todo_title_lower_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-19 09:56
+
+import django.db.models.deletion
+import django.utils.timezone
+import todos.fields
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0006_todo_change_feed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedTodo',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=200)),
+                ('description', todos.fields.CompressedTextField(blank=True)),
+                ('description_search', models.TextField(blank=True, default='', editable=False)),
+                ('due_date', models.DateTimeField(blank=True, null=True)),
+                ('is_resolved', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_todos', to='todos.category')),
+                ('owner', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_todos', to=settings.AUTH_USER_MODEL)),
+                ('tags', models.ManyToManyField(blank=True, related_name='archived_todos', to='todos.tag')),
+            ],
+            options={
+                'verbose_name': 'Archived TODO',
+                'verbose_name_plural': 'Archived TODOs',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['owner', '-created_at'], name='archive_owner_created_idx'), models.Index(fields=['owner', 'archived_at'], name='archive_owner_archived_idx')],
+            },
+        ),
+    ]
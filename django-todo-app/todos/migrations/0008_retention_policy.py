@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0007_archived_todo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RetentionPolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('category_name', models.CharField(blank=True, help_text='Only purge TODOs in categories with this name; leave blank for all.', max_length=100)),
+                ('days', models.PositiveIntegerField()),
+                ('is_active', models.BooleanField(default=True)),
+                ('checkpoint', models.JSONField(blank=True, default=dict, editable=False)),
+                ('last_run_at', models.DateTimeField(blank=True, editable=False, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Retention policies',
+                'ordering': ['name'],
+            },
+        ),
+    ]
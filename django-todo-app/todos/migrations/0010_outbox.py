@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:03
+
+import django.core.serializers.json
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0009_reminder_scheduler'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookEndpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('url', models.URLField()),
+                ('secret', models.CharField(blank=True, help_text='Signs each delivery (HMAC-SHA256 in X-Todo-Signature).', max_length=100)),
+                ('is_active', models.BooleanField(default=True)),
+                ('cursors', models.JSONField(blank=True, default=dict, editable=False)),
+                ('failures', models.PositiveIntegerField(default=0, editable=False)),
+                ('next_attempt_at', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('last_delivered_at', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('last_error', models.TextField(blank=True, editable=False)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(max_length=30)),
+                ('todo_id', models.BigIntegerField()),
+                ('payload', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('owner', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='todo_events', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from todos.search import trigrams
+
+
+BATCH_SIZE = 500
+
+
+def index_titles(apps, schema_editor):
+    Todo = apps.get_model('todos', 'Todo')
+    TitleTrigram = apps.get_model('todos', 'TitleTrigram')
+    alias = schema_editor.connection.alias
+    rows = Todo.objects.using(alias).order_by('pk').values_list('pk', 'owner_id', 'title')
+    last_pk = 0
+    while True:
+        batch = list(rows.filter(pk__gt=last_pk)[:BATCH_SIZE])
+        if not batch:
+            break
+        last_pk = batch[-1][0]
+        TitleTrigram.objects.using(alias).bulk_create([
+            TitleTrigram(owner_id=owner_id, todo_id=pk, trigram=gram)
+            for pk, owner_id, title in batch
+            for gram in sorted(trigrams(title))
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0010_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TitleTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('owner', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='title_trigrams', to=settings.AUTH_USER_MODEL)),
+                ('todo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='title_trigrams', to='todos.todo')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', 'trigram', 'todo'], name='trigram_owner_lookup_idx')],
+            },
+        ),
+        migrations.RunPython(index_titles, migrations.RunPython.noop),
+    ]
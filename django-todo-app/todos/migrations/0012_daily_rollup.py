@@ -0,0 +1,54 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def stamp_resolved_at(apps, schema_editor):
+    # Best available guess for todos resolved before resolved_at existed.
+    alias = schema_editor.connection.alias
+    for name in ('Todo', 'ArchivedTodo'):
+        apps.get_model('todos', name).objects.using(alias).filter(
+            is_resolved=True,
+        ).update(resolved_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0011_title_trigram'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedtodo',
+            name='resolved_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='todo',
+            name='resolved_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('category_id', models.BigIntegerField(blank=True, null=True)),
+                ('created', models.PositiveIntegerField(default=0)),
+                ('resolved', models.PositiveIntegerField(default=0)),
+                ('reopened', models.PositiveIntegerField(default=0)),
+                ('overdue', models.PositiveIntegerField(default=0)),
+                ('resolve_histogram', models.JSONField(default=dict)),
+                ('owner', models.ForeignKey(blank=True, db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', 'day', 'category_id'], name='rollup_owner_day_idx')],
+            },
+        ),
+        migrations.RunPython(stamp_resolved_at, migrations.RunPython.noop),
+    ]
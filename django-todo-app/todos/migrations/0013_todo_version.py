@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0012_daily_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedtodo',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='todo',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.8 on 2026-10-19 10:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+from todos.ranks import spread
+
+
+def rank_todos(apps, schema_editor):
+    # Start every owner's manual order as the default list order, newest first.
+    Todo = apps.get_model('todos', 'Todo')
+    alias = schema_editor.connection.alias
+    todos = Todo.objects.using(alias)
+    for owner_id in todos.order_by().values_list('owner_id', flat=True).distinct():
+        pks = list(todos.filter(owner_id=owner_id).order_by('-created_at', 'pk').values_list('pk', flat=True))
+        todos.bulk_update(
+            [Todo(pk=pk, rank=rank) for pk, rank in zip(pks, spread(len(pks)))],
+            ['rank'],
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0014_todo_subtasks'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedtodo',
+            name='rank',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='todo',
+            name='rank',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='todo',
+            index=models.Index(fields=['owner', 'rank', 'id'], name='todo_owner_rank_idx'),
+        ),
+        migrations.RunPython(rank_todos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:05
+
+from django.db import migrations
+
+from todos.search import search_shadow
+
+
+BATCH_SIZE = 500
+
+
+def rebuild_shadows(apps, schema_editor):
+    # The shadow now keeps punctuated tokens as well as words.
+    alias = schema_editor.connection.alias
+    for name in ('Todo', 'ArchivedTodo'):
+        model = apps.get_model('todos', name)
+        manager = model.objects.using(alias)
+        last_pk = 0
+        while True:
+            batch = list(
+                manager.filter(pk__gt=last_pk)
+                .exclude(description_search='')
+                .order_by('pk')
+                .only('pk', 'description')[:BATCH_SIZE]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            for row in batch:
+                row.description_search = search_shadow(row.description)
+            manager.bulk_update(batch, ['description_search'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0015_todo_rank'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_shadows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-19 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('todos', '0016_rebuild_search_shadows'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='remindercursor',
+            old_name='due_date',
+            new_name='scanned_until',
+        ),
+        migrations.RemoveField(
+            model_name='remindercursor',
+            name='todo_id',
+        ),
+        migrations.CreateModel(
+            name='ReminderSent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(max_length=50)),
+                ('todo_id', models.BigIntegerField()),
+                ('due_date', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['window', 'due_date'], name='reminder_sent_due_idx')],
+                'constraints': [models.UniqueConstraint(fields=('todo_id', 'window', 'due_date'), name='reminder_sent_uniq')],
+            },
+        ),
+    ]
@@ -1,33 +1,199 @@
-from django.db import models
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, models, router, transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Value
+from django.db.models.functions import Concat, Lower, Substr
 from django.utils import timezone
 
+from .fields import COMPRESSED_PREFIX, CompressedTextField
+from .routers import owner_id_for, shard_for_owner
+from .search import fold_case, prefix_q, search_shadow
+
+
+class OwnedQuerySet(models.QuerySet):
+    def for_owner(self, user):
+        # Pins the queryset to the owner's shard; see todos.routers.
+        owner_id = owner_id_for(user)
+        return self.using(shard_for_owner(owner_id)).filter(owner_id=owner_id)
+    
+    def create(self, **kwargs):
+        # An unpinned create goes to the new row's shard, like a plain save().
+        if self._db is None:
+            owner = kwargs.get('owner')
+            owner_id = kwargs.get('owner_id', getattr(owner, 'pk', None))
+            return super(OwnedQuerySet, self.using(shard_for_owner(owner_id))).create(**kwargs)
+        return super().create(**kwargs)
+
+
+def owner_field(related_name):
+    # No database constraint: owners live on the default database while
+    # their rows may live on another shard. No single-column index either;
+    # the composite indexes all lead with owner.
+    return models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name=related_name,
+        db_constraint=False,
+        db_index=False,
+    )
+
+
+def unique_per_owner(model_name, field):
+    return [
+        models.UniqueConstraint(
+            fields=['owner', field],
+            name=f'{model_name}_owner_{field}_uniq',
+        ),
+        models.UniqueConstraint(
+            fields=[field],
+            condition=Q(owner__isnull=True),
+            name=f'{model_name}_unowned_{field}_uniq',
+        ),
+    ]
+
+
+class ReferenceQuerySet(OwnedQuerySet):
+    def name_prefix(self, prefix):
+        return (
+            self.alias(name_lower=Lower('name'))
+            .filter(prefix_q('name_lower', fold_case(prefix, connections[self.db])))
+            .order_by('name_lower')
+        )
+
+
 class Category(models.Model):
-    name = models.CharField(max_length=100, unique=True)
+    owner = owner_field('todo_categories')
+    name = models.CharField(max_length=100)
     color = models.CharField(max_length=7, default='#007bff')
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = ReferenceQuerySet.as_manager()
+    
     class Meta:
         verbose_name_plural = "Categories"
         ordering = ['name']
+        constraints = unique_per_owner('category', 'name')
+        indexes = [
+            models.Index(F('owner'), Lower('name'), name='category_owner_name_idx'),
+        ]
     
     def __str__(self):
         return self.name
 
 
 class Tag(models.Model):
-    name = models.CharField(max_length=50, unique=True)
-    slug = models.SlugField(unique=True)
+    owner = owner_field('todo_tags')
+    name = models.CharField(max_length=50)
+    slug = models.SlugField()
+    
+    objects = ReferenceQuerySet.as_manager()
     
     class Meta:
         ordering = ['name']
+        constraints = (
+            unique_per_owner('tag', 'name') + unique_per_owner('tag', 'slug')
+        )
+        indexes = [
+            models.Index(F('owner'), Lower('name'), name='tag_owner_name_idx'),
+        ]
     
     def __str__(self):
         return self.name
 
 
+# List sort keys accepted from requests (each also descending with "-").
+SORT_FIELDS = ('created_at', 'updated_at', 'due_date', 'title')
+DEFAULT_SORT = '-created_at'
+MANUAL_SORT = 'manual'
+MAX_SEARCH_LENGTH = 100
+
+
+class VersionConflict(Exception):
+    """A todo was saved from a stale copy; ``current`` is the row as stored now."""
+    
+    def __init__(self, todo, current):
+        super().__init__(f'TODO #{todo.pk} was changed by someone else (now version {current.version}).')
+        self.todo = todo
+        self.current = current
+
+
+class TodoQuerySet(OwnedQuerySet):
+    def search(self, query):
+        # Compressed descriptions are matched through their word shadow.
+        return self.filter(
+            Q(title__icontains=query)
+            | (Q(description__icontains=query)
+               & ~Q(description__startswith=COMPRESSED_PREFIX))
+            | Q(description_search__icontains=query)
+        )
+    
+    def filter_by_params(self, params):
+        """Apply the list filters (filter, search, category, tag, sort) from a query dict."""
+        queryset = self
+        
+        filter_type = params.get('filter', 'all')
+        
+        if filter_type == 'active':
+            queryset = queryset.filter(is_resolved=False)
+        elif filter_type == 'resolved':
+            queryset = queryset.filter(is_resolved=True)
+        elif filter_type == 'overdue':
+            queryset = queryset.filter(
+                is_resolved=False,
+                due_date__lt=timezone.now()
+            )
+        
+        search_query = params.get('search', '')[:MAX_SEARCH_LENGTH]
+        if search_query:
+            queryset = queryset.search(search_query)
+        
+        category_id = params.get('category')
+        if category_id and category_id.isdigit():
+            queryset = queryset.filter(category_id=category_id)
+        
+        tag_id = params.get('tag')
+        if tag_id and tag_id.isdigit():
+            queryset = queryset.filter(tags=tag_id)
+        
+        sort_by = params.get('sort', DEFAULT_SORT)
+        if sort_by == MANUAL_SORT:
+            return queryset.order_by('rank', 'pk')
+        if sort_by.removeprefix('-') not in SORT_FIELDS:
+            sort_by = DEFAULT_SORT
+        return queryset.order_by(sort_by)
+    
+    def status_counts(self):
+        """Total, active, resolved and overdue counts in one aggregate query."""
+        return self.aggregate(
+            total=Count('pk'),
+            active=Count('pk', filter=Q(is_resolved=False)),
+            resolved=Count('pk', filter=Q(is_resolved=True)),
+            overdue=Count('pk', filter=Q(is_resolved=False, due_date__lt=timezone.now())),
+        )
+    
+    def subtree(self, todo, include_self=True):
+        """``todo``'s descendants (and ``todo``): one range scan of the ``(owner, path)`` index."""
+        descendants = Q(owner_id=todo.owner_id) & prefix_q('path', todo.subtree_path)
+        return self.filter(descendants | Q(pk=todo.pk) if include_self else descendants)
+    
+    def leaves(self):
+        """Todos without subtasks."""
+        return self.filter(~Exists(Todo.objects.filter(parent=OuterRef('pk'))))
+    
+    def title_prefix(self, prefix):
+        # Range scan on the LOWER(title) index instead of an unindexable LIKE.
+        return self.alias(title_lower=Lower('title')).filter(
+            prefix_q('title_lower', fold_case(prefix, connections[self.db])),
+        )
+
+
 class Todo(models.Model):
+    owner = owner_field('todos')
     title = models.CharField(max_length=200)
-    description = models.TextField(blank=True)
+    description = CompressedTextField(blank=True)
+    description_search = models.TextField(blank=True, default='', editable=False)
     due_date = models.DateTimeField(null=True, blank=True)
     is_resolved = models.BooleanField(default=False)
     category = models.ForeignKey(
@@ -38,18 +204,392 @@ class Todo(models.Model):
         related_name='todos'
     )
     tags = models.ManyToManyField(Tag, blank=True, related_name='todos')
+    parent = models.ForeignKey(
+        'self',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='children'
+    )
+    # Ids of the ancestors, root first, each followed by '/' ('12/40/' for a
+    # grandchild of #12). Kept by save(); see TodoQuerySet.subtree.
+    path = models.CharField(max_length=255, blank=True, default='', editable=False)
+    # Position in the owner's hand-ordered list (sort=manual); see todos.ranks.
+    rank = models.CharField(max_length=64, blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    resolved_at = models.DateTimeField(null=True, blank=True, editable=False)
     updated_at = models.DateTimeField(auto_now=True)
+    # Moved on by every write; see _do_update.
+    version = models.PositiveIntegerField(default=1)
+    
+    objects = TodoQuerySet.as_manager()
+    
+    # Fields whose changes are reported in outbox events.
+    TRACKED_FIELDS = ('title', 'description', 'due_date', 'is_resolved', 'category_id', 'parent_id')
+    
+    MAX_DEPTH = 16
+    
+    is_archived = False
     
     class Meta:
         ordering = ['-created_at']
         verbose_name = "TODO Item"
         verbose_name_plural = "TODO Items"
+        # Per-owner list queries (TodoListView filters and sorts) lead with
+        # owner; the plain created_at and LOWER(title) indexes serve the
+        # cross-owner admin.
+        indexes = [
+            models.Index(fields=['owner', '-created_at'], name='todo_owner_created_idx'),
+            models.Index(fields=['owner', 'is_resolved', '-created_at'], name='todo_owner_status_idx'),
+            models.Index(fields=['owner', 'is_resolved', 'due_date'], name='todo_owner_status_due_idx'),
+            models.Index(fields=['owner', 'due_date'], name='todo_owner_due_idx'),
+            models.Index(fields=['owner', 'title'], name='todo_owner_title_idx'),
+            models.Index(fields=['owner', 'category', '-created_at'], name='todo_owner_category_idx'),
+            models.Index(fields=['owner', 'updated_at', 'id'], name='todo_owner_updated_idx'),
+            models.Index(fields=['owner', 'path'], name='todo_owner_path_idx'),
+            models.Index(fields=['owner', 'rank', 'id'], name='todo_owner_rank_idx'),
+            models.Index(fields=['created_at'], name='todo_created_at_idx'),
+            models.Index(Lower('title'), name='todo_title_lower_idx'),
+            # Cross-owner due-date scans of the reminder scheduler.
+            models.Index(
+                fields=['due_date', 'id'],
+                condition=Q(is_resolved=False, due_date__isnull=False),
+                name='todo_open_due_idx',
+            ),
+        ]
     
     def __str__(self):
         return self.title
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+    
+    def _remember_values(self):
+        self._loaded_values = {
+            field.attname: getattr(self, field.attname)
+            for field in self._meta.concrete_fields
+            if field.attname in self.__dict__
+        }
+    
+    def changed_fields(self):
+        """Tracked fields changed since the row was loaded or last saved."""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return list(self.TRACKED_FIELDS)
+        return [
+            name for name in self.TRACKED_FIELDS
+            if name in loaded and getattr(self, name) != loaded[name]
+        ]
+    
+    def dirty_fields(self):
+        """Names of the concrete fields assigned a new value since the row was loaded."""
+        loaded = self._loaded_values
+        return [
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.name != 'version' and field.attname in self.__dict__ and (
+                field.attname not in loaded or getattr(self, field.attname) != loaded[field.attname]
+            )
+        ]
+    
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        # Optimistic concurrency: write only if the row still has the version
+        # this instance was loaded (or submitted) with, and move it on.
+        expected = self.version
+        field = self._meta.get_field('version')
+        values = [value for value in values if value[0] is not field] + [(field, None, expected + 1)]
+        updated = super()._do_update(
+            base_qs.filter(version=expected), using, pk_val, values, update_fields, forced_update
+        )
+        if updated:
+            self.version = expected + 1
+        elif base_qs.filter(pk=pk_val).exists():
+            raise VersionConflict(self, base_qs.get(pk=pk_val))
+        return updated
+    
+    @property
+    def subtree_path(self):
+        """The ``path`` prefix shared by every descendant."""
+        return f'{self.path}{self.pk}/'
+    
+    @property
+    def depth(self):
+        return self.path.count('/')
+    
+    @property
+    def ancestor_ids(self):
+        return [int(pk) for pk in self.path.split('/') if pk]
+    
+    def path_under(self, parent):
+        """The ``path`` this todo gets as a subtask of ``parent`` (``None`` for top level)."""
+        if parent is None:
+            return ''
+        if parent.owner_id != self.owner_id:
+            raise ValueError('A subtask must have the same owner as its parent.')
+        if self.pk is not None and (parent.pk == self.pk or parent.path.startswith(self.subtree_path)):
+            raise ValueError('A TODO cannot be moved under itself or one of its subtasks.')
+        if parent.depth + 1 >= self.MAX_DEPTH:
+            raise ValueError(f'Subtasks can be nested at most {self.MAX_DEPTH} levels deep.')
+        return parent.subtree_path
+    
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, '_loaded_values', None)
+        descendants = None
+        if self._state.adding:
+            self.path = self.path_under(self.parent)
+        elif loaded is not None and loaded.get('parent_id', self.parent_id) != self.parent_id:
+            # Moving a subtree: its rows are rewritten below with one UPDATE.
+            descendants = Todo.objects.subtree(self, include_self=False)
+            old_prefix = self.subtree_path
+            self.path = self.path_under(self.parent)
+        field = self._meta.get_field('description')
+        if field.should_compress(self.description):
+            self.description_search = search_shadow(self.description)
+        else:
+            self.description_search = ''
+        if not self.is_resolved:
+            self.resolved_at = None
+        elif self.resolved_at is None:
+            self.resolved_at = timezone.now()
+        update_fields = kwargs.get('update_fields')
+        if (update_fields is None and not self._state.adding
+                and getattr(self, '_loaded_values', None) is not None):
+            # Write only what changed (nothing at all if nothing did).
+            dirty = self.dirty_fields()
+            kwargs['update_fields'] = update_fields = {*dirty, 'updated_at'} if dirty else ()
+        if update_fields is not None and 'description' in update_fields:
+            kwargs['update_fields'] = update_fields = {*update_fields, 'description_search'}
+        if update_fields is not None and 'is_resolved' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'resolved_at'}
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        # post_save writes the outbox event (todos.signals); keep it in the
+        # same transaction as the row.
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+            if descendants is not None:
+                descendants.using(using).update(
+                    path=Concat(Value(self.subtree_path), Substr('path', len(old_prefix) + 1)),
+                )
+        self._remember_values()
+    
+    def delete(self, using=None, keep_parents=False):
+        # Collect the whole subtree at once instead of cascading level by level.
+        using = using or router.db_for_write(type(self), instance=self)
+        return Todo.objects.using(using).subtree(self).delete()
+    
     def is_overdue(self):
         if self.due_date and not self.is_resolved:
             return timezone.now() > self.due_date
         return False
+
+
+class TitleTrigram(models.Model):
+    """One trigram of a todo title, for near-duplicate lookups (``todos.dedup``)."""
+    owner = owner_field('title_trigrams')
+    todo = models.ForeignKey(Todo, on_delete=models.CASCADE, related_name='title_trigrams')
+    trigram = models.CharField(max_length=3)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'trigram', 'todo'], name='trigram_owner_lookup_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.trigram!r} of TODO #{self.todo_id}'
+
+
+class TodoTombstone(models.Model):
+    """Record of a deleted todo, so sync clients can drop their copy."""
+    owner = owner_field('todo_tombstones')
+    todo_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+    
+    objects = OwnedQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'deleted_at', 'id'], name='tombstone_owner_deleted_idx'),
+        ]
+    
+    def __str__(self):
+        return f'Deleted TODO #{self.todo_id}'
+
+
+class ArchivedTodo(models.Model):
+    """
+    A resolved todo moved out of the hot ``Todo`` table by ``todos.archive``.
+
+    Keeps the original primary key, so a restored todo gets its old id (and
+    URLs) back. Queried through the same ``TodoQuerySet`` as live todos.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    owner = owner_field('archived_todos')
+    title = models.CharField(max_length=200)
+    description = CompressedTextField(blank=True)
+    description_search = models.TextField(blank=True, default='', editable=False)
+    due_date = models.DateTimeField(null=True, blank=True)
+    is_resolved = models.BooleanField(default=True)
+    category = models.ForeignKey(
+        Category,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='archived_todos'
+    )
+    tags = models.ManyToManyField(Tag, blank=True, related_name='archived_todos')
+    created_at = models.DateTimeField()
+    resolved_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField()
+    version = models.PositiveIntegerField(default=1)
+    rank = models.CharField(max_length=64, blank=True, default='')
+    # Not a foreign key: the parent may be archived or deleted meanwhile.
+    parent_id = models.BigIntegerField(null=True, blank=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+    
+    # Lists mixing both tables (todos.archive.WithArchive) tell rows apart by this.
+    is_archived = True
+    
+    objects = TodoQuerySet.as_manager()
+    
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Archived TODO"
+        verbose_name_plural = "Archived TODOs"
+        indexes = [
+            models.Index(fields=['owner', '-created_at'], name='archive_owner_created_idx'),
+            models.Index(fields=['owner', 'archived_at'], name='archive_owner_archived_idx'),
+        ]
+    
+    def __str__(self):
+        return self.title
+    
+    def is_overdue(self):
+        return False
+
+
+class RetentionPolicy(models.Model):
+    """
+    Delete resolved todos, live or archived, unchanged for ``days``.
+
+    Enforced by ``manage.py purge_todos``; ``checkpoint`` remembers the last
+    purged id per shard and table so an interrupted run resumes there.
+    """
+    name = models.CharField(max_length=100)
+    category_name = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text='Only purge TODOs in categories with this name; leave blank for all.',
+    )
+    days = models.PositiveIntegerField()
+    is_active = models.BooleanField(default=True)
+    checkpoint = models.JSONField(default=dict, blank=True, editable=False)
+    last_run_at = models.DateTimeField(null=True, blank=True, editable=False)
+    
+    class Meta:
+        verbose_name_plural = "Retention policies"
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
+
+class ReminderCursor(models.Model):
+    """When one reminder window was last scanned, stored on each shard."""
+    name = models.CharField(max_length=50, unique=True)
+    scanned_until = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f'{self.name} @ {self.scanned_until:%Y-%m-%d %H:%M}'
+
+
+class ReminderSent(models.Model):
+    """A reminder already sent for a todo, window and due date."""
+    window = models.CharField(max_length=50)
+    todo_id = models.BigIntegerField()
+    due_date = models.DateTimeField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['todo_id', 'window', 'due_date'], name='reminder_sent_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['window', 'due_date'], name='reminder_sent_due_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.window}: TODO #{self.todo_id} due {self.due_date:%Y-%m-%d %H:%M}'
+
+
+class OutboxEvent(models.Model):
+    """
+    A todo change, written in the transaction that made it and delivered to
+    webhooks afterwards by ``manage.py deliver_webhooks``.
+    """
+    owner = owner_field('todo_events')
+    event_type = models.CharField(max_length=30)
+    todo_id = models.BigIntegerField()
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    objects = OwnedQuerySet.as_manager()
+    
+    def __str__(self):
+        return f'{self.event_type} #{self.todo_id}'
+
+
+class WebhookEndpoint(models.Model):
+    """
+    An integration receiving outbox events. ``cursors`` holds the last
+    delivered event id per shard.
+    """
+    name = models.CharField(max_length=100)
+    url = models.URLField()
+    secret = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text='Signs each delivery (HMAC-SHA256 in X-Todo-Signature).',
+    )
+    is_active = models.BooleanField(default=True)
+    cursors = models.JSONField(default=dict, blank=True, editable=False)
+    failures = models.PositiveIntegerField(default=0, editable=False)
+    next_attempt_at = models.DateTimeField(null=True, blank=True, editable=False)
+    last_delivered_at = models.DateTimeField(null=True, blank=True, editable=False)
+    last_error = models.TextField(blank=True, editable=False)
+    
+    class Meta:
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
+
+class DailyRollup(models.Model):
+    """
+    Per-day TODO activity of one owner and category, kept by ``todos.rollups``.
+
+    ``category_id`` is a plain column so history survives category deletes.
+    Several rows may exist for the same day and category; readers sum them.
+    """
+    owner = owner_field('daily_rollups')
+    day = models.DateField()
+    category_id = models.BigIntegerField(null=True, blank=True)
+    created = models.PositiveIntegerField(default=0)
+    resolved = models.PositiveIntegerField(default=0)
+    reopened = models.PositiveIntegerField(default=0)
+    # Open TODOs past due at the end of the day (at the last snapshot for today).
+    overdue = models.PositiveIntegerField(default=0)
+    # Resolutions per time-to-resolve bucket (index into rollups.BUCKETS).
+    resolve_histogram = models.JSONField(default=dict)
+    
+    objects = OwnedQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['owner', 'day', 'category_id'], name='rollup_owner_day_idx'),
+        ]
+    
+    def __str__(self):
+        return f'{self.day} (category {self.category_id})'
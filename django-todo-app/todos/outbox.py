@@ -0,0 +1,92 @@
+"""
+Transactional outbox.
+
+Every todo change appends an ``OutboxEvent`` on the todo's shard inside the
+transaction that made the change, so an event exists exactly when the change
+committed. Delivery happens later, off the request path: to webhooks by
+``todos.webhooks`` and to open list pages by ``todos.events``.
+
+Readers follow the outbox with a cursor on the primary key. Ids are
+allocated before commit, so a slow transaction can commit an event below
+ids already visible; readers therefore only take events older than
+``TODO_OUTBOX_SETTLE_SECONDS`` (see ``settled``), as the sync feed does.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import events
+from .models import OutboxEvent, Todo
+from .pagination import touch_datasets
+
+
+CREATED = 'todo.created'
+UPDATED = 'todo.updated'
+TOGGLED = 'todo.toggled'
+DELETED = 'todo.deleted'
+ARCHIVED = 'todo.archived'
+
+PAYLOAD_FIELDS = ('title', 'due_date', 'is_resolved', 'category_id', 'parent_id', 'updated_at')
+
+
+def settled():
+    """Events created before this have committed; cursors stop short of newer ones."""
+    return timezone.now() - timedelta(
+        seconds=getattr(settings, 'TODO_OUTBOX_SETTLE_SECONDS', 1)
+    )
+
+
+def _payload(todo_id, owner_id, values, changed):
+    payload = {'id': todo_id, 'owner': owner_id, 'changed': list(changed)}
+    for field in PAYLOAD_FIELDS:
+        if field in values:
+            payload[field.removesuffix('_id')] = values[field]
+    return payload
+
+
+def event_type_for(created, changed):
+    if created:
+        return CREATED
+    return TOGGLED if list(changed) == ['is_resolved'] else UPDATED
+
+
+def record(event_type, todo, using, changed=()):
+    """Append one event for ``todo``; call inside the transaction that changed it."""
+    values = {} if event_type in (DELETED, ARCHIVED) else {
+        field: getattr(todo, field) for field in PAYLOAD_FIELDS
+    }
+    event = OutboxEvent.objects.using(using).create(
+        owner_id=todo.owner_id,
+        event_type=event_type,
+        todo_id=todo.pk,
+        payload=_payload(todo.pk, todo.owner_id, values, changed),
+    )
+    events.publish([event], using)
+    touch_datasets(using, [todo.owner_id])
+    return event
+
+
+def record_many(using, event_type, pks, changed=()):
+    """Append events for the todos ``pks`` with one read and one insert."""
+    rows = Todo.objects.using(using).filter(pk__in=pks).values('pk', 'owner_id', *PAYLOAD_FIELDS)
+    return record_rows(using, event_type, rows, changed)
+
+
+def record_rows(using, event_type, rows, changed=()):
+    """
+    Append events for ``rows``, dicts of ``pk``, ``owner_id`` and any of
+    ``PAYLOAD_FIELDS``, with one insert (e.g. for rows already deleted).
+    """
+    rows = list(rows)
+    recorded = OutboxEvent.objects.using(using).bulk_create([
+        OutboxEvent(
+            owner_id=row['owner_id'],
+            event_type=event_type,
+            todo_id=row['pk'],
+            payload=_payload(row['pk'], row['owner_id'], row, changed),
+        )
+        for row in rows
+    ])
+    events.publish(recorded, using)
+    touch_datasets(using, [row['owner_id'] for row in rows])
@@ -0,0 +1,147 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+from .models import MAX_SEARCH_LENGTH
+
+
+class CachedCountPaginator(Paginator):
+    """
+    Paginator that shares ``COUNT(*)`` results between requests.
+
+    Counts are cached per database and compiled query for ``count_timeout``
+    seconds, so a count may lag behind writes by at most that long.
+    """
+
+    count_timeout = 60
+
+    def count_cache_key(self):
+        sql, params = self.object_list.query.sql_with_params()
+        digest = hashlib.md5(
+            f'{self.object_list.db}:{sql}:{params!r}'.encode(),
+            usedforsecurity=False,
+        ).hexdigest()
+        return f'todos:count:{digest}'
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        key = self.count_cache_key()
+        count = cache.get(key)
+        if count is None:
+            count = self.object_list.count()
+            cache.set(key, count, self.count_timeout)
+        return count
+
+
+# Dataset versions: one per owner and shard, moved on by every todo change
+# (todos.outbox records one event per change; archive moves, purges and
+# bulk deletes call touch_owners_of). A count cached under the current
+# version is exact.
+
+def _version_key(using, owner_id):
+    return f'todos:dataset:{using}:{owner_id}'
+
+
+def dataset_version(using, owner_id):
+    key = _version_key(using, owner_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def touch_datasets(using, owner_ids):
+    """Move the dataset versions of ``owner_ids`` on; call inside the change's transaction."""
+    keys = [_version_key(using, owner_id) for owner_id in set(owner_ids)]
+
+    def bump():
+        cache.set_many({key: uuid.uuid4().hex for key in keys}, None)
+
+    # Bump again once the change is visible, so a count taken before the
+    # commit cannot stay cached under the new version.
+    bump()
+    transaction.on_commit(bump, using=using)
+
+
+def touch_owners_of(queryset):
+    """``touch_datasets`` for the owners of the rows in ``queryset``; call before deleting them."""
+    touch_datasets(queryset.db, queryset.order_by().values_list('owner_id', flat=True).distinct())
+
+
+def filter_signature(params, fields=('archived', 'filter', 'search', 'category', 'tag')):
+    """The parameters that decide a list's rows, normalized, as a cache-key fragment."""
+    values = {name: str(params.get(name, '')).strip() for name in fields}
+    values['search'] = values['search'][:MAX_SEARCH_LENGTH]
+    if values['filter'] not in ('active', 'resolved', 'overdue'):
+        values['filter'] = ''
+    for name in ('category', 'tag'):
+        if not values[name].isdigit():
+            values[name] = ''
+    values['archived'] = '1' if values['archived'] else ''
+    return '&'.join(f'{name}={value}' for name, value in sorted(values.items()))
+
+
+class FilteredCountPaginator(Paginator):
+    """
+    Paginator for an owner's filtered todo lists that counts each result
+    set once.
+
+    The count is cached under the normalized filters (``signature``) and
+    the owner's dataset version, so paging, re-sorting and repeating a
+    search cost no ``COUNT(*)`` until one of the owner's todos changes.
+    Counts of at least ``TODO_APPROXIMATE_COUNT_FROM`` rows are then reused
+    as estimates (``approximate`` is set) for up to ``count_timeout``
+    seconds rather than recounted after every change. Time-dependent
+    filters (overdue) can lag by the same timeout.
+    """
+
+    count_timeout = 300
+
+    def __init__(self, object_list, per_page, *args, signature='', owner_id=None, **kwargs):
+        super().__init__(object_list, per_page, *args, **kwargs)
+        self.signature = signature
+        self.owner_id = owner_id
+        self.approximate = False
+
+    @property
+    def approximate_from(self):
+        return getattr(settings, 'TODO_APPROXIMATE_COUNT_FROM', 10000)
+
+    def count_cache_key(self):
+        digest = hashlib.md5(self.signature.encode(), usedforsecurity=False).hexdigest()
+        return f'todos:filtered-count:{self.object_list.db}:{self.owner_id}:{digest}'
+
+    @cached_property
+    def count(self):
+        using = self.object_list.db
+        version = dataset_version(using, self.owner_id)
+        key = self.count_cache_key()
+        cached = cache.get(key)
+        if cached is not None:
+            cached_version, count = cached
+            if cached_version == version:
+                return count
+            if count >= self.approximate_from:
+                self.approximate = True
+                return count
+        count = self.object_list.count()
+        cache.set(key, (version, count), self.count_timeout)
+        return count
+
+    @property
+    def count_display(self):
+        """``'1,234'``, or ``'about 120,000'`` for an estimate (two significant digits)."""
+        if not self.approximate:
+            return f'{self.count:,}'
+        scale = 10 ** max(len(str(self.count)) - 2, 0)
+        return f'about {round(self.count / scale) * scale:,}'
@@ -0,0 +1,155 @@
+"""
+Manual ordering (``sort=manual``) with fractional ranks.
+
+``Todo.rank`` is a string of base-36 digits read as a fraction, so there is
+always a key between two others: moving a todo rewrites its own rank and no
+other row. Keys never end in ``0``, which leaves room before any key, and
+only use characters that sort the same bytewise and under the usual
+collations. Repeated moves into the same gap make keys longer, and
+concurrent inserts can tie; the request path never respaces a list for
+that. ``rebalance`` rewrites an owner's ranks evenly spaced and short
+again, chunk by chunk, from the periodic ``manage.py rebalance_ranks``.
+"""
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import Length
+
+from .bulk import CHUNK_SIZE
+from .models import Todo
+
+
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+BASE = len(DIGITS)
+
+# Keys should stay shorter than this; rebalance_ranks respaces an owner's
+# list once a key passes half of it.
+MAX_RANK_LENGTH = 24
+
+
+def _after(low):
+    # A short step past ``low``: the next first digit where there is one.
+    digit = DIGITS.index(low[0])
+    if digit < BASE - 1:
+        return DIGITS[digit + 1]
+    return low[0] + (_after(low[1:]) if len(low) > 1 else DIGITS[1])
+
+
+def _before(high):
+    digit = DIGITS.index(high[0])
+    if digit > 1:
+        return DIGITS[digit - 1]
+    if digit == 1:
+        return DIGITS[0] + DIGITS[-1]
+    return high[0] + _before(high[1:])
+
+
+def between(low, high):
+    """
+    A key sorting strictly after ``low`` and before ``high``; ``None`` (or
+    ``''``) means no bound on that side. Keys added again and again at one
+    end of the list grow by one character every 35 or so.
+    """
+    low = low or ''
+    if high is not None and not low < high:
+        raise ValueError(f'No rank between {low!r} and {high!r}.')
+    if low and high is None:
+        return _after(low)
+    if high and not low:
+        return _before(high)
+    if high:
+        # Keep the common prefix (``low`` padded with zeros).
+        shared = 0
+        while shared < len(high) and (low[shared] if shared < len(low) else '0') == high[shared]:
+            shared += 1
+        if shared:
+            return high[:shared] + between(low[shared:], high[shared:])
+    low_digit = DIGITS.index(low[0]) if low else 0
+    high_digit = DIGITS.index(high[0]) if high else BASE
+    if high_digit - low_digit > 1:
+        return DIGITS[(low_digit + high_digit) // 2]
+    if high and len(high) > 1:
+        return high[0]
+    return DIGITS[low_digit] + between(low[1:], None)
+
+
+def spread(count):
+    """``count`` increasing keys of equal length spread evenly over the key space."""
+    width = 1
+    while BASE ** width <= count:
+        width += 1
+    step = BASE ** width // (count + 1)
+    keys = []
+    for position in range(1, count + 1):
+        value, digits = position * step, []
+        for _ in range(width):
+            value, digit = divmod(value, BASE)
+            digits.append(DIGITS[digit])
+        # Trailing zeros add nothing to the order; dropping them keeps the
+        # no-trailing-zero rule.
+        keys.append(''.join(reversed(digits)).rstrip('0'))
+    return keys
+
+
+def first_rank(owner_id, using):
+    """A rank ahead of the owner's whole list, for a new todo."""
+    top = (
+        Todo.objects.using(using).filter(owner_id=owner_id)
+        .order_by('rank', 'pk').values_list('rank', flat=True).first()
+    )
+    return between(None, top or None)
+
+
+def move(todo, after=None, before=None):
+    """
+    Put ``todo`` between ``after`` and ``before`` (todos of the same owner,
+    either may be ``None`` for the ends of the list) with one row update.
+    Tied neighbours leave no gap between them; the todo then goes just
+    past both until ``rebalance_ranks`` spreads the tie. ``ValueError`` if
+    ``after`` sorts after ``before``.
+    """
+    using = todo._state.db
+    low = after.rank if after is not None else None
+    high = before.rank if before is not None else None
+    if low is not None and low == high:
+        high = (
+            Todo.objects.using(using).filter(owner_id=todo.owner_id, rank__gt=low)
+            .order_by('rank').values_list('rank', flat=True).first()
+        )
+    todo.rank = between(low, high)
+    todo.save()
+    return todo
+
+
+def rebalance(owner_id, using, chunk_size=CHUNK_SIZE):
+    """
+    Rewrite the ranks of ``owner_id``'s todos on ``using`` evenly spaced in
+    their current order, one transaction per chunk. Returns the number of
+    todos. A move committed between chunks keeps its place relative to its
+    old neighbours only approximately.
+    """
+    pks = list(
+        Todo.objects.using(using).filter(owner_id=owner_id)
+        .order_by('rank', 'pk').values_list('pk', flat=True)
+    )
+    keys = spread(len(pks))
+    for start in range(0, len(pks), chunk_size):
+        with transaction.atomic(using=using):
+            Todo.objects.using(using).bulk_update(
+                [Todo(pk=pk, rank=key) for pk, key in zip(pks[start:start + chunk_size], keys[start:])],
+                ['rank'],
+            )
+    return len(pks)
+
+
+def owners_to_rebalance(using, max_length=MAX_RANK_LENGTH // 2):
+    """Owners on ``using`` with a rank longer than ``max_length`` or shared by two todos."""
+    todos = Todo.objects.using(using).order_by()
+    long_keys = (
+        todos.alias(rank_length=Length('rank')).filter(rank_length__gt=max_length)
+        .values_list('owner_id', flat=True).distinct()
+    )
+    ties = (
+        todos.values('owner_id', 'rank').annotate(rows=Count('pk')).filter(rows__gt=1)
+        .values_list('owner_id', flat=True).distinct()
+    )
+    return list({*long_keys, *ties})
@@ -0,0 +1,165 @@
+"""
+Due-date reminders.
+
+Each pass re-scans both windows on every shard, as range scans on
+``todo_open_due_idx``: ``due_soon`` holds open todos due after the previous
+pass (``ReminderCursor``) and up to ``TODO_REMINDER_LEAD_MINUTES`` from
+now, ``overdue`` those that fell due since the previous pass or within the
+lead time before it. Todos created, reopened or rescheduled into a window
+behind an earlier pass are therefore still reported.
+``ReminderSent`` records what was reported, so a todo is reminded once per
+window and due date (again after its due date changes); entries are pruned
+once their due date has left the window. Reminders go to the configured
+sink in batches and are recorded after the sink accepts each batch, so
+delivery is at-least-once.
+"""
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage, get_connection
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import ReminderCursor, ReminderSent, Todo
+from .routers import get_shards
+
+
+REMINDER_BATCH_SIZE = 500
+
+WINDOWS = ('due_soon', 'overdue')
+
+
+def lead_time():
+    return timedelta(minutes=getattr(settings, 'TODO_REMINDER_LEAD_MINUTES', 60))
+
+
+def window_range(window, now, scanned_until):
+    """``(after, until)``: the due dates ``window`` covers in a pass at ``now``."""
+    since = min(scanned_until, now)
+    if window == 'due_soon':
+        return since, now + lead_time()
+    return since - lead_time(), now
+
+
+class LogSink:
+    """Write each reminder to the ``todos.reminders`` logger."""
+
+    def __init__(self, logger='todos.reminders'):
+        self.logger = logging.getLogger(logger)
+
+    def send(self, reminders):
+        for reminder in reminders:
+            self.logger.info(
+                '%s: TODO #%s "%s" due %s',
+                reminder['window'], reminder['todo_id'], reminder['title'],
+                reminder['due_date'].isoformat(),
+            )
+
+
+class FileSink:
+    """Append reminders to ``path`` as JSON lines."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, reminders):
+        with open(self.path, 'a', encoding='utf-8') as handle:
+            for reminder in reminders:
+                handle.write(json.dumps(reminder, cls=DjangoJSONEncoder) + '\n')
+
+
+class EmailSink:
+    """
+    Mail each owner through ``EMAIL_BACKEND``; point it at a local SMTP
+    stand-in (or the console backend) outside production. Reminders for
+    unowned todos or owners without an address are dropped.
+    """
+
+    def __init__(self, from_email=None):
+        self.from_email = from_email
+
+    def send(self, reminders):
+        emails = dict(
+            get_user_model().objects
+            .filter(pk__in={reminder['owner_id'] for reminder in reminders})
+            .exclude(email='')
+            .values_list('pk', 'email')
+        )
+        messages = [
+            EmailMessage(
+                subject=f'TODO {"due soon" if reminder["window"] == "due_soon" else "overdue"}: {reminder["title"]}',
+                body=f'"{reminder["title"]}" is due {reminder["due_date"]:%Y-%m-%d %H:%M}.',
+                from_email=self.from_email,
+                to=[emails[reminder['owner_id']]],
+            )
+            for reminder in reminders
+            if reminder['owner_id'] in emails
+        ]
+        if messages:
+            get_connection().send_messages(messages)
+
+
+def get_sink():
+    sink_class = import_string(getattr(settings, 'TODO_REMINDER_SINK', 'todos.reminders.LogSink'))
+    return sink_class(**getattr(settings, 'TODO_REMINDER_SINK_OPTIONS', {}))
+
+
+def scan_window(using, window, sink, now=None, batch_size=REMINDER_BATCH_SIZE):
+    """Report todos in ``window`` on shard ``using`` not reported yet; returns how many."""
+    now = now or timezone.now()
+    # A new cursor starts at ``now``: history is never replayed.
+    cursor, _ = ReminderCursor.objects.using(using).get_or_create(
+        name=window, defaults={'scanned_until': now},
+    )
+    after, until = window_range(window, now, cursor.scanned_until)
+    sent_log = ReminderSent.objects.using(using).filter(window=window)
+    candidates = Todo.objects.using(using).filter(
+        is_resolved=False,
+        due_date__isnull=False,
+        due_date__gt=after,
+        due_date__lte=until,
+    ).exclude(
+        Exists(sent_log.filter(todo_id=OuterRef('pk'), due_date=OuterRef('due_date')))
+    ).order_by('due_date', 'pk')
+    sent = 0
+    while True:
+        batch = list(candidates.values('pk', 'owner_id', 'title', 'due_date')[:batch_size])
+        if batch:
+            sink.send([
+                {
+                    'window': window,
+                    'todo_id': row['pk'],
+                    'owner_id': row['owner_id'],
+                    'title': row['title'],
+                    'due_date': row['due_date'],
+                }
+                for row in batch
+            ])
+            sent_log.bulk_create(
+                [ReminderSent(window=window, todo_id=row['pk'], due_date=row['due_date']) for row in batch],
+                ignore_conflicts=True,
+            )
+            sent += len(batch)
+        if len(batch) < batch_size:
+            break
+    # Entries due before the window can never match again.
+    sent_log.filter(due_date__lte=after).delete()
+    cursor.scanned_until = now
+    cursor.save(update_fields=['scanned_until', 'updated_at'])
+    return sent
+
+
+def run_pass(sink=None, now=None, batch_size=REMINDER_BATCH_SIZE):
+    """Scan every window on every shard; returns ``{window: count}``."""
+    sink = sink or get_sink()
+    now = now or timezone.now()
+    counts = dict.fromkeys(WINDOWS, 0)
+    for using in get_shards():
+        for window in WINDOWS:
+            counts[window] += scan_window(using, window, sink, now, batch_size)
+    return counts
@@ -0,0 +1,111 @@
+"""
+Retention: chunked, resumable purges of old todos.
+
+Each ``RetentionPolicy`` is applied to live and archived todos on every
+shard. Rows are deleted in ascending id chunks, one short transaction per
+chunk with an optional pause in between, so writers are never blocked for
+long. The last purged id is checkpointed on the policy after every chunk.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .bulk import delete_rows, iter_pk_chunks
+from .models import ArchivedTodo, OutboxEvent, Todo, TodoTombstone
+from .pagination import touch_datasets
+from .routers import get_shards
+
+
+PURGE_CHUNK_SIZE = 500
+
+
+def policy_targets(policy, using):
+    """Yield ``(checkpoint_key, queryset)`` for everything ``policy`` purges on ``using``."""
+    cutoff = timezone.now() - timedelta(days=policy.days)
+    for model in (Todo, ArchivedTodo):
+        queryset = model.objects.using(using).filter(
+            is_resolved=True,
+            updated_at__lt=cutoff,
+        )
+        if policy.category_name:
+            queryset = queryset.filter(category__name=policy.category_name)
+        if model is Todo:
+            # Deleting a todo deletes its subtasks; leave parents for later runs.
+            queryset = queryset.leaves()
+        yield f'{using}:{model._meta.model_name}', queryset
+
+
+# Bookkeeping rows dropped after a fixed age: (model, timestamp, setting, default days).
+EXPIRING = [
+    (TodoTombstone, 'deleted_at', 'TODO_TOMBSTONE_RETENTION_DAYS', 30),
+    (OutboxEvent, 'created_at', 'TODO_OUTBOX_RETENTION_DAYS', 7),
+]
+
+
+def expired_targets(using):
+    """Yield ``(model, queryset)`` of expired tombstones and outbox events on ``using``."""
+    for model, field, setting, default in EXPIRING:
+        cutoff = timezone.now() - timedelta(days=getattr(settings, setting, default))
+        yield model, model.objects.using(using).filter(**{f'{field}__lt': cutoff})
+
+
+def delete_archived_rows(queryset):
+    """
+    Delete the archived todos in ``queryset`` and their tag links with plain
+    ``DELETE`` statements; returns how many. ``QuerySet.delete()`` would
+    load every row, descriptions included, to collect the tag links.
+    """
+    using = queryset.db
+    rows = list(queryset.order_by().values_list('pk', 'owner_id'))
+    if not rows:
+        return 0
+    pks = [pk for pk, _ in rows]
+    touch_datasets(using, {owner_id for _, owner_id in rows})
+    ArchivedTodo.tags.through.objects.using(using).filter(archivedtodo_id__in=pks).delete()
+    return ArchivedTodo.objects.using(using).filter(pk__in=pks)._raw_delete(using)
+
+
+def purge_chunks(queryset, chunk_size=PURGE_CHUNK_SIZE, pause=0, start_after=None):
+    """
+    Delete ``queryset`` chunk by chunk, yielding ``(last_pk, deleted)``
+    after each committed chunk.
+    """
+    if start_after is not None:
+        queryset = queryset.filter(pk__gt=start_after)
+    for index, pks in enumerate(iter_pk_chunks(queryset, chunk_size)):
+        if index and pause:
+            time.sleep(pause)
+        with transaction.atomic(using=queryset.db):
+            # Re-apply the filter: rows changed since the chunk was listed
+            # (e.g. a reopened todo) no longer match and are kept.
+            chunk = queryset.filter(pk__in=pks)
+            if queryset.model is Todo:
+                deleted = delete_rows(chunk)
+            elif queryset.model is ArchivedTodo:
+                deleted = delete_archived_rows(chunk)
+            else:
+                _, per_model = chunk.delete()
+                deleted = per_model.get(queryset.model._meta.label, 0)
+        yield pks[-1], deleted
+
+
+def apply_policy(policy, chunk_size=PURGE_CHUNK_SIZE, pause=0, progress=None):
+    """Enforce ``policy`` on every shard; returns the number of todos deleted."""
+    total = 0
+    for using in get_shards():
+        for key, queryset in policy_targets(policy, using):
+            for last_pk, deleted in purge_chunks(
+                queryset, chunk_size, pause, policy.checkpoint.get(key)
+            ):
+                total += deleted
+                policy.checkpoint[key] = last_pk
+                policy.save(update_fields=['checkpoint'])
+                if progress:
+                    progress(key, deleted, total)
+            policy.checkpoint.pop(key, None)
+    policy.last_run_at = timezone.now()
+    policy.save(update_fields=['checkpoint', 'last_run_at'])
+    return total
@@ -0,0 +1,239 @@
+"""
+Daily activity rollups behind the analytics dashboard.
+
+Creations, resolutions and reopenings are added to ``DailyRollup`` rows per
+owner, category and day inside the transaction of the change
+(``todos.signals``, ``todos.bulk``); ``snapshot_overdue`` records how many
+open todos are past due, once a day from ``manage.py rollup_todos``. Reports
+read only the rollups, so they cost the same whatever the size of the todo
+tables. ``backfill`` rebuilds past days from the todo tables.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ArchivedTodo, Category, DailyRollup, Todo
+
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Upper bounds (seconds) of the time-to-resolve histogram buckets.
+BUCKETS = (HOUR, 4 * HOUR, DAY, 2 * DAY, 7 * DAY, 14 * DAY, 30 * DAY, 90 * DAY, None)
+
+COUNTERS = ('created', 'resolved', 'reopened', 'overdue')
+
+REPORT_DAYS = 30
+MAX_REPORT_DAYS = 366
+
+
+def bucket_for(seconds):
+    for index, bound in enumerate(BUCKETS):
+        if bound is None or seconds < bound:
+            return index
+
+
+def median_seconds(histogram):
+    """Median time-to-resolve from a merged histogram, interpolated within its bucket."""
+    total = sum(histogram.values())
+    if not total:
+        return None
+    seen = 0
+    for index, bound in enumerate(BUCKETS):
+        count = histogram.get(str(index), 0)
+        low = BUCKETS[index - 1] if index else 0
+        if count and seen + count >= total / 2:
+            if bound is None:
+                return low
+            return low + (bound - low) * (total / 2 - seen) / count
+        seen += count
+
+
+def add(using, owner_id, category_id, day, created=0, resolved=0, reopened=0, durations=()):
+    """Add to the rollup of ``(owner_id, category_id, day)``; call inside the change's transaction."""
+    rollup = (
+        DailyRollup.objects.using(using).select_for_update()
+        .filter(owner_id=owner_id, category_id=category_id, day=day).first()
+    ) or DailyRollup(owner_id=owner_id, category_id=category_id, day=day)
+    rollup.created += created
+    rollup.resolved += resolved
+    rollup.reopened += reopened
+    for seconds in durations:
+        key = str(bucket_for(seconds))
+        rollup.resolve_histogram[key] = rollup.resolve_histogram.get(key, 0) + 1
+    rollup.save(using=using)
+
+
+def record_change(todo, using, created, changed):
+    """Roll up a saved ``todo`` given the tracked fields that changed."""
+    if created:
+        add(
+            using, todo.owner_id, todo.category_id, timezone.localdate(todo.created_at),
+            created=1, resolved=int(todo.is_resolved), durations=[0] if todo.is_resolved else (),
+        )
+    elif 'is_resolved' in changed and todo.is_resolved:
+        add(
+            using, todo.owner_id, todo.category_id, timezone.localdate(todo.resolved_at),
+            resolved=1, durations=[(todo.resolved_at - todo.created_at).total_seconds()],
+        )
+    elif 'is_resolved' in changed:
+        add(using, todo.owner_id, todo.category_id, timezone.localdate(), reopened=1)
+
+
+def record_resolutions(using, rows, resolved, now):
+    """Roll up a bulk resolve (or reopen) of ``rows``: dicts of owner_id, category_id, created_at."""
+    groups = defaultdict(list)
+    for row in rows:
+        groups[row['owner_id'], row['category_id']].append((now - row['created_at']).total_seconds())
+    for (owner_id, category_id), durations in groups.items():
+        if resolved:
+            add(using, owner_id, category_id, timezone.localdate(now),
+                resolved=len(durations), durations=durations)
+        else:
+            add(using, owner_id, category_id, timezone.localdate(now), reopened=len(durations))
+
+
+def _overdue_counts(using, moment):
+    """Open-and-past-due todo counts per ``(owner_id, category_id)`` as of ``moment``."""
+    counts = defaultdict(int)
+    for model in (Todo, ArchivedTodo):
+        rows = (
+            model.objects.using(using)
+            .filter(due_date__lt=moment, created_at__lt=moment)
+            .filter(Q(is_resolved=False) | Q(resolved_at__gt=moment))
+            .values('owner_id', 'category_id')
+            .annotate(count=Count('pk'))
+        )
+        for row in rows:
+            counts[row['owner_id'], row['category_id']] += row['count']
+    return counts
+
+
+def snapshot_overdue(using, now=None):
+    """Store today's overdue counts on ``using``; returns the number of overdue todos."""
+    now = now or timezone.now()
+    today = timezone.localdate(now)
+    # Only live todos can be open; this scan uses the open-due partial index.
+    rows = (
+        Todo.objects.using(using)
+        .filter(is_resolved=False, due_date__lt=now)
+        .values('owner_id', 'category_id')
+        .annotate(count=Count('pk'))
+    )
+    DailyRollup.objects.using(using).filter(day=today).update(overdue=0)
+    total = 0
+    for row in rows:
+        rollup = (
+            DailyRollup.objects.using(using)
+            .filter(owner_id=row['owner_id'], category_id=row['category_id'], day=today).first()
+        ) or DailyRollup(owner_id=row['owner_id'], category_id=row['category_id'], day=today)
+        rollup.overdue = row['count']
+        rollup.save(using=using)
+        total += row['count']
+    return total
+
+
+def backfill(using, start, end):
+    """
+    Rebuild the rollups of ``start``..``end`` (dates, inclusive) on ``using``
+    from live and archived todos. Reopenings are not recorded in the todo
+    tables, so rebuilt days count none. Returns the number of rows written.
+    """
+    tallies = defaultdict(lambda: {'created': 0, 'resolved': 0, 'overdue': 0, 'resolve_histogram': {}})
+    tz = timezone.get_current_timezone()
+    now = timezone.now()
+    for model in (Todo, ArchivedTodo):
+        manager = model.objects.using(using)
+        created = (
+            manager.annotate(day=TruncDate('created_at'))
+            .filter(day__range=(start, end))
+            .values('owner_id', 'category_id', 'day')
+            .annotate(count=Count('pk'))
+        )
+        for row in created:
+            tallies[row['owner_id'], row['category_id'], row['day']]['created'] += row['count']
+        resolved = (
+            manager.filter(resolved_at__date__range=(start, end))
+            .values_list('owner_id', 'category_id', 'created_at', 'resolved_at')
+        )
+        for owner_id, category_id, created_at, resolved_at in resolved.iterator():
+            tally = tallies[owner_id, category_id, timezone.localdate(resolved_at)]
+            tally['resolved'] += 1
+            key = str(bucket_for((resolved_at - created_at).total_seconds()))
+            tally['resolve_histogram'][key] = tally['resolve_histogram'].get(key, 0) + 1
+    day = start
+    while day <= end:
+        end_of_day = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min), tz)
+        for (owner_id, category_id), count in _overdue_counts(using, min(end_of_day, now)).items():
+            tallies[owner_id, category_id, day]['overdue'] = count
+        day += timedelta(days=1)
+
+    DailyRollup.objects.using(using).filter(day__range=(start, end)).delete()
+    rows = DailyRollup.objects.using(using).bulk_create([
+        DailyRollup(owner_id=owner_id, category_id=category_id, day=day, **tally)
+        for (owner_id, category_id, day), tally in tallies.items()
+    ])
+    return len(rows)
+
+
+def report_days(value):
+    """The report length requested by ``value`` (a query parameter), clamped."""
+    try:
+        return max(1, min(int(value or REPORT_DAYS), MAX_REPORT_DAYS))
+    except ValueError:
+        return REPORT_DAYS
+
+
+def report(owner, days=REPORT_DAYS, today=None):
+    """
+    The owner's activity over the last ``days`` days: a per-day series, per
+    category totals and the median time-to-resolve, from rollups alone.
+    """
+    today = today or timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    rows = (
+        DailyRollup.objects.for_owner(owner)
+        .filter(day__range=(start, today))
+        .values('day', 'category_id', *COUNTERS, 'resolve_histogram')
+    )
+    series = {start + timedelta(days=offset): dict.fromkeys(COUNTERS, 0) for offset in range(days)}
+    categories = defaultdict(lambda: {**dict.fromkeys(COUNTERS, 0), 'resolve_histogram': {}})
+    histogram = {}
+    for row in rows:
+        category = categories[row['category_id']]
+        for counter in COUNTERS:
+            series[row['day']][counter] += row[counter]
+            if counter != 'overdue' or row['day'] == today:
+                category[counter] += row[counter]
+        for key, count in row['resolve_histogram'].items():
+            histogram[key] = histogram.get(key, 0) + count
+            category['resolve_histogram'][key] = category['resolve_histogram'].get(key, 0) + count
+
+    names = dict(
+        Category.objects.for_owner(owner)
+        .filter(pk__in=[pk for pk in categories if pk is not None])
+        .values_list('pk', 'name')
+    )
+    totals = {counter: sum(day[counter] for day in series.values()) for counter in COUNTERS}
+    totals['overdue'] = series[today]['overdue']
+    return {
+        'start': start,
+        'end': today,
+        'days': [{'day': day, **counts} for day, counts in series.items()],
+        'categories': sorted(
+            (
+                {
+                    'id': pk,
+                    'name': names.get(pk, 'Uncategorized' if pk is None else 'Deleted category'),
+                    **{counter: category[counter] for counter in COUNTERS},
+                    'median_resolve_seconds': median_seconds(category['resolve_histogram']),
+                }
+                for pk, category in categories.items()
+            ),
+            key=lambda category: (-category['created'], category['name']),
+        ),
+        'totals': {**totals, 'median_resolve_seconds': median_seconds(histogram)},
+    }
@@ -0,0 +1,70 @@
+"""
+Owner-based sharding for the todos app.
+
+``settings.TODO_SHARDS`` lists the database aliases holding todos data.
+Every owner lives on exactly one shard (``owner_id % len(TODO_SHARDS)``);
+unowned rows live on the first. Querysets are pinned to a shard by
+``for_owner()``; this router places new rows and keeps migrations and
+relations consistent with that layout.
+"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+APP_LABEL = 'todos'
+
+
+def get_shards():
+    return list(getattr(settings, 'TODO_SHARDS', [DEFAULT_DB_ALIAS]))
+
+
+def owner_id_for(user):
+    """Return the owner id for ``user``; anonymous users share the unowned workspace."""
+    if user is None or not getattr(user, 'is_authenticated', False):
+        return None
+    return user.pk
+
+
+def shard_for_owner(owner_id):
+    shards = get_shards()
+    if owner_id is None:
+        return shards[0]
+    return shards[owner_id % len(shards)]
+
+
+class OwnerShardRouter:
+    def _db_for(self, model, hints):
+        if model._meta.app_label != APP_LABEL:
+            return None
+        instance = hints.get('instance')
+        if instance is None:
+            return None
+        if instance._state.db:
+            return instance._state.db
+        if hasattr(instance, 'owner_id'):
+            return shard_for_owner(instance.owner_id)
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._db_for(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db_for(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        labels = {obj1._meta.app_label, obj2._meta.app_label}
+        if labels == {APP_LABEL}:
+            return obj1._state.db == obj2._state.db
+        if APP_LABEL in labels:
+            # Owners (auth users) stay on the default database; owner
+            # foreign keys are declared without database constraints.
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        shards = get_shards()
+        if app_label == APP_LABEL:
+            return db in shards
+        if db in shards and db != DEFAULT_DB_ALIAS:
+            return False
+        return None
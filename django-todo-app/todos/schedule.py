@@ -0,0 +1,90 @@
+"""
+Todos by due day, for the calendar views and ``/api/calendar/``.
+
+``by_due_day`` reads a date range with one range scan of the
+``(owner, due_date)`` index. The database does the bucketing: it truncates
+each due date to a day and numbers and counts the rows per day with window
+functions, so only the first ``per_day`` rows of each day are returned,
+each as a small ``values()`` row.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import Count, F, Window
+from django.db.models.functions import RowNumber, TruncDate
+from django.utils import timezone
+
+
+PER_DAY = 5
+MAX_PER_DAY = 50
+MAX_RANGE_DAYS = 92
+
+# Requested dates are clamped to this range, which leaves room for the grid
+# around them, the previous/next links and an API range from them.
+FIRST_DAY = date.min + timedelta(days=MAX_RANGE_DAYS)
+LAST_DAY = date.max - timedelta(days=MAX_RANGE_DAYS)
+
+ROW_FIELDS = ('id', 'title', 'is_resolved', 'due_date', 'category_id')
+
+
+def parse_date(value, default):
+    """``value`` as a date between ``FIRST_DAY`` and ``LAST_DAY``; ``default`` if not a date."""
+    try:
+        day = date.fromisoformat(value) if value else default
+    except ValueError:
+        day = default
+    return min(max(day, FIRST_DAY), LAST_DAY)
+
+
+def month_grid(year, month):
+    """First and last day of the Monday-to-Sunday weeks covering the month."""
+    first = date(year, month, 1)
+    last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return first - timedelta(days=first.weekday()), last + timedelta(days=6 - last.weekday())
+
+
+def week_range(day):
+    start = day - timedelta(days=day.weekday())
+    return start, start + timedelta(days=6)
+
+
+def _midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def by_due_day(queryset, start, end, per_day=PER_DAY):
+    """
+    Todos of ``queryset`` due from ``start`` to ``end`` (dates, inclusive),
+    as ``{day: {'total': n, 'todos': [row, ...], 'more': n}}`` with at most
+    ``per_day`` rows per day, earliest due first.
+    """
+    day = TruncDate('due_date')
+    rows = (
+        queryset
+        .filter(due_date__gte=_midnight(start), due_date__lt=_midnight(end + timedelta(days=1)))
+        .annotate(
+            day=day,
+            position=Window(RowNumber(), partition_by=[day], order_by=[F('due_date').asc(), F('pk').asc()]),
+            total=Window(Count('pk'), partition_by=[day]),
+        )
+        .filter(position__lte=per_day)
+        .order_by('due_date', 'pk')
+        .values('day', 'total', *ROW_FIELDS)
+    )
+    days = {}
+    for row in rows:
+        bucket = days.setdefault(row.pop('day'), {'total': row['total'], 'todos': []})
+        del row['total']
+        bucket['todos'].append(row)
+    for bucket in days.values():
+        bucket['more'] = bucket['total'] - len(bucket['todos'])
+    return days
+
+
+def weeks(start, end, days):
+    """Calendar rows: lists of seven ``(date, bucket)`` pairs from ``start`` to ``end``."""
+    cells = []
+    day = start
+    while day <= end:
+        cells.append((day, days.get(day, {'total': 0, 'todos': [], 'more': 0})))
+        day += timedelta(days=1)
+    return [cells[index:index + 7] for index in range(0, len(cells), 7)]
@@ -0,0 +1,91 @@
+import re
+import string
+
+from django.db.models import Q
+
+
+WORD_RE = re.compile(r'\w+')
+
+MAX_CHAR = chr(0x10FFFF)
+SURROGATES = (0xD800, 0xDFFF)
+ASCII_LOWER = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def search_shadow(text):
+    """
+    Return the distinct lower-cased tokens of ``text`` in first-seen order.
+
+    Stored next to compressed descriptions so they stay searchable with a
+    plain ``icontains`` while the repetitive bulk of pasted logs is dropped.
+    Tokens are the whitespace-separated runs of the text, punctuation
+    included (``e-mail``, ``KeyError:``), each followed by its words when
+    it has several (``e``, ``mail``). A search therefore matches any part
+    of a single token, but a phrase spanning tokens only where the shadow
+    happens to keep them side by side (their first occurrence).
+    """
+    seen = {}
+    for token in (text or '').lower().split():
+        seen[token] = None
+        words = WORD_RE.findall(token)
+        if len(words) > 1 or words and words[0] != token:
+            seen.update(dict.fromkeys(words))
+    return ' '.join(seen)
+
+
+def prefix_range(prefix):
+    """
+    Return ``(low, high)`` bounds matching every string starting with
+    ``prefix``, for index-friendly ``__gte``/``__lt`` prefix lookups.
+    ``high`` is ``None`` when nothing bounds them from above (a prefix of
+    only U+10FFFF characters).
+    """
+    stem = prefix.rstrip(MAX_CHAR)
+    if not stem:
+        return prefix, None
+    following = ord(stem[-1]) + 1
+    if SURROGATES[0] <= following <= SURROGATES[1]:
+        # Surrogates cannot be encoded; skip to the first code point after them.
+        following = SURROGATES[1] + 1
+    return prefix, stem[:-1] + chr(following)
+
+
+def prefix_q(field, prefix):
+    """A ``Q`` matching ``field`` values starting with ``prefix`` (see ``prefix_range``)."""
+    low, high = prefix_range(prefix)
+    condition = Q(**{f'{field}__gte': low})
+    if high is not None:
+        condition &= Q(**{f'{field}__lt': high})
+    return condition
+
+
+def fold_case(text, connection):
+    """
+    Lower-case ``text`` the way the database's ``LOWER`` does, so a folded
+    prefix compares with ``LOWER(column)`` as intended: SQLite only folds
+    ASCII letters (non-ASCII letters then match case-sensitively, as in its
+    ``LIKE``); other backends fold Unicode.
+    """
+    if connection.vendor == 'sqlite':
+        return text.translate(ASCII_LOWER)
+    return text.lower()
+
+
+def trigrams(text):
+    """
+    Return the set of trigrams of ``text`` the way PostgreSQL's pg_trgm
+    builds them: each lower-cased word padded with two leading blanks and
+    one trailing blank.
+    """
+    grams = set()
+    for word in WORD_RE.findall((text or '').lower()):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    """Share of trigrams the trigram sets ``a`` and ``b`` have in common (0 to 1)."""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
@@ -0,0 +1,91 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import dedup, outbox, ranks, rollups
+from .cache import category_cache
+from .models import Category, Tag, Todo, TodoTombstone
+
+
+def _invalidate(reference_cache, using):
+    # Drop this process's copy right away, and bump again once the write is
+    # visible so other processes cannot re-cache the pre-commit row.
+    reference_cache.invalidate()
+    transaction.on_commit(reference_cache.invalidate, using=using)
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_cache(sender, using, **kwargs):
+    _invalidate(category_cache, using)
+
+
+# The change feed (todos.api.changes) reads Todo.updated_at, so every change
+# that alters what a client sees of a todo must advance it -- including tag
+# links and deletes of the category or tags it points to. Each such change
+# also gets an outbox event; all of these receivers run inside the
+# transaction of the change (see Todo.save).
+
+def touch_todos(queryset, changed):
+    queryset.update(updated_at=timezone.now())
+    outbox.record_many(queryset.db, outbox.UPDATED, queryset.values('pk'), changed)
+
+
+@receiver(pre_save, sender=Todo)
+def rank_new_todo(sender, instance, using, raw=False, **kwargs):
+    # New todos start at the top of the hand-ordered list.
+    if not raw and instance._state.adding and not instance.rank:
+        instance.rank = ranks.first_rank(instance.owner_id, using)
+
+
+@receiver(post_save, sender=Todo)
+def record_todo_event(sender, instance, created, using, raw=False, **kwargs):
+    if raw:
+        return
+    changed = instance.changed_fields()
+    if created or changed:
+        outbox.record(outbox.event_type_for(created, changed), instance, using, changed)
+
+
+@receiver(post_save, sender=Todo)
+def roll_up_todo(sender, instance, created, using, raw=False, **kwargs):
+    if not raw:
+        rollups.record_change(instance, using, created, instance.changed_fields())
+
+
+@receiver(post_save, sender=Todo)
+def index_title(sender, instance, created, using, raw=False, **kwargs):
+    if not raw and (created or 'title' in instance.changed_fields()):
+        dedup.index_titles(using, [(instance.pk, instance.owner_id, instance.title)])
+
+
+@receiver(post_delete, sender=Todo)
+def record_tombstone(sender, instance, using, **kwargs):
+    TodoTombstone.objects.using(using).create(
+        owner_id=instance.owner_id,
+        todo_id=instance.pk,
+    )
+    outbox.record(outbox.DELETED, instance, using)
+
+
+@receiver(m2m_changed, sender=Todo.tags.through)
+def touch_retagged_todos(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    todos = Todo.objects.using(using)
+    if not reverse:
+        touch_todos(todos.filter(pk=instance.pk), ['tags'])
+    elif action == 'pre_clear':
+        touch_todos(todos.filter(tags=instance), ['tags'])
+    elif pk_set:
+        touch_todos(todos.filter(pk__in=pk_set), ['tags'])
+
+
+@receiver(pre_delete, sender=Category)
+def touch_category_todos(sender, instance, using, **kwargs):
+    touch_todos(Todo.objects.using(using).filter(category=instance), ['category_id'])
+
+
+@receiver(pre_delete, sender=Tag)
+def touch_tag_todos(sender, instance, using, **kwargs):
+    touch_todos(Todo.objects.using(using).filter(tags=instance), ['tags'])
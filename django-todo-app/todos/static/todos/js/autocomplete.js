@@ -0,0 +1,66 @@
+// Progressive autocomplete for <select data-autocomplete-url>.
+// Only selected options are rendered server-side; this adds a search box
+// that queries the JSON endpoint and appends picked options to the select.
+(function () {
+    function debounce(fn, wait) {
+        let timer;
+        return function (...args) {
+            clearTimeout(timer);
+            timer = setTimeout(() => fn.apply(this, args), wait);
+        };
+    }
+
+    function attach(select) {
+        const url = select.dataset.autocompleteUrl;
+        const input = document.createElement('input');
+        input.type = 'search';
+        input.className = 'form-control form-control-sm mb-1';
+        input.placeholder = 'Type to search…';
+        input.setAttribute('autocomplete', 'off');
+        const results = document.createElement('div');
+        results.className = 'list-group mb-1';
+        select.parentNode.insertBefore(input, select);
+        select.parentNode.insertBefore(results, select);
+        if (select.multiple) {
+            select.size = Math.max(select.options.length, 3);
+        }
+
+        function pick(item) {
+            let option = Array.from(select.options).find(o => o.value === String(item.id));
+            if (!option) {
+                option = new Option(item.text, item.id);
+                select.add(option);
+            }
+            option.selected = true;
+            if (select.multiple) {
+                select.size = Math.max(select.options.length, 3);
+            }
+            results.innerHTML = '';
+            input.value = '';
+        }
+
+        input.addEventListener('input', debounce(function () {
+            const term = input.value.trim();
+            results.innerHTML = '';
+            if (!term) {
+                return;
+            }
+            fetch(url + '?q=' + encodeURIComponent(term), {headers: {'Accept': 'application/json'}})
+                .then(response => response.json())
+                .then(data => {
+                    data.results.forEach(item => {
+                        const button = document.createElement('button');
+                        button.type = 'button';
+                        button.className = 'list-group-item list-group-item-action py-1';
+                        button.textContent = item.text;
+                        button.addEventListener('click', () => pick(item));
+                        results.appendChild(button);
+                    });
+                });
+        }, 200));
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('select[data-autocomplete-url]').forEach(attach);
+    });
+})();
@@ -0,0 +1,54 @@
+// Live list updates from the server-sent event stream (todos.views.todo_events).
+// Rows on the page are patched in place; new TODOs only raise a notice,
+// since where they belong depends on the current filter, sort and page.
+(function () {
+    const notice = document.getElementById('live-notice');
+    if (!notice || !notice.dataset.eventsUrl || !window.EventSource) {
+        return;
+    }
+
+    function setResolved(row, resolved) {
+        row.classList.toggle('todo-resolved', resolved);
+        row.classList.toggle('todo-active', !resolved);
+        if (resolved) {
+            row.classList.remove('todo-overdue');
+        }
+        const icon = row.querySelector('.todo-status-icon');
+        if (icon) {
+            icon.className = resolved
+                ? 'bi bi-check-circle-fill text-success todo-status-icon'
+                : 'bi bi-circle todo-status-icon';
+        }
+    }
+
+    const source = new EventSource(notice.dataset.eventsUrl);
+    source.addEventListener('todo', function (message) {
+        const event = JSON.parse(message.data);
+        Object.entries(event.counts).forEach(([name, value]) => {
+            const counter = document.querySelector(`[data-count="${name}"]`);
+            if (counter) {
+                counter.textContent = value;
+            }
+        });
+
+        const row = document.querySelector(`[data-todo-id="${event.id}"]`);
+        if (event.type === 'todo.deleted' || event.type === 'todo.archived') {
+            if (row) {
+                row.remove();
+            }
+            return;
+        }
+        if (!row) {
+            if (event.type === 'todo.created') {
+                notice.classList.remove('d-none');
+            }
+            return;
+        }
+        if ('title' in event.fields) {
+            row.querySelector('.todo-title-text').textContent = event.fields.title;
+        }
+        if ('is_resolved' in event.fields) {
+            setResolved(row, event.fields.is_resolved);
+        }
+    });
+})();
@@ -0,0 +1,59 @@
+// Drag-and-drop ordering of the list under sort=manual (todos.views.todo_move).
+// The dropped row is sent with the ids of its new neighbours; the server
+// gives it a rank between theirs, so no other row changes.
+(function () {
+    const list = document.querySelector('[data-move-url]');
+    if (!list) {
+        return;
+    }
+    let dragged = null;
+
+    function rowId(row) {
+        return row ? row.dataset.todoId : '';
+    }
+
+    list.querySelectorAll('.todo-item').forEach(row => {
+        row.draggable = true;
+        row.classList.add('todo-draggable');
+    });
+
+    list.addEventListener('dragstart', function (event) {
+        dragged = event.target.closest('.todo-item');
+        if (dragged) {
+            dragged.classList.add('todo-dragging');
+            event.dataTransfer.effectAllowed = 'move';
+        }
+    });
+
+    list.addEventListener('dragover', function (event) {
+        const target = event.target.closest('.todo-item');
+        if (!dragged || !target || target === dragged) {
+            return;
+        }
+        event.preventDefault();
+        const box = target.getBoundingClientRect();
+        const below = event.clientY > box.top + box.height / 2;
+        list.insertBefore(dragged, below ? target.nextElementSibling : target);
+    });
+
+    list.addEventListener('dragend', function () {
+        if (!dragged) {
+            return;
+        }
+        const row = dragged;
+        dragged = null;
+        row.classList.remove('todo-dragging');
+        const body = new FormData();
+        body.append('after', rowId(row.previousElementSibling));
+        body.append('before', rowId(row.nextElementSibling));
+        fetch(list.dataset.moveUrl.replace('/0/', `/${rowId(row)}/`), {
+            method: 'POST',
+            body: body,
+            headers: {'X-CSRFToken': list.dataset.csrfToken, 'Accept': 'application/json'},
+        }).then(response => {
+            if (!response.ok) {
+                window.location.reload();
+            }
+        });
+    });
+})();
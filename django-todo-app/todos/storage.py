@@ -0,0 +1,46 @@
+"""
+Production static files: fingerprinted names plus precompressed variants.
+
+``collectstatic`` with ``CompressedManifestStaticFilesStorage`` writes each
+hashed file next to a ``.gz`` (and ``.br`` when the ``brotli`` package is
+installed) copy, so ``todos.middleware.PrecompressedStaticMiddleware`` never
+compresses at request time.
+"""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html', '.map', '.xml')
+
+# Variant suffix -> compressor; the middleware negotiates the same suffixes.
+ENCODINGS = {'.gz': lambda data: gzip.compress(data, compresslevel=9, mtime=0)}
+if brotli is not None:
+    ENCODINGS['.br'] = lambda data: brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+        for name in self.hashed_files.values():
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self.compress(name)
+
+    def compress(self, name):
+        with self.open(name) as handle:
+            data = handle.read()
+        for suffix, compressor in ENCODINGS.items():
+            compressed = compressor(data)
+            # Tiny files may grow; the middleware then serves the original.
+            if len(compressed) < len(data):
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
@@ -18,13 +18,35 @@ Testing Pyramid:
 - E2E Tests (10%): Complete user workflows
 """
 
-from django.test import TestCase, Client
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import skipIf, skipUnless
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 from django.utils import timezone
 from django.contrib.auth.models import User
 from datetime import timedelta
-from .models import Todo, Category, Tag
+from .models import (
+    ArchivedTodo, OutboxEvent, RetentionPolicy, Todo, Category, Tag, TodoTombstone, WebhookEndpoint,
+)
 from .forms import TodoForm
+from .routers import get_shards, shard_for_owner
+
+
+# Test cases that reach every shard (commands, caches, users on any shard)
+# declare these; with TODO_SHARD_COUNT=1 it is just the default database.
+SHARD_DATABASES = {'default', *get_shards()}
 
 
 # ============================================
@@ -172,6 +194,144 @@ class TagModelTest(TestCase):
         self.assertEqual(str(tag), "important")
 
 
+class CompressedDescriptionTest(TestCase):
+    """
+    Test transparent compression of large descriptions.
+    
+    Scenarios:
+    - Short descriptions are stored as plain text
+    - Long descriptions are stored compressed and read back intact
+    - Compressed descriptions stay searchable
+    - Search inside compressed descriptions works on tokens, not phrases
+    """
+    
+    def stored_description(self, todo):
+        """Read the raw column value, bypassing field conversion"""
+        from django.db import connection
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT description FROM todos_todo WHERE id = %s', [todo.pk]
+            )
+            return cursor.fetchone()[0]
+    
+    def test_short_description_stored_plain(self):
+        """Test descriptions under the threshold are not compressed"""
+        todo = Todo.objects.create(title="Short", description="Just a note")
+        self.assertEqual(self.stored_description(todo), "Just a note")
+        self.assertEqual(todo.description_search, "")
+    
+    def test_long_description_round_trip(self):
+        """Test long descriptions are compressed on disk and restored on read"""
+        log = "ERROR connection reset by peer\n" * 200
+        todo = Todo.objects.create(title="Crash log", description=log)
+        
+        stored = self.stored_description(todo)
+        self.assertTrue(stored.startswith('zlib:'))
+        self.assertLess(len(stored), len(log))
+        self.assertEqual(Todo.objects.get(pk=todo.pk).description, log)
+    
+    def test_marker_prefixed_text_round_trip(self):
+        """Test plain text starting with the marker is stored unambiguously"""
+        todo = Todo.objects.create(title="Marker", description="zlib: not really")
+        self.assertEqual(Todo.objects.get(pk=todo.pk).description, "zlib: not really")
+    
+    def test_compressed_description_is_searchable(self):
+        """Test search matches words inside compressed descriptions"""
+        log = "Traceback: KeyError in payment worker\n" * 100
+        Todo.objects.create(title="Investigate crash", description=log)
+        Todo.objects.create(title="Unrelated", description="nothing here")
+        
+        results = Todo.objects.search("payment")
+        self.assertEqual([t.title for t in results], ["Investigate crash"])
+        self.assertEqual(Todo.objects.search("zlib").count(), 0)
+    
+    def test_compressed_search_matches_tokens(self):
+        """Test punctuated tokens and parts of words match, phrases across tokens do not"""
+        log = "Send the e-mail to ops, then retry.\n" * 100 + "worker crashed\n"
+        todo = Todo.objects.create(title="Retry", description=log)
+        
+        for query in ("e-mail", "mail", "ops,", "retr", "send the", "WORKER"):
+            self.assertEqual(list(Todo.objects.search(query)), [todo], query)
+        # Only the first occurrence of each token is kept, in order.
+        self.assertEqual(Todo.objects.search("retry. worker").count(), 0)
+
+
+class ReferenceCacheTest(TestCase):
+    """
+    Test the process-local category cache.
+    
+    Scenarios:
+    - Cached rows are served without queries
+    - Writes invalidate the cache
+    - Another process bumping the version is noticed after the TTL
+    - Rows expire after the max age when no bump arrives
+    - The cache is bounded in size
+    """
+    
+    databases = SHARD_DATABASES
+    
+    def setUp(self):
+        from .cache import ReferenceCache
+        self.cache = ReferenceCache(Category)
+        self.work = Category.objects.create(name="Work")
+        self.home = Category.objects.create(name="Home")
+    
+    def test_cached_rows_skip_queries(self):
+        """Test a second lookup is served from memory"""
+        self.cache.get_many([self.work.pk, self.home.pk])
+        with self.assertNumQueries(0):
+            rows = self.cache.get_many([self.work.pk, self.home.pk])
+        self.assertEqual(rows[self.work.pk].name, "Work")
+    
+    def test_save_invalidates(self):
+        """Test renaming a category is visible immediately in this process"""
+        from .cache import category_cache
+        self.assertEqual(category_cache.get(self.work.pk).name, "Work")
+        self.work.name = "Office"
+        self.work.save()
+        self.assertEqual(category_cache.get(self.work.pk).name, "Office")
+    
+    def test_remote_invalidation_after_ttl(self):
+        """Test a version bump from another process clears the cache"""
+        from django.core.cache import cache
+        from django.test import override_settings
+        with override_settings(TODO_REFERENCE_CACHE_TTL=0):
+            self.cache.get(self.work.pk)
+            Category.objects.filter(pk=self.work.pk).update(name="Office")
+            cache.set(self.cache.version_key, 'bumped-elsewhere')
+            self.assertEqual(self.cache.get(self.work.pk).name, "Office")
+    
+    def test_rows_expire_without_a_shared_version(self):
+        """Test rows older than the max age are reloaded even if no version bump arrives"""
+        with override_settings(TODO_REFERENCE_CACHE_MAX_AGE=0):
+            self.cache.get(self.work.pk)
+            Category.objects.filter(pk=self.work.pk).update(name="Office")
+            self.assertEqual(self.cache.get(self.work.pk).name, "Office")
+        self.cache.get(self.work.pk)
+        with self.assertNumQueries(0):
+            self.cache.get(self.work.pk)
+    
+    def test_size_is_bounded(self):
+        """Test least recently used rows are evicted past the size limit"""
+        from django.test import override_settings
+        with override_settings(TODO_REFERENCE_CACHE_SIZE=1):
+            self.cache.get(self.work.pk)
+            self.cache.get(self.home.pk)
+            self.assertEqual(len(self.cache), 1)
+    
+    def test_list_view_uses_cached_categories(self):
+        """Test category names in the list do not cost a query per row"""
+        from .cache import category_cache
+        for i in range(5):
+            Todo.objects.create(title=f"Categorized {i}", category=self.work)
+        category_cache.warm()
+        response = self.client.get(reverse('todo_list'))
+        self.assertContains(response, "Work")
+        # page rows, status counts; the first request cached the page count
+        with self.assertNumQueries(2):
+            self.client.get(reverse('todo_list'))
+
+
 # ============================================
 # VIEW TESTS
 # ============================================
@@ -499,6 +659,208 @@ class TodoToggleViewTest(TestCase):
         self.assertNotEqual(response.status_code, 200)
 
 
+class TodoFragmentViewTest(TestCase):
+    """
+    Test fragment responses for toggle, rename and delete.
+    
+    Scenarios:
+    - HX-Request returns the row plus out-of-band counters
+    - Accept: application/json returns the same as JSON
+    - Inline title edit validates like the full form
+    - Delete returns only the counters
+    """
+    
+    def setUp(self):
+        self.todo = Todo.objects.create(title="Fragment TODO")
+        Todo.objects.create(title="Other TODO", is_resolved=True)
+        self.htmx = {'HTTP_HX_REQUEST': 'true'}
+    
+    def test_toggle_fragment(self):
+        """Test toggling returns the row and counters in a few queries"""
+        # select, update, outbox insert, rollup select and write, counts,
+        # plus the savepoint pair of the view's atomic block inside the test's
+        with self.assertNumQueries(8):
+            response = self.client.post(reverse('todo_toggle', args=[self.todo.pk]), **self.htmx)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, f'data-todo-id="{self.todo.pk}"')
+        self.assertContains(response, 'todo-resolved')
+        self.assertContains(response, 'hx-swap-oob="true"')
+        self.assertContains(response, '<h2 class="mb-0" data-count="resolved">2</h2>', html=True)
+        self.assertNotContains(response, '<html')
+    
+    def test_toggle_json(self):
+        """Test JSON clients get the row markup and counts"""
+        response = self.client.post(
+            reverse('todo_toggle', args=[self.todo.pk]), HTTP_ACCEPT='application/json'
+        )
+        data = response.json()
+        self.assertEqual(data['id'], self.todo.pk)
+        self.assertEqual(data['counts'], {'total': 2, 'active': 0, 'resolved': 2, 'overdue': 0})
+        self.assertIn("Fragment TODO", data['row'])
+    
+    def test_title_editor(self):
+        """Test GET returns the inline editor"""
+        response = self.client.get(reverse('todo_title', args=[self.todo.pk]), **self.htmx)
+        self.assertContains(response, 'name="title"')
+        self.assertContains(response, 'value="Fragment TODO"')
+    
+    def test_title_rename(self):
+        """Test a valid rename returns the updated row"""
+        response = self.client.post(
+            reverse('todo_title', args=[self.todo.pk]), {'title': "Renamed TODO"}, **self.htmx
+        )
+        self.assertContains(response, "Renamed TODO")
+        self.assertEqual(response['HX-Retarget'], f'.todo-item[data-todo-id="{self.todo.pk}"]')
+        self.todo.refresh_from_db()
+        self.assertEqual(self.todo.title, "Renamed TODO")
+    
+    def test_title_validation(self):
+        """Test invalid titles come back with errors"""
+        response = self.client.post(
+            reverse('todo_title', args=[self.todo.pk]), {'title': "Other TODO"}, **self.htmx
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "already exists")
+        # The editor replaces itself, so the row stays and can be submitted again.
+        self.assertContains(response, 'hx-target="this"')
+        self.assertFalse(response.has_header('HX-Retarget'))
+        response = self.client.post(
+            reverse('todo_title', args=[self.todo.pk]), {'title': "ab"}, HTTP_ACCEPT='application/json'
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('title', response.json()['errors'])
+        self.todo.refresh_from_db()
+        self.assertEqual(self.todo.title, "Fragment TODO")
+    
+    def test_title_without_fragment(self):
+        """Test a plain form post still redirects"""
+        response = self.client.post(reverse('todo_title', args=[self.todo.pk]), {'title': "Plain rename"})
+        self.assertRedirects(response, reverse('todo_list'))
+    
+    def test_delete_fragment(self):
+        """Test deleting returns only the updated counters"""
+        response = self.client.post(reverse('todo_delete', args=[self.todo.pk]), **self.htmx)
+        self.assertNotContains(response, "data-todo-id")
+        self.assertContains(response, '<h2 class="mb-0" data-count="total">1</h2>', html=True)
+        self.assertFalse(Todo.objects.filter(pk=self.todo.pk).exists())
+
+
+class SessionStorageTest(TestCase):
+    """
+    Test session and message storage stay off django_session where possible.
+    
+    Scenarios:
+    - Anonymous list views never touch the session table
+    - Cache sessions with cookie messages keep write paths off it too
+    - The measure_requests command
+    """
+    
+    databases = SHARD_DATABASES
+    
+    def session_queries(self, method, url, **kwargs):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(self.client, method)(url, follow=True, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return sum('django_session' in query['sql'] for query in context.captured_queries)
+    
+    def test_anonymous_list_skips_session(self):
+        """Test an anonymous list view does not read the session"""
+        Todo.objects.create(title="Public TODO")
+        self.assertEqual(self.session_queries('get', reverse('todo_list')), 0)
+    
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.cache',
+        MESSAGE_STORAGE='django.contrib.messages.storage.cookie.CookieStorage',
+    )
+    def test_lightweight_mode(self):
+        """Test signed-in write paths skip the table in cache mode"""
+        user = User.objects.create_user('carol')
+        self.client.force_login(user)
+        todo = Todo.objects.create(title="Carol's TODO", owner=user)
+        self.assertEqual(self.session_queries('post', reverse('todo_toggle', args=[todo.pk])), 0)
+        response = self.client.post(reverse('todo_toggle', args=[todo.pk]), follow=True)
+        self.assertContains(response, "reopened")
+    
+    def test_measure_requests(self):
+        """Test the measurement command reports each request and rolls back"""
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('measure_requests', stdout=out)
+        self.assertIn("POST toggle (fragment)", out.getvalue())
+        self.assertFalse(Todo.objects.exists())
+
+
+class QueryDeadlineTest(TestCase):
+    """
+    Test query budgets on the list page and the list API
+    
+    Scenarios:
+    - A query past its budget is aborted and counted
+    - The list page degrades to a "refine your search" notice
+    - The list API answers 503
+    - Unknown sort keys and categories are ignored
+    """
+    
+    SLOW_SQL = (
+        'WITH RECURSIVE c(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM c WHERE x < 10000000) '
+        'SELECT COUNT(*) FROM c'
+    )
+    
+    def setUp(self):
+        from .deadline import reset_aborted_queries
+        reset_aborted_queries()
+        Todo.objects.bulk_create(
+            Todo(title=f"TODO {i}", description="needle " * 20) for i in range(300)
+        )
+    
+    def test_deadline_aborts_query(self):
+        """Test a slow query raises QueryTimeout and bumps the counter"""
+        from django.db import connection
+        from .deadline import QueryTimeout, aborted_queries, query_deadline
+        with self.assertRaises(QueryTimeout), self.assertLogs('todos.deadline', 'WARNING'):
+            with query_deadline('default', 'slow', budget=0.01):
+                with connection.cursor() as cursor:
+                    cursor.execute(self.SLOW_SQL)
+        self.assertEqual(aborted_queries(), {'slow': 1})
+        # The connection is usable and unguarded afterwards.
+        self.assertEqual(Todo.objects.count(), 300)
+    
+    def test_fast_query_within_budget(self):
+        """Test queries inside the budget are untouched"""
+        from .deadline import aborted_queries, query_deadline
+        with query_deadline('default', 'fast', budget=5):
+            self.assertEqual(Todo.objects.search("needle").count(), 300)
+        self.assertEqual(aborted_queries(), {})
+    
+    @override_settings(TODO_QUERY_BUDGETS={'todo_list': 0})
+    def test_list_view_degrades(self):
+        """Test an aborted list query renders the refine-your-search notice"""
+        with self.assertLogs('todos.deadline', 'WARNING'):
+            response = self.client.get(reverse('todo_list'), {'search': "needle"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['timed_out'])
+        self.assertContains(response, "This search took too long")
+        self.assertNotContains(response, "No TODOs Found")
+    
+    @override_settings(TODO_QUERY_BUDGETS={'api_todo_list': 0})
+    def test_api_degrades(self):
+        """Test an aborted API list query answers 503"""
+        with self.assertLogs('todos.deadline', 'WARNING'):
+            response = self.client.get(reverse('api_todo_list'), {'search': "needle"})
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("refine your search", response.json()['error'])
+    
+    def test_untrusted_sort_and_category(self):
+        """Test unknown sort fields and malformed categories fall back safely"""
+        response = self.client.get(reverse('todo_list'), {'sort': 'owner__password', 'category': 'x'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['paginator'].count, 300)
+        self.assertEqual(Todo.objects.filter_by_params({'sort': '-title'}).query.order_by, ('-title',))
+
+
 # ============================================
 # FORM TESTS
 # ============================================
@@ -587,6 +949,233 @@ class TodoFormTest(TestCase):
         self.assertTrue(form.is_valid())
 
 
+class LazyChoiceFormTest(TestCase):
+    """
+    Test category and tag choices are loaded lazily.
+    
+    Scenarios:
+    - Unbound form renders no category/tag options
+    - Bound form renders only the selected options
+    - Submitted tag ids validate in a single query
+    - Invalid submitted ids re-render the form with errors
+    """
+    
+    def setUp(self):
+        self.tags = Tag.objects.bulk_create([
+            Tag(name=f"tag-{i}", slug=f"tag-{i}") for i in range(50)
+        ])
+        self.category = Category.objects.create(name="Work")
+    
+    def test_unbound_form_renders_no_choices(self):
+        """Test rendering an empty form does not list every tag"""
+        html = str(TodoForm())
+        self.assertNotIn("tag-7", html)
+        self.assertIn('data-autocomplete-url="/autocomplete/tags/"', html)
+    
+    def test_bound_form_renders_selected_choices(self):
+        """Test selected tags and category are rendered as options"""
+        form = TodoForm(data={
+            'title': 'Tagged',
+            'category': self.category.pk,
+            'tags': [self.tags[7].pk],
+        })
+        html = str(form['tags']) + str(form['category'])
+        self.assertIn("tag-7", html)
+        self.assertNotIn("tag-8", html)
+        self.assertIn("Work", html)
+    
+    def test_tag_ids_validate_in_one_query(self):
+        """Test submitted tag ids are checked with a single query"""
+        field = TodoForm().fields['tags']
+        with self.assertNumQueries(1):
+            tags = field.clean([tag.pk for tag in self.tags[:10]])
+        self.assertEqual(len(tags), 10)
+    
+    def test_invalid_ids_are_form_errors(self):
+        """Test non-numeric and out-of-range ids give form errors, not a server error"""
+        response = self.client.post(reverse('todo_create'), {
+            'title': 'Junk',
+            'category': 'xyz',
+            'parent': '1e3',
+            'tags': ['abc', str(self.tags[0].pk), '99999999999999999999999'],
+        })
+        self.assertEqual(response.status_code, 200)
+        form = response.context['form']
+        self.assertIn('category', form.errors)
+        self.assertIn('parent', form.errors)
+        self.assertIn('tags', form.errors)
+        self.assertContains(response, "tag-0")
+        self.assertFalse(Todo.objects.filter(title='Junk').exists())
+
+
+class AutocompleteViewTest(TestCase):
+    """Test the JSON autocomplete endpoints"""
+    
+    def setUp(self):
+        Tag.objects.bulk_create([
+            Tag(name=f"Backend-{i:02d}", slug=f"backend-{i:02d}") for i in range(30)
+        ] + [Tag(name="frontend", slug="frontend")])
+        Category.objects.create(name="Work")
+        Category.objects.create(name="Personal")
+    
+    def test_tag_prefix_is_case_insensitive(self):
+        """Test tag lookup matches prefixes regardless of case"""
+        response = self.client.get(reverse('tag_autocomplete'), {'q': 'back'})
+        data = response.json()
+        self.assertEqual(len(data['results']), 20)
+        self.assertTrue(data['more'])
+        self.assertEqual(data['results'][0]['text'], "Backend-00")
+    
+    def test_limit_parameter(self):
+        """Test the result limit is honoured"""
+        response = self.client.get(reverse('tag_autocomplete'), {'q': 'back', 'limit': 5})
+        self.assertEqual(len(response.json()['results']), 5)
+    
+    def test_category_lookup(self):
+        """Test category lookup returns ids and names"""
+        response = self.client.get(reverse('category_autocomplete'), {'q': 'WO'})
+        category = Category.objects.get(name="Work")
+        self.assertEqual(
+            response.json(),
+            {'results': [{'id': category.pk, 'text': "Work"}], 'more': False},
+        )
+    
+    def test_empty_query(self):
+        """Test an empty query returns nothing without hitting the database"""
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('tag_autocomplete'))
+        self.assertEqual(response.json()['results'], [])
+    
+    def test_highest_code_point(self):
+        """Test terms ending in U+10FFFF or before the surrogates are handled"""
+        from .search import prefix_range
+        self.assertEqual(prefix_range('a\U0010ffff'), ('a\U0010ffff', 'b'))
+        self.assertEqual(prefix_range('\U0010ffff'), ('\U0010ffff', None))
+        self.assertEqual(prefix_range('\ud7ff')[1], '\ue000')
+        for term in ('\U0010ffff', 'Back\U0010ffff', '\ud7ff'):
+            response = self.client.get(reverse('todo_autocomplete'), {'q': term})
+            self.assertEqual(response.status_code, 200)
+    
+    def test_non_ascii_prefix(self):
+        """Test non-ASCII names match with the database's own case folding"""
+        category = Category.objects.create(name="ÉLAN")
+        response = self.client.get(reverse('category_autocomplete'), {'q': 'Él'})
+        self.assertEqual(response.json()['results'], [{'id': category.pk, 'text': "ÉLAN"}])
+
+
+class DuplicateTitleTest(TestCase):
+    """
+    Test trigram near-duplicate detection of titles
+    
+    Scenarios:
+    - Trigrams and similarity follow pg_trgm
+    - The index follows creates, renames, deletes and restores
+    - Similar titles are found per owner, above the threshold
+    - The form and create view warn without blocking
+    - The dedup report lists near-duplicate pairs
+    - Report pairs match a brute-force comparison across owners and thresholds
+    """
+    
+    databases = SHARD_DATABASES
+    
+    def setUp(self):
+        self.login = Todo.objects.create(title="Fix login bug")
+        self.groceries = Todo.objects.create(title="Buy groceries")
+    
+    def test_similarity(self):
+        """Test trigram similarity of near and distant titles"""
+        from .search import similarity, trigrams
+        self.assertEqual(trigrams("Ab"), {'  a', ' ab', 'ab '})
+        score = similarity(trigrams("Fix login bug"), trigrams("Fix the login bug"))
+        self.assertAlmostEqual(score, 14 / 18)
+        self.assertLess(similarity(trigrams("Fix login bug"), trigrams("Buy groceries")), 0.2)
+    
+    def test_index_follows_changes(self):
+        """Test the trigram rows track renames and deletes"""
+        from .models import TitleTrigram
+        from .search import trigrams
+        rows = TitleTrigram.objects.filter(todo=self.login)
+        self.assertEqual(set(rows.values_list('trigram', flat=True)), trigrams("Fix login bug"))
+        self.login.title = "Renamed"
+        self.login.save()
+        self.assertEqual(set(rows.values_list('trigram', flat=True)), trigrams("Renamed"))
+        self.login.delete()
+        self.assertFalse(rows.exists())
+    
+    def test_similar_todos(self):
+        """Test lookups return similar titles of the same owner only"""
+        from .dedup import similar_todos
+        other = User.objects.create_user('dave')
+        Todo.objects.create(title="Fix the login bug", owner=other)
+        matches = similar_todos(None, "Fix the login bug")
+        self.assertEqual(matches, [self.login])
+        self.assertAlmostEqual(matches[0].similarity, 14 / 18)
+        self.assertEqual(similar_todos(None, "Fix login bug", exclude=self.login.pk), [])
+        self.assertEqual(similar_todos(None, "Fix the login bug", threshold=0.9), [])
+    
+    def test_restored_todos_are_indexed(self):
+        """Test restoring from the archive re-indexes titles"""
+        from .archive import archive_todos, restore_todos
+        from .dedup import similar_todos
+        self.login.is_resolved = True
+        self.login.save()
+        archive_todos(Todo.objects.filter(pk=self.login.pk))
+        self.assertEqual(similar_todos(None, "Fix the login bug"), [])
+        restore_todos(ArchivedTodo.objects.all())
+        self.assertEqual([todo.pk for todo in similar_todos(None, "Fix the login bug")], [self.login.pk])
+    
+    def test_form_and_view_warn(self):
+        """Test near-duplicates are reported but still saved"""
+        form = TodoForm(data={'title': "Fix the login bug"})
+        self.assertTrue(form.is_valid())
+        self.assertIn('"Fix login bug"', form.similar_todos_warning())
+        response = self.client.post(reverse('todo_create'), {'title': "Fix the login bug"}, follow=True)
+        self.assertContains(response, "Similar TODOs already exist")
+        self.assertTrue(Todo.objects.filter(title="Fix the login bug").exists())
+        response = self.client.post(reverse('todo_create'), {'title': "Water the plants"}, follow=True)
+        self.assertNotContains(response, "Similar TODOs already exist")
+    
+    def test_dedup_report(self):
+        """Test the report lists each near-duplicate pair once"""
+        from io import StringIO
+        duplicate = Todo.objects.create(title="Fix the login bug")
+        out = StringIO()
+        call_command('dedup_report', '--rebuild', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], f'default: 0.78 #{self.login.pk} "Fix login bug" ~ #{duplicate.pk} "Fix the login bug"')
+        self.assertIn("1 near-duplicate pair(s)", lines[-1])
+    
+    def test_duplicate_pairs_match_brute_force(self):
+        """Test prefix-filtered pairs equal comparing every pair of an owner's titles"""
+        import random
+        from itertools import combinations
+        from .dedup import duplicate_pairs
+        from .search import similarity, trigrams
+        rng = random.Random(43)
+        words = ["fix", "login", "bug", "the", "page", "buy", "milk", "call", "mom", "report", "ing"]
+        owners = [None, User.objects.create_user('erin'), User.objects.create_user('finn')]
+        for owner in owners:
+            for _ in range(25):
+                title = " ".join(rng.choice(words) for _ in range(rng.randint(1, 4)))
+                Todo.objects.create(title=title, owner=owner)
+        for threshold in (0.3, 0.5, 0.9):
+            expected = set()
+            for owner in owners:
+                todos = Todo.objects.for_owner(owner).order_by('pk').values_list('pk', 'title')
+                for (pk, title), (other_pk, other_title) in combinations(todos, 2):
+                    score = similarity(trigrams(title), trigrams(other_title))
+                    if score >= threshold:
+                        expected.add((owner and owner.pk, pk, other_pk, round(score, 9)))
+            found = set()
+            for shard in get_shards():
+                found.update(
+                    (owner_id, pk, other_pk, round(score, 9))
+                    for owner_id, pk, other_pk, score in duplicate_pairs(shard, threshold, owners_per_query=2)
+                )
+            self.assertTrue(expected)
+            self.assertEqual(found, expected)
+
+
 # ============================================
 # URL TESTS
 # ============================================
@@ -635,6 +1224,2006 @@ class URLTest(TestCase):
         self.assertEqual(url, f'/{self.todo.pk}/toggle/')
 
 
+# ============================================
+# OWNERSHIP AND SHARDING TESTS
+# ============================================
+
+class TodoOwnershipTest(TestCase):
+    """
+    Test TODOs, categories and tags are scoped to their owner.
+    
+    Scenarios:
+    - Users only see and change their own TODOs
+    - Anonymous visitors share the unowned workspace
+    - New TODOs are owned by their creator
+    - Names are unique per owner, not globally
+    """
+    
+    databases = SHARD_DATABASES
+    
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.alice_todo = Todo.objects.create(title="Alice task", owner=self.alice)
+        self.bob_todo = Todo.objects.create(title="Bob task", owner=self.bob)
+        self.shared_todo = Todo.objects.create(title="Shared task")
+    
+    def test_list_shows_only_own_todos(self):
+        """Test the list and counters are limited to the current user"""
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse('todo_list'))
+        self.assertEqual(list(response.context['todos']), [self.alice_todo])
+        self.assertEqual(response.context['total_count'], 1)
+    
+    def test_anonymous_sees_unowned_todos(self):
+        """Test anonymous visitors see only the unowned TODOs"""
+        response = self.client.get(reverse('todo_list'))
+        self.assertEqual(list(response.context['todos']), [self.shared_todo])
+    
+    def test_other_users_todo_is_not_found(self):
+        """Test detail, update and toggle return 404 for foreign TODOs"""
+        if Todo.objects.for_owner(self.alice).filter(pk=self.bob_todo.pk).exists():
+            # Ids are only unique per shard; use one Alice has no TODO with.
+            self.bob_todo = Todo.objects.create(title="Bob's other", owner=self.bob)
+        self.client.force_login(self.alice)
+        self.assertEqual(
+            self.client.get(reverse('todo_detail', args=[self.bob_todo.pk])).status_code, 404
+        )
+        self.assertEqual(
+            self.client.get(reverse('todo_update', args=[self.bob_todo.pk])).status_code, 404
+        )
+        response = self.client.post(reverse('todo_toggle', args=[self.bob_todo.pk]))
+        self.assertEqual(response.status_code, 404)
+        self.bob_todo.refresh_from_db()
+        self.assertFalse(self.bob_todo.is_resolved)
+    
+    def test_create_sets_owner(self):
+        """Test TODOs created by a user belong to that user"""
+        self.client.force_login(self.alice)
+        self.client.post(reverse('todo_create'), {'title': 'Bob task'})
+        self.assertEqual(Todo.objects.for_owner(self.alice).filter(title='Bob task').count(), 1)
+    
+    def test_form_choices_scoped_to_owner(self):
+        """Test categories of other owners are rejected by the form"""
+        foreign = Category.objects.create(name="Bob's", owner=self.bob)
+        form = TodoForm(data={'title': 'Mine', 'category': foreign.pk}, owner=self.alice)
+        self.assertFalse(form.is_valid())
+        self.assertIn('category', form.errors)
+    
+    def test_names_unique_per_owner(self):
+        """Test two owners may use the same category name, one owner may not"""
+        from django.db import IntegrityError, transaction
+        Category.objects.create(name="Work", owner=self.alice)
+        Category.objects.create(name="Work", owner=self.bob)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Category.objects.create(name="Work", owner=self.alice)
+
+
+class OwnerShardRouterTest(TestCase):
+    """Test owners are routed to a stable shard"""
+    
+    def setUp(self):
+        from .routers import OwnerShardRouter
+        self.router = OwnerShardRouter()
+    
+    def test_single_shard_routes_to_default(self):
+        """Test a single-shard configuration keeps everything on 'default'"""
+        from django.test import override_settings
+        from .routers import shard_for_owner
+        with override_settings(TODO_SHARDS=['default']):
+            self.assertEqual(shard_for_owner(None), 'default')
+            self.assertEqual(shard_for_owner(7), 'default')
+    
+    def test_owners_spread_over_shards(self):
+        """Test owners map to shards by id and new rows follow their owner"""
+        from django.test import override_settings
+        from .routers import shard_for_owner
+        with override_settings(TODO_SHARDS=['default', 'shard1']):
+            self.assertEqual(shard_for_owner(None), 'default')
+            self.assertEqual(shard_for_owner(2), 'default')
+            self.assertEqual(shard_for_owner(3), 'shard1')
+            todo = Todo(title="Routed", owner_id=3)
+            self.assertEqual(self.router.db_for_write(Todo, instance=todo), 'shard1')
+            self.assertEqual(
+                str(Todo.objects.for_owner(User(pk=3)).db), 'shard1'
+            )
+    
+    def test_migrations_limited_to_shards(self):
+        """Test only the todos app is migrated onto extra shards"""
+        from django.test import override_settings
+        with override_settings(TODO_SHARDS=['default', 'shard1']):
+            self.assertTrue(self.router.allow_migrate('shard1', 'todos'))
+            self.assertFalse(self.router.allow_migrate('shard1', 'auth'))
+            self.assertIsNone(self.router.allow_migrate('default', 'auth'))
+
+
+@skipUnless(len(get_shards()) > 1, 'Needs TODO_SHARD_COUNT=2 or more (ShardedSuiteTest runs it so).')
+class ShardedOwnerTest(TestCase):
+    """
+    Test owners placed on different shards.
+    
+    Scenarios:
+    - Rows are written to their owner's shard
+    - Pages and the API read only the owner's shard
+    - Categories and tags are resolved on the owner's shard
+    - Maintenance commands visit every shard
+    """
+    
+    databases = SHARD_DATABASES
+    
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        self.assertNotEqual(shard_for_owner(self.alice.pk), shard_for_owner(self.bob.pk))
+    
+    def test_rows_on_owner_shard(self):
+        """Test created TODOs are stored on their owner's shard only"""
+        todo = Todo.objects.create(title="Alice's", owner=self.alice)
+        self.assertEqual(todo._state.db, shard_for_owner(self.alice.pk))
+        self.client.force_login(self.bob)
+        self.client.post(reverse('todo_create'), {'title': "Bob's"})
+        self.assertEqual(
+            Todo.objects.using(shard_for_owner(self.bob.pk)).filter(owner=self.bob, title="Bob's").count(), 1,
+        )
+        self.assertFalse(Todo.objects.using(shard_for_owner(self.alice.pk)).filter(title="Bob's").exists())
+    
+    def test_reads_stay_on_owner_shard(self):
+        """Test the list, detail and API only see the signed-in owner's TODOs"""
+        alice_todo = Todo.objects.create(title="Alice's", owner=self.alice)
+        Todo.objects.create(title="Bob's", owner=self.bob)
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse('todo_list'))
+        self.assertEqual(list(response.context['todos']), [alice_todo])
+        self.assertEqual(self.client.get(reverse('todo_detail', args=[alice_todo.pk])).status_code, 200)
+        data = self.client.get(reverse('api_todo_list')).json()
+        self.assertEqual([row['title'] for row in data['data']], ["Alice's"])
+    
+    def test_reference_rows_on_owner_shard(self):
+        """Test a TODO's category and tags come from its owner's shard"""
+        category = Category.objects.create(name="Home", owner=self.bob)
+        tag = Tag.objects.create(name="urgent", slug="urgent", owner=self.bob)
+        self.assertEqual(category._state.db, shard_for_owner(self.bob.pk))
+        self.client.force_login(self.bob)
+        self.client.post(reverse('todo_create'), {'title': "Tagged", 'category': category.pk, 'tags': [tag.pk]})
+        todo = Todo.objects.for_owner(self.bob).get(title="Tagged")
+        self.assertEqual(todo.category, category)
+        self.assertEqual(list(todo.tags.all()), [tag])
+    
+    def test_commands_visit_every_shard(self):
+        """Test archiving moves old resolved TODOs on every shard"""
+        for owner in (self.alice, self.bob):
+            Todo.objects.create(title="Old", owner=owner, is_resolved=True)
+            Todo.objects.for_owner(owner).update(updated_at=timezone.now() - timedelta(days=400))
+        call_command('archive_todos', stdout=open(os.devnull, 'w'))
+        for owner in (self.alice, self.bob):
+            self.assertEqual(ArchivedTodo.objects.for_owner(owner).count(), 1)
+            self.assertFalse(Todo.objects.for_owner(owner).exists())
+
+
+@skipIf(len(get_shards()) > 1, 'ShardedOwnerTest runs in this process.')
+class ShardedSuiteTest(TestCase):
+    """Test the sharded scenarios in a process configured with two shards"""
+    
+    def test_sharded_owner_test(self):
+        """Test ShardedOwnerTest passes with TODO_SHARD_COUNT=2"""
+        result = subprocess.run(
+            [sys.executable, 'manage.py', 'test', 'todos.tests.ShardedOwnerTest', '--noinput'],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, 'TODO_SHARD_COUNT': '2'},
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertIn("Ran 4 tests", result.stderr)
+        self.assertNotIn("skipped", result.stderr)
+
+
+# ============================================
+# API TESTS
+# ============================================
+
+class TodoReadApiTest(TestCase):
+    """
+    Test the JSON read API.
+    
+    Scenarios:
+    - Sparse fieldsets return only the requested fields
+    - Includes add categories and tags with a fixed number of queries
+    - List filters match TodoListView
+    - Detail endpoint and 404s
+    """
+    
+    databases = SHARD_DATABASES
+    
+    def setUp(self):
+        self.category = Category.objects.create(name="Work", color="#123456")
+        self.tag = Tag.objects.create(name="urgent", slug="urgent")
+        self.todo = Todo.objects.create(title="API TODO", category=self.category)
+        self.todo.tags.add(self.tag)
+        Todo.objects.create(title="Done TODO", is_resolved=True)
+    
+    def test_sparse_fieldset(self):
+        """Test only the requested fields (plus id) are returned"""
+        response = self.client.get(reverse('api_todo_list'), {'fields': 'title,is_resolved'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['data'][0],
+            {'id': Todo.objects.get(title="Done TODO").pk, 'title': "Done TODO", 'is_resolved': True},
+        )
+    
+    def test_includes_use_fixed_queries(self):
+        """Test includes cost one query per relation regardless of rows"""
+        for i in range(10):
+            todo = Todo.objects.create(title=f"More {i}", category=self.category)
+            todo.tags.add(self.tag)
+        # count, page, tag links, categories, tags
+        with self.assertNumQueries(5):
+            response = self.client.get(
+                reverse('api_todo_list'), {'include': 'category,tags', 'fields': 'title,tags'}
+            )
+        included = response.json()['included']
+        self.assertEqual(included['categories'], [{'id': self.category.pk, 'name': "Work", 'color': "#123456"}])
+        self.assertEqual(included['tags'], [{'id': self.tag.pk, 'name': "urgent", 'slug': "urgent"}])
+    
+    def test_list_filters(self):
+        """Test the TodoListView filter parameters apply"""
+        response = self.client.get(reverse('api_todo_list'), {'filter': 'resolved', 'fields': 'title'})
+        self.assertEqual([row['title'] for row in response.json()['data']], ["Done TODO"])
+        response = self.client.get(reverse('api_todo_list'), {'search': 'api', 'fields': 'title'})
+        self.assertEqual([row['title'] for row in response.json()['data']], ["API TODO"])
+    
+    def test_unknown_field_rejected(self):
+        """Test unknown fields and includes return 400"""
+        response = self.client.get(reverse('api_todo_list'), {'fields': 'title,secret'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('api_todo_list'), {'include': 'owner'})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_detail(self):
+        """Test the detail endpoint returns one document"""
+        response = self.client.get(
+            reverse('api_todo_detail', args=[self.todo.pk]), {'include': 'tags'}
+        )
+        data = response.json()
+        self.assertEqual(data['data']['title'], "API TODO")
+        self.assertEqual(data['data']['tags'], [self.tag.pk])
+        self.assertEqual(data['included']['tags'][0]['name'], "urgent")
+    
+    def test_detail_not_found(self):
+        """Test unknown or foreign TODOs return 404"""
+        # Placed on the anonymous visitor's shard: ids are only unique per shard.
+        other = Todo.objects.using('default').create(title="Private", owner=User.objects.create_user('alice'))
+        response = self.client.get(reverse('api_todo_detail', args=[other.pk]))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse('api_todo_list'), {'page': 99})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(TODO_SYNC_SETTLE_SECONDS=0)
+class ChangeFeedTest(TestCase):
+    """
+    Test the incremental sync feed.
+    
+    Scenarios:
+    - First sync returns every TODO
+    - Later syncs return only what changed since the cursor
+    - Deletes come back as tombstones
+    - Set-wise deletes write tombstones without loading rows one by one
+    - Tag changes count as changes
+    - Batches page with has_more
+    """
+    
+    databases = SHARD_DATABASES
+    
+    def setUp(self):
+        self.url = reverse('api_changes')
+        self.todos = [Todo.objects.create(title=f"Sync {i}") for i in range(3)]
+    
+    def sync(self, cursor=None, **params):
+        if cursor:
+            params['cursor'] = cursor
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+    
+    def test_initial_sync_returns_everything(self):
+        """Test syncing without a cursor returns all TODOs"""
+        data = self.sync()
+        self.assertEqual(
+            [change['todo']['title'] for change in data['changes']],
+            ["Sync 0", "Sync 1", "Sync 2"],
+        )
+        self.assertFalse(data['has_more'])
+    
+    def test_sync_returns_only_changes(self):
+        """Test a cursor only yields TODOs changed after it"""
+        cursor = self.sync()['cursor']
+        self.assertEqual(self.sync(cursor)['changes'], [])
+        
+        self.todos[1].is_resolved = True
+        self.todos[1].save()
+        data = self.sync(cursor)
+        self.assertEqual(len(data['changes']), 1)
+        self.assertEqual(data['changes'][0]['type'], 'upsert')
+        self.assertTrue(data['changes'][0]['todo']['is_resolved'])
+    
+    def test_delete_returns_tombstone(self):
+        """Test deleted TODOs are reported by id"""
+        cursor = self.sync()['cursor']
+        deleted_pk = self.todos[0].pk
+        self.todos[0].delete()
+        changes = self.sync(cursor)['changes']
+        self.assertEqual(changes[0]['type'], 'delete')
+        self.assertEqual(changes[0]['id'], deleted_pk)
+    
+    def test_set_wise_delete_returns_tombstones(self):
+        """Test delete_rows removes subtasks too and reports every row with a fixed number of queries"""
+        from .bulk import delete_rows
+        from .models import TitleTrigram
+        Todo.objects.bulk_create([Todo(title=f"Bulk {i}") for i in range(40)])
+        child = Todo.objects.create(title="Subtask", parent=self.todos[0])
+        self.todos[0].tags.add(Tag.objects.create(name="gone", slug="gone"))
+        cursor = self.sync()['cursor']
+        doomed = Todo.objects.exclude(pk__in=[self.todos[1].pk, self.todos[2].pk, child.pk])
+        # ids and owners, two subtask levels, tombstones, events, tag links, trigrams, rows
+        with self.assertNumQueries(8):
+            self.assertEqual(delete_rows(doomed), 42)
+        self.assertEqual(
+            sorted(Todo.objects.values_list('title', flat=True)), ["Sync 1", "Sync 2"],
+        )
+        self.assertFalse(Todo.tags.through.objects.exists())
+        self.assertEqual(TitleTrigram.objects.values('todo_id').distinct().count(), 2)
+        changes = self.sync(cursor)['changes']
+        self.assertEqual(len(changes), 42)
+        self.assertEqual({change['type'] for change in changes}, {'delete'})
+        self.assertIn(child.pk, [change['id'] for change in changes])
+        self.assertEqual(OutboxEvent.objects.filter(event_type='todo.deleted').count(), 42)
+    
+    def test_tag_change_is_a_change(self):
+        """Test adding a tag advances the TODO in the feed"""
+        cursor = self.sync()['cursor']
+        tag = Tag.objects.create(name="sync", slug="sync")
+        self.todos[2].tags.add(tag)
+        changes = self.sync(cursor)['changes']
+        self.assertEqual([c['todo']['id'] for c in changes], [self.todos[2].pk])
+        self.assertEqual(changes[0]['todo']['tags'], [tag.pk])
+    
+    def test_batches(self):
+        """Test limit splits the feed into resumable batches"""
+        first = self.sync(limit=2)
+        self.assertEqual(len(first['changes']), 2)
+        self.assertTrue(first['has_more'])
+        second = self.sync(first['cursor'], limit=2)
+        self.assertEqual([c['todo']['title'] for c in second['changes']], ["Sync 2"])
+        self.assertFalse(second['has_more'])
+    
+    def test_invalid_cursor(self):
+        """Test a malformed cursor is rejected"""
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+    
+    def test_feed_is_scoped_to_owner(self):
+        """Test users only receive their own changes"""
+        alice = User.objects.create_user('alice')
+        Todo.objects.create(title="Private", owner=alice)
+        titles = [c['todo']['title'] for c in self.sync()['changes']]
+        self.assertNotIn("Private", titles)
+
+
+class CalendarViewTest(TestCase):
+    """
+    Test the calendar views and the calendar API
+    
+    Scenarios:
+    - TODOs are bucketed by due day with per-day limits and totals
+    - Month grids cover whole weeks
+    - Month and week views render
+    - The API validates its range and uses one query
+    - Dates at the ends of the calendar are clamped instead of failing
+    """
+    
+    def setUp(self):
+        from datetime import datetime
+        self.day = timezone.localdate() + timedelta(days=3)
+        noon = timezone.make_aware(datetime.combine(self.day, datetime.min.time())) + timedelta(hours=12)
+        self.todos = [
+            Todo.objects.create(title=f"Due {i}", due_date=noon + timedelta(minutes=i)) for i in range(3)
+        ]
+        Todo.objects.create(title="Next day", due_date=noon + timedelta(days=1))
+        Todo.objects.create(title="Undated")
+    
+    def test_by_due_day(self):
+        """Test rows are grouped per day, earliest first, with totals"""
+        from .schedule import by_due_day
+        days = by_due_day(Todo.objects.all(), self.day, self.day + timedelta(days=1), per_day=2)
+        bucket = days[self.day]
+        self.assertEqual([row['title'] for row in bucket['todos']], ["Due 0", "Due 1"])
+        self.assertEqual((bucket['total'], bucket['more']), (3, 1))
+        self.assertEqual(days[self.day + timedelta(days=1)]['total'], 1)
+        self.assertEqual(by_due_day(Todo.objects.all(), self.day, self.day - timedelta(days=1)), {})
+    
+    def test_month_grid(self):
+        """Test month grids run Monday to Sunday"""
+        from datetime import date
+        from .schedule import month_grid, week_range
+        self.assertEqual(month_grid(2026, 10), (date(2026, 9, 28), date(2026, 11, 1)))
+        self.assertEqual(week_range(date(2026, 10, 21)), (date(2026, 10, 19), date(2026, 10, 25)))
+    
+    def test_calendar_views(self):
+        """Test month and week views show TODOs on their day"""
+        response = self.client.get(reverse('todo_calendar'), {'date': self.day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Due 2")
+        self.assertNotContains(response, "Undated")
+        response = self.client.get(reverse('todo_calendar_week'), {'date': self.day.isoformat()})
+        self.assertEqual(len(response.context['weeks']), 1)
+        self.assertContains(response, "Next day")
+        self.assertEqual(self.client.get(reverse('todo_calendar'), {'date': 'soon'}).status_code, 200)
+    
+    def test_calendar_api(self):
+        """Test the API returns light rows per day and rejects bad ranges"""
+        params = {'start': self.day.isoformat(), 'end': self.day.isoformat(), 'per_day': 1}
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('api_calendar'), params)
+        days = response.json()['days']
+        self.assertEqual(len(days), 1)
+        self.assertEqual(days[0]['total'], 3)
+        self.assertEqual(set(days[0]['todos'][0]), {'id', 'title', 'is_resolved', 'due_date', 'category'})
+        params['end'] = (self.day - timedelta(days=1)).isoformat()
+        self.assertEqual(self.client.get(reverse('api_calendar'), params).status_code, 400)
+    
+    def test_edge_dates(self):
+        """Test the first and last representable dates render a clamped range"""
+        from .schedule import FIRST_DAY, LAST_DAY
+        for name in ('todo_calendar', 'todo_calendar_week'):
+            for value in ('0001-01-01', '9999-12-31'):
+                response = self.client.get(reverse(name), {'date': value})
+                self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.client.get(reverse('todo_calendar'), {'date': '0001-01-01'}).context['anchor'], FIRST_DAY
+        )
+        response = self.client.get(reverse('api_calendar'), {'start': '9999-12-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['start'], LAST_DAY.isoformat())
+        response = self.client.get(reverse('api_calendar'), {'start': '0001-01-01', 'end': '0001-01-07'})
+        self.assertEqual(response.status_code, 200)
+
+
+class OptimisticConcurrencyTest(TestCase):
+    """
+    Test version checks on TODO writes
+    
+    Scenarios:
+    - Saving a stale copy raises VersionConflict and writes nothing
+    - Saves write only the changed columns, and nothing when unchanged
+    - The update form reports conflicts and keeps the newer row
+    - Inline title edits answer conflicts with 409 JSON
+    - Bulk updates move the version on
+    """
+    
+    def setUp(self):
+        self.todo = Todo.objects.create(title="Shared TODO", description="Original")
+    
+    def edit_data(self, **overrides):
+        data = {'title': "Shared TODO", 'description': "Original", 'version': self.todo.version}
+        data.update(overrides)
+        return data
+    
+    def test_stale_save_conflicts(self):
+        """Test a save from a stale copy raises and leaves the row alone"""
+        from django.db import transaction
+        from .models import VersionConflict
+        first = Todo.objects.get(pk=self.todo.pk)
+        second = Todo.objects.get(pk=self.todo.pk)
+        first.title = "First wins"
+        first.save()
+        self.assertEqual(first.version, 2)
+        second.title = "Second loses"
+        with self.assertRaises(VersionConflict) as caught, transaction.atomic():
+            second.save()
+        self.assertEqual(caught.exception.current.title, "First wins")
+        self.assertEqual(Todo.objects.get(pk=self.todo.pk).title, "First wins")
+    
+    def test_only_changed_fields_written(self):
+        """Test the UPDATE sets only changed columns, and unchanged saves skip it"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        todo = Todo.objects.get(pk=self.todo.pk)
+        with self.assertNumQueries(0):
+            todo.save()
+        todo.title = "Renamed"
+        with CaptureQueriesContext(connection) as context:
+            todo.save()
+        update = next(query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE "todos_todo"'))
+        self.assertIn('"version" = 2', update)
+        self.assertIn('"version" = 1', update.split('WHERE')[1])
+        self.assertNotIn('"description"', update)
+    
+    def test_update_view_conflict(self):
+        """Test a stale form post re-renders with the conflict and the newer version"""
+        url = reverse('todo_update', args=[self.todo.pk])
+        Todo.objects.filter(pk=self.todo.pk).update(title="Changed meanwhile", version=2)
+        response = self.client.post(url, self.edit_data(title="My edit"))
+        self.assertEqual(response.status_code, 409)
+        self.assertContains(response, "changed by someone else", status_code=409)
+        self.assertContains(response, "Title is now: Changed meanwhile", status_code=409)
+        self.assertContains(response, 'name="version" value="2"', status_code=409)
+        self.assertEqual(Todo.objects.get(pk=self.todo.pk).title, "Changed meanwhile")
+        
+        response = self.client.post(url, self.edit_data(title="My edit", version=2))
+        self.assertRedirects(response, reverse('todo_list'))
+        todo = Todo.objects.get(pk=self.todo.pk)
+        self.assertEqual((todo.title, todo.version), ("My edit", 3))
+    
+    def test_title_conflict_json(self):
+        """Test an inline rename from a stale version answers 409"""
+        Todo.objects.filter(pk=self.todo.pk).update(version=5)
+        response = self.client.post(
+            reverse('todo_title', args=[self.todo.pk]), {'title': "Renamed", 'version': 1},
+            HTTP_ACCEPT='application/json',
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['version'], 5)
+        self.assertEqual(Todo.objects.get(pk=self.todo.pk).title, "Shared TODO")
+    
+    def test_bulk_update_bumps_version(self):
+        """Test bulk updates invalidate copies loaded before them"""
+        from django.db import transaction
+        from .bulk import update_todos
+        from .models import VersionConflict
+        stale = Todo.objects.get(pk=self.todo.pk)
+        update_todos(Todo.objects.filter(pk=self.todo.pk), is_resolved=True)
+        self.assertEqual(Todo.objects.get(pk=self.todo.pk).version, 2)
+        stale.title = "Too late"
+        with self.assertRaises(VersionConflict), transaction.atomic():
+            stale.save()
+
+
+class SubtaskTreeTest(TestCase):
+    """
+    Test subtasks stored as materialized paths
+    
+    Scenarios:
+    - Paths follow the parents; subtrees and progress are one query
+    - Subtrees come back depth first with their levels
+    - Moving a subtree rewrites its paths in one UPDATE; cycles are refused
+    - Deleting a todo deletes its subtree
+    - Archiving skips parents and restoring reattaches subtasks
+    - Detail page and subtree API
+    """
+    
+    def setUp(self):
+        self.project = Todo.objects.create(title="Project")
+        self.design = Todo.objects.create(title="Design", parent=self.project)
+        self.build = Todo.objects.create(title="Build", parent=self.project, is_resolved=True)
+        self.mockups = Todo.objects.create(title="Mockups", parent=self.design)
+        self.other = Todo.objects.create(title="Other project")
+    
+    def test_paths_and_progress(self):
+        """Test paths list the ancestors and a subtree is one indexed query"""
+        from .tree import progress
+        self.assertEqual(self.mockups.path, f'{self.project.pk}/{self.design.pk}/')
+        self.assertEqual(self.mockups.ancestor_ids, [self.project.pk, self.design.pk])
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                set(Todo.objects.subtree(self.project)),
+                {self.project, self.design, self.build, self.mockups},
+            )
+        with self.assertNumQueries(1):
+            counts = progress(self.project)
+        self.assertEqual((counts['total'], counts['active'], counts['percent']), (3, 2, 33))
+        plan = Todo.objects.subtree(self.project, include_self=False).explain()
+        self.assertIn('todo_owner_path_idx', plan)
+    
+    def test_nested_order(self):
+        """Test subtrees are listed depth first with levels"""
+        from .tree import nested
+        rows = nested(self.project)
+        self.assertEqual(
+            [(row['title'], row['level']) for row in rows],
+            [("Design", 1), ("Mockups", 2), ("Build", 1)],
+        )
+    
+    def test_move_subtree(self):
+        """Test moving a todo rewrites its descendants' paths in one UPDATE"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        design = Todo.objects.get(pk=self.design.pk)
+        design.parent = self.other
+        with CaptureQueriesContext(connection) as context:
+            design.save()
+        path_updates = [query for query in context.captured_queries if 'SET "path"' in query['sql']]
+        self.assertEqual(len(path_updates), 1)
+        self.assertEqual(Todo.objects.get(pk=self.mockups.pk).path, f'{self.other.pk}/{self.design.pk}/')
+        self.assertEqual(set(Todo.objects.subtree(self.project)), {self.project, self.build})
+        
+        self.project.parent = self.mockups
+        with self.assertRaises(ValueError):
+            self.project.save()
+    
+    def test_form_refuses_cycle(self):
+        """Test the edit form refuses to move a todo under its own subtask"""
+        form = TodoForm(
+            data={'title': "Project", 'parent': self.mockups.pk},
+            instance=Todo.objects.get(pk=self.project.pk),
+        )
+        self.assertFalse(form.is_valid())
+        self.assertIn('parent', form.errors)
+    
+    def test_delete_subtree(self):
+        """Test deleting a todo deletes everything below it"""
+        self.design.delete()
+        self.assertEqual(set(Todo.objects.all()), {self.project, self.build, self.other})
+    
+    def test_archive_and_restore(self):
+        """Test parents stay live and restored subtasks go back under them"""
+        from .archive import archive_todos, restore_todos
+        Todo.objects.filter(pk__in=[self.project.pk, self.mockups.pk]).update(is_resolved=True)
+        self.assertEqual(archive_todos(Todo.objects.filter(is_resolved=True)).rows, 2)
+        self.assertTrue(Todo.objects.filter(pk=self.project.pk).exists())
+        self.assertEqual(ArchivedTodo.objects.get(pk=self.mockups.pk).parent_id, self.design.pk)
+        restore_todos(ArchivedTodo.objects.filter(pk=self.mockups.pk))
+        self.assertEqual(Todo.objects.get(pk=self.mockups.pk).path, f'{self.project.pk}/{self.design.pk}/')
+        
+        archive_todos(Todo.objects.filter(pk=self.mockups.pk))
+        Todo.objects.filter(pk=self.design.pk).delete()
+        restore_todos(ArchivedTodo.objects.filter(pk=self.mockups.pk))
+        mockups = Todo.objects.get(pk=self.mockups.pk)
+        self.assertEqual((mockups.parent_id, mockups.path), (None, ''))
+    
+    def test_detail_and_api(self):
+        """Test the detail page and subtree API show the tree and progress"""
+        response = self.client.get(reverse('todo_detail', args=[self.design.pk]))
+        self.assertContains(response, "Mockups")
+        self.assertContains(response, 'class="breadcrumb-item"')
+        response = self.client.get(reverse('api_todo_subtree', args=[self.project.pk]))
+        body = response.json()
+        self.assertEqual(body['progress']['total'], 3)
+        self.assertEqual([row['level'] for row in body['todos']], [1, 2, 1])
+        self.assertEqual(self.client.get(reverse('api_todo_subtree', args=[9999])).status_code, 404)
+
+
+class ManualOrderTest(TestCase):
+    """
+    Test hand ordering with fractional ranks
+    
+    Scenarios:
+    - Keys always fit between their neighbours
+    - New TODOs go to the top; sort=manual follows the ranks
+    - A move writes one row; long or tied keys are left to rebalance_ranks
+    - The move endpoint and the rebalance_ranks command
+    """
+    
+    databases = SHARD_DATABASES
+    
+    def setUp(self):
+        self.first = Todo.objects.create(title="First")
+        self.second = Todo.objects.create(title="Second")
+        self.third = Todo.objects.create(title="Third")
+    
+    def manual_titles(self):
+        return list(Todo.objects.filter_by_params({'sort': 'manual'}).values_list('title', flat=True))
+    
+    def test_between(self):
+        """Test generated keys sort strictly between their bounds"""
+        import random
+        from .ranks import between, spread
+        keys = []
+        for _ in range(500):
+            index = random.randrange(len(keys) + 1)
+            low = keys[index - 1] if index else None
+            high = keys[index] if index < len(keys) else None
+            key = between(low, high)
+            self.assertTrue((low or '') < key and (high is None or key < high))
+            self.assertFalse(key.endswith('0'))
+            keys.insert(index, key)
+        self.assertEqual(spread(40), sorted(spread(40)))
+        with self.assertRaises(ValueError):
+            between('b', 'a')
+    
+    def test_new_todos_first(self):
+        """Test new TODOs start at the top and the index serves the sort"""
+        self.assertEqual(self.manual_titles(), ["Third", "Second", "First"])
+        plan = Todo.objects.filter(owner=None).filter_by_params({'sort': 'manual'}).explain()
+        self.assertIn('todo_owner_rank_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+    
+    def test_move_updates_one_row(self):
+        """Test a move rewrites only the moved TODO's rank"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .ranks import move
+        before = dict(Todo.objects.values_list('pk', 'rank'))
+        with CaptureQueriesContext(connection) as context:
+            move(self.third, after=self.first)
+        updates = [query for query in context.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.manual_titles(), ["Second", "First", "Third"])
+        after = dict(Todo.objects.values_list('pk', 'rank'))
+        self.assertEqual({pk for pk in after if after[pk] != before[pk]}, {self.third.pk})
+    
+    def test_tied_neighbours_left_to_rebalance(self):
+        """Test moving between equal ranks writes one row and flags the owner"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .ranks import move, owners_to_rebalance
+        Todo.objects.update(rank='i')
+        first, second, third = (Todo.objects.get(pk=todo.pk) for todo in (self.first, self.second, self.third))
+        with CaptureQueriesContext(connection) as context:
+            move(third, after=first, before=second)
+        updates = [query for query in context.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.manual_titles(), ["First", "Second", "Third"])
+        self.assertEqual(owners_to_rebalance('default'), [None])
+    
+    def test_long_keys_left_to_rebalance(self):
+        """Test a new TODO above a long key does not respace the list inline"""
+        from .ranks import MAX_RANK_LENGTH, owners_to_rebalance
+        Todo.objects.filter(pk=self.third.pk).update(rank='0' * MAX_RANK_LENGTH + '1')
+        before = dict(Todo.objects.values_list('pk', 'rank'))
+        todo = Todo.objects.create(title="Fourth")
+        self.assertGreater(len(todo.rank), MAX_RANK_LENGTH)
+        self.assertEqual(dict(Todo.objects.exclude(pk=todo.pk).values_list('pk', 'rank')), before)
+        self.assertEqual(self.manual_titles(), ["Fourth", "Third", "Second", "First"])
+        self.assertEqual(owners_to_rebalance('default'), [None])
+    
+    def test_move_view(self):
+        """Test the endpoint moves by neighbour ids and rejects bad input"""
+        url = reverse('todo_move', args=[self.first.pk])
+        response = self.client.post(url, {'before': self.third.pk}, HTTP_ACCEPT='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.manual_titles(), ["First", "Third", "Second"])
+        response = self.client.post(url, {'after': self.second.pk, 'before': self.third.pk})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.client.post(url, {'after': 'top'}).status_code, 400)
+        self.assertEqual(self.client.post(url, {'after': 9999}).status_code, 400)
+        response = self.client.post(url, {'after': self.second.pk})
+        self.assertRedirects(response, reverse('todo_list') + '?sort=manual')
+    
+    def test_rebalance_command(self):
+        """Test rebalancing shortens long keys and keeps the order"""
+        Todo.objects.filter(pk=self.first.pk).update(rank='z' * 30)
+        call_command('rebalance_ranks', stdout=open(os.devnull, 'w'))
+        self.assertEqual(self.manual_titles(), ["Third", "Second", "First"])
+        self.assertTrue(all(len(rank) == 1 for rank in Todo.objects.values_list('rank', flat=True)))
+
+
+class FilteredCountTest(TestCase):
+    """
+    Test cached counts of filtered list pages
+    
+    Scenarios:
+    - Filter signatures ignore sort, page and junk values
+    - Paging through a result set counts it once
+    - Any change to the owner's TODOs forces a recount
+    - Archiving, restoring, retention purges and admin deletes force one too
+    - Large counts are reused as estimates after a change
+    """
+    
+    databases = SHARD_DATABASES
+    
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        for i in range(12):
+            Todo.objects.create(title=f"Counted {i}", is_resolved=i % 2 == 0)
+    
+    def count_queries(self, params):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse('todo_list'), params)
+        self.assertEqual(response.status_code, 200)
+        counts = [query for query in context.captured_queries if query['sql'].startswith('SELECT COUNT(*)')]
+        return len(counts), response
+    
+    def test_signature(self):
+        """Test equivalent filters share one signature"""
+        from .pagination import filter_signature
+        self.assertEqual(
+            filter_signature({'filter': 'active', 'search': ' milk ', 'sort': 'title', 'page': '2'}),
+            filter_signature({'search': 'milk', 'filter': 'active'}),
+        )
+        self.assertEqual(filter_signature({'filter': 'bogus', 'category': 'x'}), filter_signature({}))
+        self.assertNotEqual(filter_signature({'tag': '3'}), filter_signature({}))
+    
+    def test_paging_counts_once(self):
+        """Test later pages and other sorts reuse the first count"""
+        self.assertEqual(self.count_queries({'filter': 'all'})[0], 1)
+        self.assertEqual(self.count_queries({'page': 2, 'sort': 'title'})[0], 0)
+        queries, response = self.count_queries({'search': 'Counted'})
+        self.assertEqual(queries, 1)
+        self.assertContains(response, "12 TODOs")
+    
+    def test_change_forces_recount(self):
+        """Test a new TODO invalidates the owner's cached counts"""
+        self.count_queries({})
+        Todo.objects.create(title="Counted late")
+        queries, response = self.count_queries({})
+        self.assertEqual(queries, 1)
+        self.assertContains(response, "13 TODOs")
+    
+    def test_moves_and_purges_force_recount(self):
+        """Test every path that adds or removes listed rows moves the dataset version on"""
+        from django.contrib import admin
+        from . import bulk
+        from .archive import archive_todos, restore_todos
+        from .pagination import dataset_version
+        from .retention import apply_policy
+        shard = shard_for_owner(None)
+        old = timezone.now() - timedelta(days=200)
+        
+        def moves_version(change):
+            before = dataset_version(shard, None)
+            change()
+            return dataset_version(shard, None) != before
+        
+        resolved = Todo.objects.filter(is_resolved=True)
+        self.assertTrue(moves_version(lambda: archive_todos(resolved.filter(title="Counted 0"))))
+        self.assertTrue(moves_version(lambda: restore_todos(ArchivedTodo.objects.all())))
+        archive_todos(resolved.filter(title__in=["Counted 2", "Counted 4"]))
+        ArchivedTodo.objects.update(updated_at=old)
+        policy = RetentionPolicy.objects.create(name="Old", days=30)
+        self.assertTrue(moves_version(lambda: apply_policy(policy)))
+        self.assertFalse(ArchivedTodo.objects.exists())
+        archive_todos(resolved.filter(title="Counted 6"))
+        model_admin = admin.site._registry[ArchivedTodo]
+        self.assertTrue(moves_version(lambda: model_admin.delete_queryset(None, ArchivedTodo.objects.all())))
+        self.assertTrue(moves_version(lambda: bulk.delete_todos(Todo.objects.filter(title="Counted 8"))))
+        queries, response = self.count_queries({'archived': 1})
+        self.assertEqual(queries, 2)
+        self.assertEqual(response.context['paginator'].count, 8)
+    
+    @override_settings(TODO_APPROXIMATE_COUNT_FROM=10)
+    def test_approximate_count(self):
+        """Test large counts are shown as estimates after a change"""
+        from .pagination import FilteredCountPaginator
+        self.count_queries({})
+        Todo.objects.create(title="Counted late")
+        queries, response = self.count_queries({})
+        self.assertEqual(queries, 0)
+        self.assertTrue(response.context['paginator'].approximate)
+        self.assertContains(response, "about 12 TODOs")
+        paginator = FilteredCountPaginator(Todo.objects.none(), 10)
+        paginator.count, paginator.approximate = 123456, True
+        self.assertEqual(paginator.count_display, "about 120,000")
+        response = self.client.get(reverse('api_todo_list'))
+        self.assertTrue(response.json()['page']['count_is_estimate'])
+
+
+# ============================================
+# ARCHIVE AND RETENTION TESTS
+# ============================================
+
+class ArchiveTest(TestCase):
+    """
+    Test moving resolved TODOs to the archive tier and back.
+    
+    Scenarios:
+    - Only old resolved TODOs are archived, in chunks
+    - Category, tags and compressed descriptions survive the round trip
+    - Archiving records todo.archived events in a fixed number of queries
+    - ?archived=1 merges archived TODOs into the list, searchable and restorable
+    - The archive_todos command
+    """
+    
+    databases = SHARD_DATABASES
+    
+    def setUp(self):
+        self.category = Category.objects.create(name="Old")
+        self.tag = Tag.objects.create(name="done", slug="done")
+        self.old = Todo.objects.create(
+            title="Old report",
+            description="quarterly numbers " * 100,
+            is_resolved=True,
+            category=self.category,
+        )
+        self.old.tags.add(self.tag)
+        self.recent = Todo.objects.create(title="Recent done", is_resolved=True)
+        self.active = Todo.objects.create(title="Still open")
+        Todo.objects.filter(pk__in=[self.old.pk, self.active.pk]).update(
+            updated_at=timezone.now() - timedelta(days=200)
+        )
+    
+    def archive(self, **kwargs):
+        from .archive import archivable, archive_todos
+        return archive_todos(archivable(Todo.objects.all()), **kwargs)
+    
+    def test_archives_only_old_resolved(self):
+        """Test only resolved TODOs older than the cutoff move"""
+        result = self.archive()
+        self.assertEqual(result.rows, 1)
+        self.assertEqual(list(ArchivedTodo.objects.values_list('pk', flat=True)), [self.old.pk])
+        self.assertEqual(set(Todo.objects.values_list('pk', flat=True)), {self.recent.pk, self.active.pk})
+        self.assertTrue(TodoTombstone.objects.filter(todo_id=self.old.pk).exists())
+    
+    def test_archives_in_chunks(self):
+        """Test the move runs one batch per chunk"""
+        old = timezone.now() - timedelta(days=200)
+        Todo.objects.bulk_create([Todo(title=f"Bulk {i}", is_resolved=True) for i in range(5)])
+        Todo.objects.filter(title__startswith="Bulk").update(updated_at=old)
+        result = self.archive(chunk_size=2)
+        self.assertEqual(result, (6, 3))
+    
+    def test_archive_emits_archived_event(self):
+        """Test archiving records todo.archived, not todo.deleted, and restoring todo.created"""
+        from .archive import restore_todos
+        OutboxEvent.objects.all().delete()
+        self.archive()
+        self.assertEqual(
+            list(OutboxEvent.objects.values_list('event_type', 'todo_id')),
+            [('todo.archived', self.old.pk)],
+        )
+        restore_todos(ArchivedTodo.objects.all())
+        self.assertEqual(OutboxEvent.objects.latest('pk').event_type, 'todo.created')
+    
+    def test_archive_queries_do_not_grow_with_rows(self):
+        """Test a chunk moves with the same statements whatever its size"""
+        old = timezone.now() - timedelta(days=200)
+        Todo.objects.bulk_create([Todo(title=f"Bulk {i}", is_resolved=True) for i in range(49)])
+        Todo.objects.filter(title__startswith="Bulk").update(updated_at=old)
+        with self.assertNumQueries(14):
+            result = self.archive()
+        self.assertEqual(result.rows, 50)
+        self.assertEqual(TodoTombstone.objects.count(), 50)
+    
+    def test_round_trip_preserves_data(self):
+        """Test category, tags and description survive archive and restore"""
+        from .archive import restore_todos
+        self.archive()
+        archived = ArchivedTodo.objects.get()
+        self.assertEqual(archived.category, self.category)
+        self.assertEqual(list(archived.tags.all()), [self.tag])
+        self.assertEqual(archived.description, self.old.description)
+        self.assertIn("quarterly", archived.description_search)
+        
+        restore_todos(ArchivedTodo.objects.all())
+        self.assertFalse(ArchivedTodo.objects.exists())
+        todo = Todo.objects.get(pk=self.old.pk)
+        self.assertEqual(todo.description, self.old.description)
+        self.assertEqual(todo.created_at, self.old.created_at)
+        self.assertEqual(list(todo.tags.all()), [self.tag])
+        self.assertGreater(todo.updated_at, timezone.now() - timedelta(minutes=1))
+    
+    def test_list_view_archived(self):
+        """Test ?archived=1 lists and searches the archive"""
+        self.archive()
+        response = self.client.get(reverse('todo_list'))
+        self.assertNotContains(response, "Old report")
+        response = self.client.get(reverse('todo_list'), {'archived': '1', 'search': 'quarterly'})
+        self.assertContains(response, "Old report")
+        self.assertContains(response, reverse('todo_restore', args=[self.old.pk]))
+    
+    def test_list_view_includes_archive(self):
+        """Test ?archived=1 merges live and archived TODOs in one sorted, paged list"""
+        from .views import TodoListView
+        self.archive()
+        Todo.objects.create(title="Newest")
+        response = self.client.get(reverse('todo_list'), {'archived': '1', 'sort': 'title'})
+        todos = response.context['todos']
+        self.assertEqual(
+            [(todo.title, todo.is_archived) for todo in todos],
+            [("Newest", False), ("Old report", True), ("Recent done", False), ("Still open", False)],
+        )
+        self.assertContains(response, reverse('todo_toggle', args=[self.active.pk]))
+        self.assertContains(response, reverse('todo_restore', args=[self.old.pk]))
+        self.assertEqual(response.context['paginator'].count, 4)
+        
+        original = TodoListView.paginate_by
+        TodoListView.paginate_by = 2
+        try:
+            response = self.client.get(reverse('todo_list'), {'archived': '1', 'sort': '-title', 'page': 2})
+        finally:
+            TodoListView.paginate_by = original
+        self.assertEqual([todo.title for todo in response.context['todos']], ["Old report", "Newest"])
+    
+    def test_restore_view(self):
+        """Test restoring from the list brings the TODO back under its id"""
+        self.archive()
+        response = self.client.post(reverse('todo_restore', args=[self.old.pk]))
+        self.assertRedirects(response, reverse('todo_detail', args=[self.old.pk]))
+        self.assertTrue(Todo.objects.filter(pk=self.old.pk).exists())
+        response = self.client.post(reverse('todo_restore', args=[self.old.pk]))
+        self.assertEqual(response.status_code, 404)
+    
+    def test_api_archived(self):
+        """Test the read API includes the archive with archived=1"""
+        self.archive()
+        response = self.client.get(
+            reverse('api_todo_list'), {'archived': '1', 'fields': 'title,tags', 'sort': 'title'}
+        )
+        self.assertEqual(response.json()['data'], [
+            {'id': self.old.pk, 'title': "Old report", 'tags': [self.tag.pk], 'archived': True},
+            {'id': self.recent.pk, 'title': "Recent done", 'tags': [], 'archived': False},
+            {'id': self.active.pk, 'title': "Still open", 'tags': [], 'archived': False},
+        ])
+        self.assertEqual(response.json()['page']['count'], 3)
+    
+    def test_command(self):
+        """Test archive_todos honours --dry-run and --days"""
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('archive_todos', '--dry-run', stdout=out)
+        self.assertIn("1 TODOs to archive", out.getvalue())
+        self.assertFalse(ArchivedTodo.objects.exists())
+        call_command('archive_todos', '--days', '0', stdout=out)
+        self.assertEqual(ArchivedTodo.objects.count(), 2)
+
+
+class RetentionPurgeTest(TestCase):
+    """
+    Test retention policies and the purge_todos command.
+    
+    Scenarios:
+    - Policies delete old resolved TODOs, live and archived, in chunks
+    - A chunk is deleted set-wise, in a fixed number of queries
+    - Category-scoped policies
+    - An interrupted run resumes from its checkpoint
+    - Expired tombstones are dropped
+    """
+    
+    databases = SHARD_DATABASES
+    
+    def setUp(self):
+        self.work = Category.objects.create(name="Work")
+        self.home = Category.objects.create(name="Home")
+        old = timezone.now() - timedelta(days=60)
+        Todo.objects.bulk_create(
+            [Todo(title=f"Work {i}", is_resolved=True, category=self.work) for i in range(5)]
+            + [Todo(title=f"Home {i}", is_resolved=True, category=self.home) for i in range(3)]
+            + [Todo(title="Open", category=self.work)]
+        )
+        Todo.objects.update(updated_at=old)
+        self.recent = Todo.objects.create(title="Recent", is_resolved=True, category=self.work)
+    
+    def purge(self, *args):
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        call_command('purge_todos', '--pause', '0', '--batch-size', '2', *args, stdout=out)
+        return out.getvalue()
+    
+    def test_policy_purges_old_resolved(self):
+        """Test only old resolved TODOs are deleted, in batches"""
+        RetentionPolicy.objects.create(name="All", days=30)
+        output = self.purge()
+        self.assertIn("All: purged 8 TODOs.", output)
+        self.assertIn("default:todo deleted 2 (total 2)", output)
+        self.assertEqual(
+            set(Todo.objects.values_list('title', flat=True)), {"Open", "Recent"}
+        )
+        policy = RetentionPolicy.objects.get()
+        self.assertEqual(policy.checkpoint, {})
+        self.assertIsNotNone(policy.last_run_at)
+    
+    def test_purge_queries_do_not_grow_with_rows(self):
+        """Test a chunk is deleted set-wise, with one tombstone and event per TODO"""
+        from .archive import archive_todos
+        from .retention import apply_policy
+        archive_todos(Todo.objects.filter(title__startswith="Home"))
+        Todo.objects.bulk_create([Todo(title=f"Bulk {i}", is_resolved=True) for i in range(32)])
+        Todo.objects.filter(title__startswith="Bulk").update(updated_at=timezone.now() - timedelta(days=60))
+        purged = list(Todo.objects.filter(is_resolved=True).exclude(title="Recent").values_list('pk', flat=True))
+        OutboxEvent.objects.all().delete()
+        policy = RetentionPolicy.objects.create(name="All", days=30)
+        with self.assertNumQueries(21):
+            self.assertEqual(apply_policy(policy), 40)
+        self.assertFalse(ArchivedTodo.objects.exists())
+        self.assertEqual(OutboxEvent.objects.filter(event_type='todo.deleted').count(), 37)
+        self.assertEqual(TodoTombstone.objects.filter(todo_id__in=purged).count(), 37)
+    
+    def test_category_policy_and_archive(self):
+        """Test a category policy also purges matching archived TODOs"""
+        from .archive import archive_todos
+        archive_todos(Todo.objects.filter(title="Work 0"))
+        RetentionPolicy.objects.create(name="Work", category_name="Work", days=30)
+        RetentionPolicy.objects.create(name="Off", days=1, is_active=False)
+        self.purge()
+        self.assertFalse(ArchivedTodo.objects.exists())
+        self.assertEqual(Todo.objects.filter(title__startswith="Home").count(), 3)
+        self.assertFalse(Todo.objects.filter(title__startswith="Work").exists())
+    
+    def test_resume_from_checkpoint(self):
+        """Test an interrupted run skips ids below its checkpoint"""
+        from .retention import apply_policy
+        first = Todo.objects.order_by('pk').first()
+        policy = RetentionPolicy.objects.create(
+            name="All", days=30, checkpoint={'default:todo': first.pk}
+        )
+        apply_policy(policy, chunk_size=2)
+        self.assertEqual(
+            set(Todo.objects.values_list('title', flat=True)), {first.title, "Open", "Recent"}
+        )
+    
+    def test_expired_tombstones(self):
+        """Test tombstones past TODO_TOMBSTONE_RETENTION_DAYS are dropped"""
+        TodoTombstone.objects.create(todo_id=1, deleted_at=timezone.now() - timedelta(days=90))
+        TodoTombstone.objects.create(todo_id=2)
+        self.assertIn("Purged 1 expired todo tombstones.", self.purge())
+        self.assertEqual(list(TodoTombstone.objects.values_list('todo_id', flat=True)), [2])
+    
+    def test_unknown_policy(self):
+        """Test naming a missing policy is an error"""
+        from django.core.management.base import CommandError
+        with self.assertRaises(CommandError):
+            self.purge('--policy', 'Nope')
+
+
+class AnalyticsRollupTest(TestCase):
+    """
+    Test the daily rollups and the analytics views
+    
+    Scenarios:
+    - Creating, resolving and reopening update today's rollup
+    - Bulk resolves are rolled up per owner and category
+    - The median time-to-resolve comes from the histogram
+    - Backfill rebuilds days from the TODO tables
+    - The overdue snapshot
+    - The dashboard and JSON endpoint read rollups only
+    """
+    
+    def setUp(self):
+        self.category = Category.objects.create(name="Work")
+        self.todo = Todo.objects.create(title="Rolled up", category=self.category)
+    
+    def today(self):
+        from .models import DailyRollup
+        rows = DailyRollup.objects.filter(day=timezone.localdate(), category_id=self.category.pk)
+        return {
+            field: sum(row[field] for row in rows.values(field))
+            for field in ('created', 'resolved', 'reopened', 'overdue')
+        }
+    
+    def test_changes_update_rollup(self):
+        """Test create, resolve and reopen counts"""
+        self.assertEqual(self.today(), {'created': 1, 'resolved': 0, 'reopened': 0, 'overdue': 0})
+        self.todo.is_resolved = True
+        self.todo.save(update_fields=['is_resolved', 'updated_at'])
+        self.assertIsNotNone(Todo.objects.get(pk=self.todo.pk).resolved_at)
+        self.todo.is_resolved = False
+        self.todo.save()
+        self.todo.title = "Renamed only"
+        self.todo.save()
+        self.assertEqual(self.today(), {'created': 1, 'resolved': 1, 'reopened': 1, 'overdue': 0})
+        self.assertIsNone(Todo.objects.get(pk=self.todo.pk).resolved_at)
+    
+    def test_bulk_resolve(self):
+        """Test bulk updates roll up only the TODOs that changed state"""
+        from . import bulk
+        Todo.objects.create(title="Second", category=self.category)
+        Todo.objects.create(title="Already done", category=self.category, is_resolved=True)
+        bulk.update_todos(Todo.objects.all(), is_resolved=True)
+        self.assertEqual(self.today()['resolved'], 3)
+        self.assertFalse(Todo.objects.filter(resolved_at__isnull=True).exists())
+    
+    def test_median(self):
+        """Test the median is interpolated inside its histogram bucket"""
+        from .rollups import HOUR, bucket_for, median_seconds
+        self.assertEqual(bucket_for(0), 0)
+        self.assertEqual(bucket_for(10 ** 9), 8)
+        self.assertEqual(median_seconds({}), None)
+        self.assertEqual(median_seconds({'0': 2}), HOUR / 2)
+        self.assertEqual(median_seconds({'0': 1, '1': 1}), HOUR)
+    
+    def test_backfill(self):
+        """Test backfill rebuilds created, resolved and overdue per day"""
+        from .models import DailyRollup
+        from .rollups import backfill
+        now = timezone.now()
+        Todo.objects.filter(pk=self.todo.pk).update(
+            created_at=now - timedelta(days=3), due_date=now - timedelta(days=2),
+        )
+        Todo.objects.create(title="Done", is_resolved=True)
+        DailyRollup.objects.all().delete()
+        today = timezone.localdate()
+        backfill('default', today - timedelta(days=3), today)
+        rows = DailyRollup.objects.filter(category_id=self.category.pk)
+        self.assertEqual(rows.get(day=today - timedelta(days=3)).created, 1)
+        self.assertEqual(rows.get(day=today).overdue, 1)
+        self.assertEqual(DailyRollup.objects.get(day=today, category_id=None).resolved, 1)
+    
+    def test_snapshot_overdue(self):
+        """Test the daily snapshot counts open TODOs past due"""
+        from .rollups import snapshot_overdue
+        Todo.objects.filter(pk=self.todo.pk).update(due_date=timezone.now() - timedelta(hours=1))
+        self.assertEqual(snapshot_overdue('default'), 1)
+        self.assertEqual(self.today()['overdue'], 1)
+    
+    def test_views_read_rollups_only(self):
+        """Test the dashboard and API query only rollups and category names"""
+        self.todo.is_resolved = True
+        self.todo.save()
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('api_analytics'), {'days': 7})
+        data = response.json()
+        self.assertEqual(len(data['days']), 7)
+        self.assertEqual(data['totals']['created'], 1)
+        self.assertEqual(data['categories'][0]['name'], "Work")
+        self.assertIsNotNone(data['totals']['median_resolve_seconds'])
+        response = self.client.get(reverse('todo_analytics'), {'days': 'x'})
+        self.assertContains(response, "Median time to resolve")
+        self.assertEqual(response.context['period'], 30)
+
+
+# ============================================
+# REMINDER TESTS
+# ============================================
+
+class ListSink:
+    def __init__(self):
+        self.batches = []
+    
+    def send(self, reminders):
+        self.batches.append(reminders)
+    
+    @property
+    def reminders(self):
+        return [(r['window'], r['title']) for batch in self.batches for r in batch]
+
+
+@override_settings(TODO_REMINDER_LEAD_MINUTES=60)
+class ReminderSchedulerTest(TestCase):
+    """
+    Test the due-date reminder scanner.
+    
+    Scenarios:
+    - Only TODOs entering a window since the last pass are reported
+    - History is not replayed on the first pass
+    - TODOs created or rescheduled behind a pass are still reported
+    - Batching and a fixed number of queries
+    - File and email sinks, and the command
+    """
+    
+    databases = SHARD_DATABASES
+    
+    def setUp(self):
+        self.now = timezone.now()
+        self.soon = Todo.objects.create(title="Soon", due_date=self.now + timedelta(minutes=30))
+        Todo.objects.create(title="Later", due_date=self.now + timedelta(days=2))
+        Todo.objects.create(title="Long overdue", due_date=self.now - timedelta(days=1))
+        Todo.objects.create(title="Done", due_date=self.now + timedelta(minutes=10), is_resolved=True)
+    
+    def run_pass(self, offset=timedelta(), **kwargs):
+        from .reminders import run_pass
+        sink = ListSink()
+        run_pass(sink, now=self.now + offset, **kwargs)
+        return sink
+    
+    def test_first_pass(self):
+        """Test the first pass reports only what is due soon from now on"""
+        self.assertEqual(self.run_pass().reminders, [('due_soon', "Soon")])
+    
+    def test_passes_only_report_new_entries(self):
+        """Test each TODO is reported once per window"""
+        self.run_pass()
+        self.assertEqual(self.run_pass(timedelta(minutes=5)).reminders, [])
+        self.assertEqual(self.run_pass(timedelta(hours=1)).reminders, [('overdue', "Soon")])
+        self.assertEqual(
+            self.run_pass(timedelta(days=2)).reminders,
+            [('due_soon', "Later"), ('overdue', "Later")],
+        )
+    
+    def test_late_entries(self):
+        """Test TODOs entering the due-soon window behind a pass are still reported"""
+        self.run_pass()
+        Todo.objects.create(title="Added", due_date=self.now + timedelta(minutes=20))
+        later = Todo.objects.get(title="Later")
+        later.due_date = self.now + timedelta(minutes=40)
+        later.save()
+        self.assertEqual(
+            self.run_pass(timedelta(minutes=5)).reminders,
+            [('due_soon', "Added"), ('due_soon', "Later")],
+        )
+        self.assertEqual(self.run_pass(timedelta(minutes=10)).reminders, [])
+        self.soon.due_date = self.now + timedelta(minutes=50)
+        self.soon.save()
+        self.assertEqual(self.run_pass(timedelta(minutes=15)).reminders, [('due_soon', "Soon")])
+    
+    def test_batches_and_constant_queries(self):
+        """Test reminders are sent in batches with a fixed number of queries"""
+        Todo.objects.bulk_create([
+            Todo(title=f"Batch {i}", due_date=self.now + timedelta(minutes=20)) for i in range(4)
+        ])
+        sink = self.run_pass(batch_size=2)
+        self.assertEqual([len(batch) for batch in sink.batches], [2, 2, 1])
+        # Per window: cursor lookup, one scan, pruning and the cursor update.
+        with self.assertNumQueries(8):
+            self.assertEqual(self.run_pass(timedelta(minutes=1)).reminders, [])
+    
+    def test_file_sink(self):
+        """Test FileSink appends JSON lines"""
+        import json
+        import tempfile
+        from .reminders import FileSink, run_pass
+        with tempfile.NamedTemporaryFile('r', suffix='.jsonl') as handle:
+            run_pass(FileSink(handle.name), now=self.now)
+            lines = [json.loads(line) for line in handle]
+        self.assertEqual(lines[0]['todo_id'], self.soon.pk)
+        self.assertEqual(lines[0]['window'], 'due_soon')
+    
+    def test_email_sink(self):
+        """Test EmailSink mails owners with an address"""
+        from django.core import mail
+        from .reminders import EmailSink, run_pass
+        owner = User.objects.create_user('alice', 'alice@example.com')
+        Todo.objects.create(title="Alice's", owner=owner, due_date=self.now + timedelta(minutes=5))
+        run_pass(EmailSink(from_email='todos@example.com'), now=self.now)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['alice@example.com'])
+        self.assertIn("due soon", mail.outbox[0].subject)
+    
+    def test_command(self):
+        """Test send_reminders runs one pass with the configured sink"""
+        from io import StringIO
+        from django.core.management import call_command
+        out = StringIO()
+        with self.assertLogs('todos.reminders', 'INFO') as logs:
+            call_command('send_reminders', stdout=out)
+        self.assertIn("Sent 1 due-soon and 0 overdue reminders.", out.getvalue())
+        self.assertIn('"Soon"', logs.output[0])
+
+
+# ============================================
+# OUTBOX AND WEBHOOK TESTS
+# ============================================
+
+class OutboxTest(TestCase):
+    """
+    Test outbox events are written with every TODO change.
+    
+    Scenarios:
+    - Create, update, toggle and delete events from the views
+    - Tag changes and bulk admin actions
+    - Events roll back with the change
+    """
+    
+    def events(self):
+        return list(OutboxEvent.objects.order_by('pk').values_list('event_type', 'payload'))
+    
+    def test_view_changes(self):
+        """Test each view records one event with the changed fields"""
+        self.client.post(reverse('todo_create'), {'title': "Hook me"})
+        todo = Todo.objects.get()
+        self.client.post(reverse('todo_update', args=[todo.pk]), {'title': "Hooked"})
+        self.client.post(reverse('todo_toggle', args=[todo.pk]))
+        self.client.post(reverse('todo_delete', args=[todo.pk]))
+        events = self.events()
+        self.assertEqual(
+            [event_type for event_type, _ in events],
+            ['todo.created', 'todo.updated', 'todo.toggled', 'todo.deleted'],
+        )
+        self.assertEqual(events[1][1]['changed'], ['title'])
+        self.assertEqual(events[1][1]['title'], "Hooked")
+        self.assertIs(events[2][1]['is_resolved'], True)
+        self.assertEqual(events[3][1], {'id': todo.pk, 'owner': None, 'changed': []})
+    
+    def test_unchanged_save(self):
+        """Test saving without changes records nothing"""
+        todo = Todo.objects.create(title="Quiet")
+        OutboxEvent.objects.all().delete()
+        Todo.objects.get(pk=todo.pk).save()
+        self.assertEqual(self.events(), [])
+    
+    def test_tags_and_bulk_actions(self):
+        """Test tag links and set-based updates record events too"""
+        from . import bulk
+        tag = Tag.objects.create(name="hook", slug="hook")
+        todos = [Todo.objects.create(title=f"Bulk {i}") for i in range(3)]
+        OutboxEvent.objects.all().delete()
+        todos[0].tags.add(tag)
+        bulk.update_todos(Todo.objects.all(), is_resolved=True)
+        events = self.events()
+        self.assertEqual(events[0][0], 'todo.updated')
+        self.assertEqual(events[0][1]['changed'], ['tags'])
+        self.assertEqual([event_type for event_type, _ in events[1:]], ['todo.toggled'] * 3)
+    
+    def test_rolled_back_with_change(self):
+        """Test a rolled back change leaves no event behind"""
+        from django.db import transaction
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Todo.objects.create(title="Doomed")
+                raise RuntimeError
+        self.assertEqual(self.events(), [])
+
+
+class LiveEventsTest(TestCase):
+    """
+    Test live change events for open list pages.
+    
+    Scenarios:
+    - Status counts come from one aggregate query
+    - Committed changes reach subscribers as compact events
+    - The server-sent event stream, served only under ASGI with TODO_LIVE_EVENTS
+    - The outbox polling backend
+    """
+    
+    databases = SHARD_DATABASES
+    
+    def setUp(self):
+        self.todo = Todo.objects.create(title="Live", due_date=timezone.now() - timedelta(days=1))
+        Todo.objects.create(title="Done", is_resolved=True)
+    
+    def test_status_counts(self):
+        """Test the four list counters in one query"""
+        with self.assertNumQueries(1):
+            counts = Todo.objects.status_counts()
+        self.assertEqual(counts, {'total': 2, 'active': 1, 'resolved': 1, 'overdue': 1})
+    
+    async def test_committed_change_reaches_subscriber(self):
+        """Test a toggle is dispatched on commit with its changed fields"""
+        from asgiref.sync import sync_to_async
+        from .events import hub
+        queue = hub.subscribe(None)
+        try:
+            def toggle():
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.todo.is_resolved = True
+                    self.todo.save()
+            await sync_to_async(toggle)()
+            event = await asyncio.wait_for(queue.get(), 1)
+        finally:
+            hub.unsubscribe(None, queue)
+        self.assertEqual(event, {
+            'owner': None, 'id': self.todo.pk, 'type': 'todo.toggled',
+            'changed': ['is_resolved'], 'fields': {'is_resolved': True},
+        })
+    
+    def test_wsgi_returns_no_content(self):
+        """Test the WSGI path answers 204 at once and pages do not subscribe"""
+        with override_settings(TODO_LIVE_EVENTS=True):
+            response = self.client.get(reverse('todo_events'))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(response.streaming)
+        self.assertNotContains(self.client.get(reverse('todo_list')), 'data-events-url')
+        with override_settings(TODO_LIVE_EVENTS=True):
+            self.assertContains(self.client.get(reverse('todo_list')), 'data-events-url')
+    
+    @override_settings(TODO_LIVE_EVENTS=False)
+    async def test_stream_off(self):
+        """Test ASGI requests get 204 too while live events are off"""
+        response = await self.async_client.get(reverse('todo_events'))
+        self.assertEqual(response.status_code, 204)
+    
+    @override_settings(TODO_LIVE_EVENTS=True)
+    async def test_event_stream(self):
+        """Test the stream sends events with fresh counts"""
+        from .events import hub
+        response = await self.async_client.get(reverse('todo_events'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        reading = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        hub.dispatch([{'owner': None, 'id': 7, 'type': 'todo.deleted', 'changed': [], 'fields': {}}])
+        chunk = await asyncio.wait_for(reading, 1)
+        event_line, data_line = chunk.decode().strip().split('\n')
+        self.assertEqual(event_line, 'event: todo')
+        data = json.loads(data_line.removeprefix('data: '))
+        self.assertEqual(data['id'], 7)
+        self.assertEqual(data['counts']['total'], 2)
+        await stream.aclose()
+    
+    @override_settings(TODO_OUTBOX_SETTLE_SECONDS=0)
+    def test_outbox_backend(self):
+        """Test the polling backend picks up only new outbox rows"""
+        from .events import OutboxBackend
+        backend = OutboxBackend()
+        self.assertEqual(backend.fetch(), [])
+        self.todo.title = "Renamed"
+        self.todo.save()
+        events = backend.fetch()
+        self.assertEqual([(e['type'], e['fields']) for e in events], [('todo.updated', {'title': "Renamed"})])
+        self.assertEqual(backend.fetch(), [])
+    
+    @override_settings(TODO_OUTBOX_SETTLE_SECONDS=60)
+    def test_outbox_backend_waits_to_settle(self):
+        """Test the polling backend leaves events younger than the settle window"""
+        from .events import OutboxBackend
+        backend = OutboxBackend()
+        backend.fetch()
+        self.todo.title = "Renamed"
+        self.todo.save()
+        self.assertEqual(backend.fetch(), [])
+        OutboxEvent.objects.update(created_at=timezone.now() - timedelta(minutes=2))
+        self.assertEqual([e['type'] for e in backend.fetch()], ['todo.updated'])
+
+
+class WebhookReceiver(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.received.append((dict(self.headers), body))
+        self.send_response(self.server.status)
+        self.end_headers()
+    
+    def log_message(self, *args):
+        pass
+
+
+@override_settings(TODO_OUTBOX_SETTLE_SECONDS=0)
+class WebhookDeliveryTest(TestCase):
+    """
+    Test batched webhook delivery against a local HTTP server.
+    
+    Scenarios:
+    - Events are delivered in one signed batch and the cursor advances
+    - Events younger than the settle window wait for the next pass
+    - Failures back off and are retried with the same events
+    - Several endpoints are served in one pass
+    - Lag reporting and the command
+    """
+    
+    databases = SHARD_DATABASES
+    
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), WebhookReceiver)
+        self.server.received = []
+        self.server.status = 200
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}/hook'
+        self.endpoint = WebhookEndpoint.objects.create(name="Local", url=self.url, secret="s3cret")
+        for i in range(3):
+            Todo.objects.create(title=f"Event {i}")
+    
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+    
+    def deliver(self, **kwargs):
+        from .webhooks import deliver_pending
+        return deliver_pending(**kwargs)
+    
+    def test_batch_delivery(self):
+        """Test pending events go out in one signed POST"""
+        import hashlib
+        import hmac
+        deliveries = self.deliver()
+        self.assertEqual([(d.events, d.error) for d in deliveries], [(3, None)])
+        headers, body = self.server.received[0]
+        self.assertEqual(
+            headers['X-Todo-Signature'],
+            hmac.new(b"s3cret", body, hashlib.sha256).hexdigest(),
+        )
+        events = json.loads(body)['events']
+        self.assertEqual([e['data']['title'] for e in events], ["Event 0", "Event 1", "Event 2"])
+        self.assertEqual(self.deliver(), [])
+        self.assertEqual(len(self.server.received), 1)
+    
+    def test_unsettled_events_wait(self):
+        """Test the cursor stops short of events that may not have committed"""
+        with override_settings(TODO_OUTBOX_SETTLE_SECONDS=60):
+            self.assertEqual(self.deliver(), [])
+            OutboxEvent.objects.filter(payload__title="Event 0").update(
+                created_at=timezone.now() - timedelta(minutes=2)
+            )
+            self.assertEqual(self.deliver()[0].events, 1)
+        self.assertEqual(self.deliver()[0].events, 2)
+    
+    def test_batch_size(self):
+        """Test a backlog is drained batch by batch"""
+        self.assertEqual(self.deliver(batch_size=2)[0].events, 2)
+        self.assertEqual(self.deliver(batch_size=2)[0].events, 1)
+    
+    def test_retry_with_backoff(self):
+        """Test a failed batch waits for its backoff, then is resent"""
+        self.server.status = 500
+        delivery, = self.deliver()
+        self.assertEqual(delivery.error, 'HTTP 500')
+        self.endpoint.refresh_from_db()
+        self.assertEqual(self.endpoint.failures, 1)
+        self.assertEqual(self.endpoint.cursors, {})
+        
+        self.server.status = 200
+        self.assertEqual(self.deliver(), [])
+        delivery, = self.deliver(now=self.endpoint.next_attempt_at)
+        self.assertIsNone(delivery.error)
+        self.assertEqual(delivery.events, 3)
+        self.endpoint.refresh_from_db()
+        self.assertEqual(self.endpoint.failures, 0)
+    
+    def test_several_endpoints(self):
+        """Test every active endpoint gets the events in one pass"""
+        WebhookEndpoint.objects.create(name="Second", url=self.url)
+        WebhookEndpoint.objects.create(name="Off", url=self.url, is_active=False)
+        self.assertEqual(len(self.deliver()), 2)
+        self.assertEqual(len(self.server.received), 2)
+    
+    def test_lag_and_command(self):
+        """Test lag is reported before and after delivery"""
+        from io import StringIO
+        from django.core.management import call_command
+        from .webhooks import endpoint_lag
+        self.assertEqual(endpoint_lag(self.endpoint).pending, 3)
+        out = StringIO()
+        call_command('deliver_webhooks', stdout=out)
+        self.assertIn("Local: delivered 3 events", out.getvalue())
+        self.assertIn("Local: 0 pending, lag 0s", out.getvalue())
+
+
+# ============================================
+# STATIC FILE TESTS
+# ============================================
+
+class StaticAssetsTest(TestCase):
+    """
+    Test collectstatic output and the precompressed static middleware
+    
+    Scenarios:
+    - collectstatic writes fingerprinted names and .gz variants
+    - gzip is served when accepted, identity otherwise
+    - Fingerprinted names are immutable, others short-lived
+    - Byte ranges, unsatisfiable ranges and If-None-Match
+    - Unknown files fall through to the URL resolver
+    """
+    
+    HASHED = 'app.0123456789ab.css'
+    
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.css = b'body { color: #333; }\n' * 50
+        for name in (self.HASHED, 'app.css'):
+            with open(os.path.join(self.root, name), 'wb') as handle:
+                handle.write(self.css)
+        with open(os.path.join(self.root, self.HASHED + '.gz'), 'wb') as handle:
+            handle.write(gzip.compress(self.css))
+        serving = override_settings(TODO_SERVE_STATIC=True, STATIC_ROOT=self.root)
+        serving.enable()
+        self.addCleanup(serving.disable)
+    
+    def get(self, name, **headers):
+        return self.client.get(settings.STATIC_URL + name, headers=headers)
+    
+    def test_collectstatic_compresses(self):
+        """Test collectstatic writes hashed files with smaller gzip variants"""
+        storages = {
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+            'staticfiles': {'BACKEND': 'todos.storage.CompressedManifestStaticFilesStorage'},
+        }
+        with override_settings(STORAGES=storages):
+            call_command('collectstatic', interactive=False, verbosity=0, ignore_patterns=['admin'])
+        with open(os.path.join(self.root, 'staticfiles.json')) as handle:
+            hashed = json.load(handle)['paths']['todos/css/todo.css']
+        self.assertRegex(hashed, r'^todos/css/todo\.[0-9a-f]{12}\.css$')
+        with open(os.path.join(self.root, hashed), 'rb') as handle:
+            original = handle.read()
+        with open(os.path.join(self.root, hashed + '.gz'), 'rb') as handle:
+            compressed = handle.read()
+        self.assertLess(len(compressed), len(original))
+        self.assertEqual(gzip.decompress(compressed), original)
+    
+    def test_serves_gzip_variant(self):
+        """Test a client accepting gzip gets the precompressed file"""
+        response = self.get(self.HASHED, accept_encoding='br;q=0, gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Type'], 'text/css')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(gzip.decompress(response.content), self.css)
+    
+    def test_serves_identity(self):
+        """Test clients without gzip and unhashed names get the plain file"""
+        response = self.get('app.css')
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertEqual(response.content, self.css)
+        self.assertEqual(response['Content-Length'], str(len(self.css)))
+        self.assertEqual(response['Cache-Control'], 'public, max-age=60')
+    
+    def test_range_requests(self):
+        """Test single byte ranges and unsatisfiable ranges"""
+        response = self.get(self.HASHED, range='bytes=5-9')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.content, self.css[5:10])
+        self.assertEqual(response['Content-Range'], f'bytes 5-9/{len(self.css)}')
+        response = self.get(self.HASHED, range='bytes=-4')
+        self.assertEqual(response.content, self.css[-4:])
+        response = self.get(self.HASHED, range=f'bytes={len(self.css)}-')
+        self.assertEqual(response.status_code, 416)
+    
+    def test_not_modified(self):
+        """Test a matching If-None-Match gets 304 without a body"""
+        etag = self.get(self.HASHED, accept_encoding='gzip')['ETag']
+        response = self.get(self.HASHED, accept_encoding='gzip', if_none_match=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        # The plain file has its own validator.
+        self.assertEqual(self.get(self.HASHED, if_none_match=etag).status_code, 200)
+    
+    def test_missing_file_falls_through(self):
+        """Test unknown names and traversal attempts are left to Django"""
+        self.assertEqual(self.get('missing.css').status_code, 404)
+        self.assertEqual(self.get('..%2Fsettings.py').status_code, 404)
+
+
+# ============================================
+# STARTUP TESTS
+# ============================================
+
+class WarmupTest(TestCase):
+    """
+    Test the warm-up of serving processes
+    
+    Scenarios:
+    - Every app template is found and compiled
+    - Every named todos URL is reversed
+    - A warm-up request runs through the whole WSGI stack
+    - preload logs its work, swallows failures and closes connections
+    """
+    
+    databases = SHARD_DATABASES
+    
+    def test_templates(self):
+        """Test all app templates are warmed"""
+        from .warmup import template_names, warm_templates
+        names = template_names()
+        self.assertIn('todos/base.html', names)
+        self.assertIn('admin/todos/todo/purge_confirmation.html', names)
+        self.assertEqual(warm_templates(), len(names))
+    
+    def test_urls(self):
+        """Test every named todos URL is reversed"""
+        from . import urls
+        from .warmup import warm_urls
+        self.assertEqual(warm_urls(), len([pattern for pattern in urls.urlpatterns if pattern.name]))
+    
+    def test_request(self):
+        """Test warm-up requests get the real response"""
+        from django.core.handlers.wsgi import WSGIHandler
+        from django.core.signals import request_started
+        from django.db import close_old_connections
+        from .warmup import get
+        Todo.objects.create(title="Warm")
+        request_started.disconnect(close_old_connections)
+        try:
+            self.assertEqual(get(WSGIHandler(), reverse('todo_list')), 200)
+            self.assertEqual(get(WSGIHandler(), '/missing/'), 404)
+        finally:
+            request_started.connect(close_old_connections)
+    
+    @override_settings(TODO_WARMUP=True, TODO_WARMUP_PATHS=())
+    def test_preload(self):
+        """Test preload warms up and leaves no connection open"""
+        from unittest import mock
+        from django.db import connections
+        from .warmup import preload
+        with mock.patch.object(connections, 'close_all') as close_all:
+            with self.assertLogs('todos.warmup', 'INFO') as logs:
+                preload(None)
+        close_all.assert_called_once_with()
+        self.assertIn('Warmed up in', logs.output[0])
+    
+    @override_settings(TODO_WARMUP=True)
+    def test_preload_failure(self):
+        """Test a failing warm-up is logged, not raised"""
+        from unittest import mock
+        from django.db import connections
+        from .warmup import preload
+        with mock.patch('todos.warmup.warm_templates', side_effect=RuntimeError('broken')), \
+                mock.patch.object(connections, 'close_all') as close_all:
+            with self.assertLogs('todos.warmup', 'WARNING'):
+                preload(None)
+        close_all.assert_called_once_with()
+
+
+# ============================================
+# ADMIN TESTS
+# ============================================
+
+class TodoAdminTest(TestCase):
+    """
+    Test the TODO admin changelist stays cheap on large tables.
+    
+    Scenarios:
+    - Changelist query count does not grow with rows (no N+1 on category)
+    - Result counts are reused between page loads
+    - Title prefix and ID search
+    - Month drill-down filter
+    - Category filter by id, without listing every category
+    """
+    
+    def setUp(self):
+        from django.core.cache import cache
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:todos_todo_changelist')
+        self.category = category = Category.objects.create(name="Work")
+        Todo.objects.bulk_create([
+            Todo(title=f"Report {i}", category=category) for i in range(20)
+        ])
+        self.meeting = Todo.objects.create(title="Meeting notes")
+    
+    def test_changelist_loads(self):
+        """Test changelist renders with categories joined in"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Meeting notes")
+    
+    def test_changelist_count_is_cached(self):
+        """Test the second page load does not repeat the COUNT query"""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(self.url)
+        with CaptureQueriesContext(connection) as second:
+            self.client.get(self.url)
+        
+        def count_queries(ctx):
+            return [q for q in ctx.captured_queries if 'COUNT(' in q['sql'].upper()]
+        
+        self.assertTrue(count_queries(first))
+        self.assertFalse(count_queries(second))
+    
+    def test_search_by_title_prefix(self):
+        """Test admin search matches case-insensitive title prefixes"""
+        response = self.client.get(self.url, {'q': 'meet'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.meeting])
+    
+    def test_search_by_id(self):
+        """Test admin search matches an exact ID"""
+        response = self.client.get(self.url, {'q': str(self.meeting.pk)})
+        self.assertIn(self.meeting, response.context['cl'].result_list)
+    
+    def test_created_month_filter(self):
+        """Test month drill-down filters by created_at range"""
+        month = timezone.localtime(self.meeting.created_at).strftime('%Y-%m')
+        response = self.client.get(self.url, {'created_month': month})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cl'].result_list), 21)
+        
+        response = self.client.get(self.url, {'created_month': '2000-01'})
+        self.assertEqual(len(response.context['cl'].result_list), 0)
+    
+    def test_category_filter(self):
+        """Test the category column links to an id filter that lists no other categories"""
+        Category.objects.create(name="Unrelated")
+        response = self.client.get(self.url)
+        self.assertContains(response, f'href="?category={self.category.pk}"')
+        self.assertNotContains(response, "Unrelated")
+        response = self.client.get(self.url, {'category': self.category.pk})
+        self.assertEqual(len(response.context['cl'].result_list), 20)
+        self.assertContains(response, "Work")
+        self.assertEqual(self.client.get(self.url, {'category': 'x'}).status_code, 200)
+
+
+class TodoAdminBulkActionTest(TestCase):
+    """
+    Test the set-based bulk actions on the TODO changelist.
+    
+    Scenarios:
+    - Resolve/reopen across all pages in chunks
+    - Reassign category
+    - Add and remove tags
+    - Categories and tags are resolved per owner of the selected TODOs
+    - Tag changes move updated_at and version on
+    - Purge requires confirmation, then deletes in chunks with set-wise statements
+    """
+    
+    def setUp(self):
+        from django.core.cache import cache
+        from .admin import TodoAdmin
+        cache.clear()
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'pass')
+        self.client.force_login(self.admin)
+        self.url = reverse('admin:todos_todo_changelist')
+        Todo.objects.bulk_create([Todo(title=f"Stale {i}") for i in range(250)])
+        self.keep = Todo.objects.create(title="Keep me", is_resolved=True)
+        self.tag = Tag.objects.create(name="stale", slug="stale")
+        self.original_chunk_size = TodoAdmin.bulk_chunk_size
+        TodoAdmin.bulk_chunk_size = 100
+    
+    def tearDown(self):
+        from .admin import TodoAdmin
+        TodoAdmin.bulk_chunk_size = self.original_chunk_size
+    
+    def run_action(self, action, query='', **extra):
+        data = {'action': action, 'select_across': '1', 'index': '0',
+                '_selected_action': [self.keep.pk], **extra}
+        return self.client.post(self.url + query, data, follow=True)
+    
+    def test_resolve_across_pages(self):
+        """Test resolving every filtered TODO reports the batches used"""
+        response = self.run_action('resolve_selected', '?is_resolved__exact=0')
+        self.assertEqual(Todo.objects.filter(is_resolved=False).count(), 0)
+        self.assertContains(response, "Resolved 250 TODOs in 3 batch(es)")
+    
+    def test_resolve_stamps_updated_at(self):
+        """Test bulk updates still advance updated_at"""
+        before = Todo.objects.get(title="Stale 0").updated_at
+        self.run_action('resolve_selected')
+        self.assertGreater(Todo.objects.get(title="Stale 0").updated_at, before)
+    
+    def test_set_category(self):
+        """Test reassigning the category of selected TODOs"""
+        category = Category.objects.create(name="Archive")
+        self.run_action('set_category', category="Archive")
+        self.assertEqual(Todo.objects.filter(category=category).count(), 251)
+        
+        self.run_action('set_category', category="")
+        self.assertEqual(Todo.objects.filter(category__isnull=True).count(), 251)
+    
+    def test_add_and_remove_tags(self):
+        """Test tags are linked and unlinked with bulk statements"""
+        self.run_action('add_tags', tags='stale, missing')
+        self.assertEqual(self.tag.todos.count(), 251)
+        
+        self.run_action('add_tags', tags='stale')
+        self.assertEqual(self.tag.todos.count(), 251)
+        
+        self.run_action('remove_tags', '?is_resolved__exact=0', tags='stale')
+        self.assertEqual(list(self.tag.todos.all()), [self.keep])
+    
+    def test_tag_changes_bump_version(self):
+        """Test bulk tag edits advance updated_at and version like other bulk updates"""
+        from . import bulk
+        todo = Todo.objects.get(title="Stale 0")
+        bulk.add_tags(Todo.objects.filter(pk=todo.pk), [self.tag])
+        tagged = Todo.objects.get(pk=todo.pk)
+        self.assertEqual(tagged.version, todo.version + 1)
+        self.assertGreater(tagged.updated_at, todo.updated_at)
+        bulk.remove_tags(Todo.objects.filter(pk=todo.pk), [self.tag])
+        self.assertEqual(Todo.objects.get(pk=todo.pk).version, todo.version + 2)
+    
+    def test_actions_use_each_owners_rows(self):
+        """Test tags and categories never link TODOs to another owner's rows"""
+        alice = User.objects.create_user('alice', password='pass')
+        bob = User.objects.create_user('bob', password='pass')
+        # The admin works on the default database, whatever the owners' shards.
+        alice_todo = Todo.objects.using('default').create(owner=alice, title="Alice's")
+        bob_todo = Todo.objects.using('default').create(owner=bob, title="Bob's")
+        alice_tag = Tag.objects.using('default').create(owner=alice, name="urgent", slug="urgent")
+        bob_tag = Tag.objects.using('default').create(owner=bob, name="urgent", slug="urgent")
+        alice_category = Category.objects.using('default').create(owner=alice, name="Home")
+        
+        data = {'action': 'add_tags', 'index': '0', 'tags': 'urgent',
+                '_selected_action': [alice_todo.pk, bob_todo.pk]}
+        self.client.post(self.url, data)
+        self.assertEqual(list(alice_todo.tags.all()), [alice_tag])
+        self.assertEqual(list(bob_todo.tags.all()), [bob_tag])
+        
+        response = self.client.post(self.url, {**data, 'action': 'set_category', 'category': "Home"}, follow=True)
+        self.assertEqual(Todo.objects.get(pk=alice_todo.pk).category, alice_category)
+        self.assertIsNone(Todo.objects.get(pk=bob_todo.pk).category)
+        self.assertContains(response, "Recategorized 1 TODOs")
+        self.assertContains(response, "Skipped the TODOs of 1 owner(s)")
+    
+    def test_purge_requires_confirmation(self):
+        """Test purge first shows a confirmation page"""
+        response = self.run_action('purge_selected', '?is_resolved__exact=0')
+        self.assertTemplateUsed(response, 'admin/todos/todo/purge_confirmation.html')
+        self.assertEqual(response.context['count'], 250)
+        self.assertEqual(Todo.objects.count(), 251)
+    
+    def test_purge_deletes_in_chunks(self):
+        """Test confirmed purge deletes only the filtered TODOs"""
+        self.keep.tags.add(self.tag)
+        response = self.run_action('purge_selected', '?is_resolved__exact=0', post='yes')
+        self.assertContains(response, "Purged 250 TODOs in 3 batch(es)")
+        self.assertEqual(list(Todo.objects.all()), [self.keep])
+        self.assertEqual(list(self.tag.todos.all()), [self.keep])
+        self.assertEqual(TodoTombstone.objects.count(), 250)
+    
+    def test_purge_queries_do_not_grow_with_rows(self):
+        """Test each purge chunk is a fixed number of set-wise statements"""
+        from . import bulk
+        queryset = Todo.objects.filter(is_resolved=False)
+        # Chunk ids; then in the chunk's savepoint: ids and owners, subtasks,
+        # tombstones, events (two inserts under SQLite's parameter limit),
+        # tag links, trigrams and rows; then the empty next chunk.
+        with self.assertNumQueries(12):
+            self.assertEqual(bulk.delete_todos(queryset, chunk_size=1000).rows, 250)
+    
+    def test_default_delete_action_removed(self):
+        """Test the per-object delete_selected action is replaced"""
+        response = self.client.get(self.url)
+        choices = dict(response.context['action_form'].fields['action'].choices)
+        self.assertNotIn('delete_selected', choices)
+        self.assertIn('purge_selected', choices)
+
+
 # ============================================
 # INTEGRATION TESTS
 # ============================================
@@ -0,0 +1,90 @@
+"""
+Subtasks.
+
+Every todo stores the ids of its ancestors in ``path`` (see ``Todo.save``),
+so everything below a todo is one range scan of the ``(owner, path)``
+index: fetching a subtree, counting its open todos and its completion are
+single queries whatever the depth, and moving a subtree is one ``UPDATE``
+of its rows.
+"""
+from collections import defaultdict
+
+from .models import Todo
+
+
+# Rows shown under a todo on its detail page.
+SUBTREE_LIMIT = 500
+
+SUBTREE_FIELDS = ('id', 'title', 'is_resolved', 'due_date', 'parent_id', 'path')
+
+
+def progress(todo):
+    """Total, open and resolved descendants of ``todo`` and the percentage resolved."""
+    counts = Todo.objects.using(todo._state.db).subtree(todo, include_self=False).status_counts()
+    counts['percent'] = round(100 * counts['resolved'] / counts['total']) if counts['total'] else None
+    return counts
+
+
+def nested(todo, limit=SUBTREE_LIMIT):
+    """
+    The descendants of ``todo`` as ``values()`` rows in depth-first order,
+    each with its ``level`` below ``todo`` (1 for direct subtasks). Reads at
+    most ``limit`` rows, in one query.
+    """
+    rows = (
+        Todo.objects.using(todo._state.db)
+        .subtree(todo, include_self=False)
+        .order_by('path', 'pk')
+        .values(*SUBTREE_FIELDS)[:limit]
+    )
+    children = defaultdict(list)
+    for row in rows:
+        children[row['parent_id']].append(row)
+    ordered = []
+    stack = [(row, 1) for row in reversed(children[todo.pk])]
+    while stack:
+        row, level = stack.pop()
+        row['level'] = level
+        ordered.append(row)
+        stack.extend((child, level + 1) for child in reversed(children[row['id']]))
+    return ordered
+
+
+def ancestors(todo):
+    """``todo``'s ancestors, root first."""
+    ids = todo.ancestor_ids
+    if not ids:
+        return []
+    found = Todo.objects.using(todo._state.db).in_bulk(ids)
+    return [found[pk] for pk in ids if pk in found]
+
+
+def reattach(using, pks):
+    """
+    Rebuild the paths of the todos ``pks`` just restored from the archive:
+    under their old parent if it is live, at the top level otherwise.
+    """
+    manager = Todo.objects.using(using)
+    parents = dict(manager.filter(pk__in=pks, parent_id__isnull=False).values_list('pk', 'parent_id'))
+    if not parents:
+        return
+    live = dict(manager.filter(pk__in=set(parents.values())).values_list('pk', 'path'))
+    paths = {}
+
+    def path_of(pk):
+        # Parents restored in the same batch are resolved first.
+        if pk not in paths:
+            parent = parents.get(pk)
+            paths[pk] = live.get(pk, '') if parent is None else (
+                f'{path_of(parent)}{parent}/' if parent in live else ''
+            )
+        return paths[pk]
+
+    orphans = [pk for pk, parent in parents.items() if parent not in live]
+    if orphans:
+        manager.filter(pk__in=orphans).update(parent=None)
+    by_path = defaultdict(list)
+    for pk in parents:
+        by_path[path_of(pk)].append(pk)
+    for path, group in by_path.items():
+        manager.filter(pk__in=group).update(path=path)
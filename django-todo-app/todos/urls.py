@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.TodoListView.as_view(), name='todo_list'),
@@ -8,4 +8,20 @@ urlpatterns = [
     path('<int:pk>/update/', views.TodoUpdateView.as_view(), name='todo_update'),
     path('<int:pk>/delete/', views.TodoDeleteView.as_view(), name='todo_delete'),
     path('<int:pk>/toggle/', views.todo_toggle, name='todo_toggle'),
+    path('<int:pk>/title/', views.todo_title, name='todo_title'),
+    path('<int:pk>/move/', views.todo_move, name='todo_move'),
+    path('archive/<int:pk>/restore/', views.todo_restore, name='todo_restore'),
+    path('events/', views.todo_events, name='todo_events'),
+    path('analytics/', views.todo_analytics, name='todo_analytics'),
+    path('calendar/', views.todo_calendar, name='todo_calendar'),
+    path('calendar/week/', views.todo_calendar, {'period': 'week'}, name='todo_calendar_week'),
+    path('autocomplete/categories/', views.category_autocomplete, name='category_autocomplete'),
+    path('autocomplete/tags/', views.tag_autocomplete, name='tag_autocomplete'),
+    path('autocomplete/todos/', views.todo_autocomplete, name='todo_autocomplete'),
+    path('api/todos/', api.todo_collection, name='api_todo_list'),
+    path('api/todos/<int:pk>/', api.todo_resource, name='api_todo_detail'),
+    path('api/todos/<int:pk>/subtree/', api.subtree, name='api_todo_subtree'),
+    path('api/changes/', api.changes, name='api_changes'),
+    path('api/analytics/', api.analytics, name='api_analytics'),
+    path('api/calendar/', api.calendar, name='api_calendar'),
 ]
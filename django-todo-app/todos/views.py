@@ -1,66 +1,128 @@
+import asyncio
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView
-from django.urls import reverse_lazy
-from django.contrib import messages
-from django.db.models import Q, Count
+from django.urls import reverse, reverse_lazy
 from django.utils import timezone
-from django.views.decorators.http import require_POST
-from .models import Todo, Category, Tag
-from .forms import TodoForm
+from django.contrib import messages
+from django.db import transaction
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
+from .archive import WithArchive, restore_todos
+from .cache import attach_categories
+from .deadline import QueryTimeout, query_deadline
+from .events import hub
+from .pagination import FilteredCountPaginator, filter_signature
+from .models import MANUAL_SORT, ArchivedTodo, Todo, Category, Tag, VersionConflict
+from .ranks import move
+from .rollups import report, report_days
+from .schedule import by_due_day, month_grid, parse_date, week_range, weeks
+from .tree import ancestors, nested, progress
+from .forms import TodoForm, TodoTitleForm
+from .routers import owner_id_for
+
+
+def wants_json(request):
+    return request.headers.get('Accept', '').startswith('application/json')
+
+
+def wants_fragment(request):
+    """
+    True when the client swaps the result into the page itself: htmx
+    (``HX-Request``) gets an HTML fragment, ``Accept: application/json``
+    gets the same as JSON. Everyone else gets the redirect.
+    """
+    return request.headers.get('HX-Request') == 'true' or wants_json(request)
+
 
+def row_response(request, todo=None, status=200):
+    """The updated row (none once deleted) plus fresh counters."""
+    counts = Todo.objects.for_owner(request.user).status_counts()
+    if todo is not None:
+        attach_categories([todo])
+    context = {'todo': todo, 'counts': counts}
+    if wants_json(request):
+        row = render_to_string('todos/_todo_row.html', context, request) if todo else ''
+        return JsonResponse({'id': todo.pk if todo else None, 'row': row, 'counts': counts}, status=status)
+    return render(request, 'todos/_todo_fragment.html', context, status=status)
 
-class TodoListView(ListView):
+
+class OwnedTodoMixin:
+    """Scope the view to the current user's todos (anonymous users share the unowned ones)."""
+    
+    def get_queryset(self):
+        return Todo.objects.for_owner(self.request.user)
+
+
+class TodoFormMixin:
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['owner'] = self.request.user
+        return kwargs
+
+
+class TodoListView(OwnedTodoMixin, ListView):
     model = Todo
     template_name = 'todos/todo_list.html'
     context_object_name = 'todos'
     paginate_by = 10
+    paginator_class = FilteredCountPaginator
+    timed_out = False
+    
+    def get(self, request, *args, **kwargs):
+        # Searches and sorts come from the URL; a query that outruns the
+        # budget is aborted and the page asks for a narrower search.
+        try:
+            with query_deadline(self.get_queryset().db, 'todo_list'):
+                return super().get(request, *args, **kwargs)
+        except QueryTimeout:
+            self.timed_out = True
+            self.paginate_by = None
+            return super().get(request, *args, **kwargs)
     
     def get_queryset(self):
         queryset = super().get_queryset()
-        
-        filter_type = self.request.GET.get('filter', 'all')
-        
-        if filter_type == 'active':
-            queryset = queryset.filter(is_resolved=False)
-        elif filter_type == 'resolved':
-            queryset = queryset.filter(is_resolved=True)
-        elif filter_type == 'overdue':
-            queryset = queryset.filter(
-                is_resolved=False,
-                due_date__lt=timezone.now()
-            )
-        
-        search_query = self.request.GET.get('search', '')
-        if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query) |
-                Q(description__icontains=search_query)
-            )
-        
-        category_id = self.request.GET.get('category')
-        if category_id:
-            queryset = queryset.filter(category_id=category_id)
-        
-        sort_by = self.request.GET.get('sort', '-created_at')
-        queryset = queryset.order_by(sort_by)
-        
+        if self.timed_out:
+            return queryset.none()
+        queryset = queryset.filter_by_params(self.request.GET)
+        # ?archived=1 includes the archive tier in the list.
+        if self.request.GET.get('archived'):
+            archived = ArchivedTodo.objects.for_owner(self.request.user).filter_by_params(self.request.GET)
+            return WithArchive(queryset, archived)
         return queryset
     
+    def get_paginator(self, queryset, per_page, **kwargs):
+        # Paging through a result set counts it once (todos.pagination).
+        return super().get_paginator(
+            queryset, per_page,
+            signature=filter_signature(self.request.GET),
+            owner_id=owner_id_for(self.request.user),
+            **kwargs,
+        )
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         
-        context['total_count'] = Todo.objects.count()
-        context['active_count'] = Todo.objects.filter(is_resolved=False).count()
-        context['resolved_count'] = Todo.objects.filter(is_resolved=True).count()
-        context['overdue_count'] = Todo.objects.filter(
-            is_resolved=False,
-            due_date__lt=timezone.now()
-        ).count()
-        
-        context['categories'] = Category.objects.annotate(
-            todo_count=Count('todos')
+        context['timed_out'] = self.timed_out
+        context['show_archived'] = bool(self.request.GET.get('archived'))
+        context['live_events'] = live_events_enabled() and not context['show_archived']
+        context['todos'] = context['object_list'] = attach_categories(
+            list(context['object_list'])
         )
         
+        counts = context['counts'] = Todo.objects.for_owner(self.request.user).status_counts()
+        context['total_count'] = counts['total']
+        context['active_count'] = counts['active']
+        context['resolved_count'] = counts['resolved']
+        context['overdue_count'] = counts['overdue']
+        
         context['filter_type'] = self.request.GET.get('filter', 'all')
         context['search_query'] = self.request.GET.get('search', '')
         context['current_sort'] = self.request.GET.get('sort', '-created_at')
@@ -68,18 +130,22 @@ class TodoListView(ListView):
         return context
 
 
-class TodoDetailView(DetailView):
+class TodoDetailView(OwnedTodoMixin, DetailView):
     model = Todo
     template_name = 'todos/todo_detail.html'
     context_object_name = 'todo'
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        attach_categories([self.object])
         context['is_overdue'] = self.object.is_overdue()
+        context['ancestors'] = ancestors(self.object)
+        context['subtasks'] = nested(self.object)
+        context['progress'] = progress(self.object) if context['subtasks'] else None
         return context
 
 
-class TodoCreateView(CreateView):
+class TodoCreateView(TodoFormMixin, CreateView):
     model = Todo
     form_class = TodoForm
     template_name = 'todos/todo_form.html'
@@ -91,26 +157,42 @@ class TodoCreateView(CreateView):
             self.request,
             f'TODO "{self.object.title}" created successfully!'
         )
+        if form.similar_todos_warning():
+            messages.warning(self.request, form.similar_todos_warning())
         return response
     
+    def get_initial(self):
+        initial = super().get_initial()
+        # "Add subtask" links pass the parent along.
+        if self.request.GET.get('parent', '').isdigit():
+            initial['parent'] = self.request.GET['parent']
+        return initial
+    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['action'] = 'Create'
         return context
 
 
-class TodoUpdateView(UpdateView):
+class TodoUpdateView(OwnedTodoMixin, TodoFormMixin, UpdateView):
     model = Todo
     form_class = TodoForm
     template_name = 'todos/todo_form.html'
     success_url = reverse_lazy('todo_list')
     
     def form_valid(self, form):
-        response = super().form_valid(form)
+        try:
+            with transaction.atomic(using=self.object._state.db):
+                response = super().form_valid(form)
+        except VersionConflict as conflict:
+            form.add_conflict(conflict)
+            return self.render_to_response(self.get_context_data(form=form), status=409)
         messages.success(
             self.request,
             f'TODO "{self.object.title}" updated successfully!'
         )
+        if form.similar_todos_warning():
+            messages.warning(self.request, form.similar_todos_warning())
         return response
     
     def get_context_data(self, **kwargs):
@@ -120,12 +202,18 @@ class TodoUpdateView(UpdateView):
         return context
 
 
-class TodoDeleteView(DeleteView):
+class TodoDeleteView(OwnedTodoMixin, DeleteView):
     model = Todo
     template_name = 'todos/todo_confirm_delete.html'
     success_url = reverse_lazy('todo_list')
     context_object_name = 'todo'
     
+    def form_valid(self, form):
+        if wants_fragment(self.request):
+            self.object.delete()
+            return row_response(self.request)
+        return super().form_valid(form)
+    
     def delete(self, request, *args, **kwargs):
         todo = self.get_object()
         messages.success(request, f'TODO "{todo.title}" deleted successfully!')
@@ -134,11 +222,210 @@ class TodoDeleteView(DeleteView):
 
 @require_POST
 def todo_toggle(request, pk):
-    todo = get_object_or_404(Todo, pk=pk)
+    todo = get_object_or_404(Todo.objects.for_owner(request.user), pk=pk)
     todo.is_resolved = not todo.is_resolved
-    todo.save()
+    try:
+        with transaction.atomic(using=todo._state.db):
+            todo.save(update_fields=['is_resolved', 'updated_at'])
+    except VersionConflict as conflict:
+        # Someone else got there first; show them what is there now.
+        if wants_fragment(request):
+            return row_response(request, conflict.current)
+        messages.error(request, f'TODO "{conflict.current.title}" was changed meanwhile, nothing toggled.')
+        return redirect('todo_list')
+    
+    if wants_fragment(request):
+        return row_response(request, todo)
     
     status = "resolved" if todo.is_resolved else "reopened"
     messages.success(request, f'TODO "{todo.title}" {status}!')
     
     return redirect('todo_list')
+
+
+@require_POST
+def todo_move(request, pk):
+    """
+    Hand-order the list: put the todo between ``after`` and ``before``, the
+    ids of its new neighbours (leave one out at the ends). One row is written.
+    """
+    todos = Todo.objects.for_owner(request.user)
+    todo = get_object_or_404(todos, pk=pk)
+    ids = {side: request.POST.get(side, '') for side in ('after', 'before')}
+    if not all(value.isdigit() for value in ids.values() if value):
+        return JsonResponse({'error': 'Give the ids of the new neighbours.'}, status=400)
+    found = todos.in_bulk([int(value) for value in ids.values() if value])
+    neighbours = {side: found.get(int(value)) for side, value in ids.items() if value}
+    if None in neighbours.values():
+        return JsonResponse({'error': 'A neighbour does not exist.'}, status=400)
+    try:
+        with transaction.atomic(using=todo._state.db):
+            move(todo, **neighbours)
+    except ValueError:
+        return JsonResponse({'error': 'The neighbours are out of order; reload the list.'}, status=409)
+    except VersionConflict:
+        return JsonResponse({'error': 'The TODO was changed meanwhile; try again.'}, status=409)
+    if wants_json(request):
+        return JsonResponse({'id': todo.pk, 'rank': todo.rank})
+    return redirect(f"{reverse('todo_list')}?sort={MANUAL_SORT}")
+
+
+@require_http_methods(['GET', 'POST'])
+def todo_title(request, pk):
+    """Inline title edit: GET returns the editor fragment, POST saves it."""
+    todo = get_object_or_404(Todo.objects.for_owner(request.user), pk=pk)
+    form = TodoTitleForm(request.POST or None, instance=todo, owner=request.user)
+    
+    if request.method == 'POST':
+        if form.is_valid():
+            try:
+                with transaction.atomic(using=todo._state.db):
+                    form.save()
+            except VersionConflict as conflict:
+                form.add_conflict(conflict)
+                if wants_json(request):
+                    return JsonResponse(
+                        {'errors': form.errors, 'version': conflict.current.version}, status=409
+                    )
+            else:
+                if wants_fragment(request):
+                    response = row_response(request, todo)
+                    if not wants_json(request):
+                        # The editor targets itself; the saved row replaces the whole row.
+                        response['HX-Retarget'] = f'.todo-item[data-todo-id="{todo.pk}"]'
+                    return response
+                messages.success(request, f'TODO "{todo.title}" renamed!')
+                return redirect('todo_list')
+        elif wants_json(request):
+            return JsonResponse({'errors': form.errors}, status=400)
+    
+    # htmx only swaps 2xx responses, so the editor comes back with its errors.
+    return render(request, 'todos/_todo_title_form.html', {'todo': todo, 'form': form})
+
+
+@require_POST
+def todo_restore(request, pk):
+    archived = ArchivedTodo.objects.for_owner(request.user).filter(pk=pk)
+    todo = get_object_or_404(archived)
+    restore_todos(archived)
+    messages.success(request, f'TODO "{todo.title}" restored from the archive!')
+    return redirect('todo_detail', pk=pk)
+
+
+@require_GET
+def todo_analytics(request):
+    """Completion trends read from the daily rollups (todos.rollups)."""
+    days = report_days(request.GET.get('days'))
+    context = report(request.user, days)
+    context['period'] = days
+    context['peak'] = max([1] + [day['created'] + day['resolved'] for day in context['days']])
+    return render(request, 'todos/analytics.html', context)
+
+
+@require_GET
+def todo_calendar(request, period='month'):
+    """Month (or week) grid of todos by due day, around ``?date=YYYY-MM-DD``."""
+    today = timezone.localdate()
+    anchor = parse_date(request.GET.get('date'), today)
+    if period == 'week':
+        start, end = week_range(anchor)
+        previous, following = anchor - timedelta(days=7), anchor + timedelta(days=7)
+        per_day = 20
+    else:
+        start, end = month_grid(anchor.year, anchor.month)
+        previous = (anchor.replace(day=1) - timedelta(days=1)).replace(day=1)
+        following = (anchor.replace(day=28) + timedelta(days=4)).replace(day=1)
+        per_day = 4
+    days = by_due_day(Todo.objects.for_owner(request.user), start, end, per_day)
+    return render(request, 'todos/calendar.html', {
+        'period': period,
+        'anchor': anchor,
+        'today': today,
+        'weeks': weeks(start, end, days),
+        'previous': previous,
+        'following': following,
+    })
+
+
+AUTOCOMPLETE_LIMIT = 20
+
+
+def _autocomplete(request, queryset, label='name'):
+    term = request.GET.get('q', '').strip()
+    try:
+        limit = min(int(request.GET.get('limit', AUTOCOMPLETE_LIMIT)), 50)
+    except ValueError:
+        limit = AUTOCOMPLETE_LIMIT
+    if not term or limit < 1:
+        return JsonResponse({'results': [], 'more': False})
+    matches = queryset.title_prefix(term) if label == 'title' else queryset.name_prefix(term)
+    rows = list(matches.values_list('pk', label)[:limit + 1])
+    return JsonResponse({
+        'results': [{'id': pk, 'text': name} for pk, name in rows[:limit]],
+        'more': len(rows) > limit,
+    })
+
+
+@require_GET
+def category_autocomplete(request):
+    return _autocomplete(request, Category.objects.for_owner(request.user))
+
+
+@require_GET
+def tag_autocomplete(request):
+    return _autocomplete(request, Tag.objects.for_owner(request.user))
+
+
+@require_GET
+def todo_autocomplete(request):
+    return _autocomplete(request, Todo.objects.for_owner(request.user), 'title')
+
+
+EVENT_HEARTBEAT_SECONDS = 15
+
+
+def live_events_enabled():
+    """``TODO_LIVE_EVENTS``: whether the event stream is served."""
+    return getattr(settings, 'TODO_LIVE_EVENTS', False)
+
+
+async def todo_events(request):
+    """
+    Server-sent events for the current user's todos.
+    
+    Each ``todo`` event carries the todo id, the change type, the changed
+    fields and fresh status counts (computed once per burst of events).
+    Needs an ASGI server: under WSGI the stream would hold a worker without
+    ever flushing, so unless ``TODO_LIVE_EVENTS`` is on and the request came
+    through ASGI it answers 204, which tells ``EventSource`` not to reconnect.
+    """
+    if not live_events_enabled() or not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    user = await request.auser()
+    owner_id = owner_id_for(user)
+    queue = hub.subscribe(owner_id)
+    status_counts = sync_to_async(Todo.objects.for_owner(user).status_counts)
+    
+    async def stream():
+        try:
+            yield 'retry: 3000\n\n'
+            while True:
+                try:
+                    batch = [await asyncio.wait_for(queue.get(), EVENT_HEARTBEAT_SECONDS)]
+                except asyncio.TimeoutError:
+                    yield ': keep-alive\n\n'
+                    continue
+                while not queue.empty():
+                    batch.append(queue.get_nowait())
+                counts = await status_counts()
+                for event in batch:
+                    data = {key: value for key, value in event.items() if key != 'owner'}
+                    data['counts'] = counts
+                    yield f'event: todo\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+        finally:
+            hub.unsubscribe(owner_id, queue)
+    
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
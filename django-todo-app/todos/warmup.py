@@ -0,0 +1,171 @@
+"""
+Warm-up for serving processes.
+
+A fresh process pays for Django's lazy work on its first request: the URL
+patterns are imported and the reverse map is built, templates are read and
+compiled, views, translations and time zones are loaded, and database
+connections are opened. ``preload`` does that work before the first
+request. Under the preforking server (``todoproject/gunicorn.conf.py``) it
+runs once in the master, so every forked worker starts with it done;
+``after_fork`` then opens the worker's own database connections.
+
+``probe`` is the child process of ``manage.py measure_startup``.
+"""
+import io
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.urls import get_resolver, reverse
+
+
+logger = logging.getLogger('todos.warmup')
+
+
+def template_names():
+    """Every template of the todos app and of the project's template DIRS."""
+    roots = [Path(apps.get_app_config('todos').path) / 'templates']
+    for engine in settings.TEMPLATES:
+        roots.extend(Path(directory) for directory in engine.get('DIRS', []))
+    return sorted({
+        path.relative_to(root).as_posix()
+        for root in roots if root.is_dir()
+        for path in root.rglob('*.html')
+    })
+
+
+def warm_templates():
+    """Load and compile the templates into the cached template loader."""
+    from django.template.loader import get_template
+    names = template_names()
+    for name in names:
+        get_template(name)
+    return len(names)
+
+
+def warm_urls():
+    """Build the resolver's reverse map and reverse every named ``todos`` URL once."""
+    from todos import urls
+    resolver = get_resolver()
+    resolver.resolve('/')
+    names = 0
+    for pattern in urls.urlpatterns:
+        if pattern.name:
+            # Sample values for the pattern's converters (all are ``<int:pk>``).
+            reverse(pattern.name, kwargs={name: 1 for name in pattern.pattern.converters})
+            names += 1
+    return names
+
+
+def warm_connections():
+    """Open a connection to every database; returns the aliases connected."""
+    opened = []
+    for alias in connections:
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            logger.warning('Could not connect to database %r during warm-up.', alias, exc_info=True)
+        else:
+            opened.append(alias)
+    return opened
+
+
+def _host():
+    hosts = [host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*']
+    return hosts[0] if hosts else 'localhost'
+
+
+def get(application, path):
+    """Run a GET of ``path`` through the WSGI ``application``; returns the status code."""
+    host = _host()
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': host,
+        'SERVER_PORT': '443' if settings.SECURE_SSL_REDIRECT else '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': host,
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'https' if settings.SECURE_SSL_REDIRECT else 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    status = []
+    response = application(environ, lambda code, headers, exc_info=None: status.append(code))
+    try:
+        for _ in response:
+            pass
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
+    return int(status[0].split()[0])
+
+
+def is_enabled():
+    """``TODO_WARMUP``; on by default outside DEBUG."""
+    return getattr(settings, 'TODO_WARMUP', not settings.DEBUG)
+
+
+def preload(application):
+    """
+    Warm this process up for ``application``. Always fills the reference-data
+    caches; the rest runs when ``TODO_WARMUP`` is on. Failures are logged,
+    never raised. Leaves no database connection open, so the process can
+    fork safely afterwards.
+    """
+    from .cache import warm_reference_caches
+    started = time.perf_counter()
+    try:
+        warm_reference_caches()
+        if is_enabled():
+            templates = warm_templates()
+            routes = warm_urls()
+            statuses = [get(application, path) for path in getattr(settings, 'TODO_WARMUP_PATHS', ('/',))]
+            logger.info(
+                'Warmed up in %.0f ms: %d templates, %d URL names, requests %s.',
+                (time.perf_counter() - started) * 1000, templates, routes, statuses,
+            )
+    except Exception:
+        logger.warning('Warm-up failed; the first requests will be slower.', exc_info=True)
+    finally:
+        connections.close_all()
+
+
+def after_fork():
+    """Per-worker warm-up: open the worker's own database connections."""
+    if is_enabled():
+        warm_connections()
+
+
+def probe(started, path='/'):
+    """
+    Import the WSGI application as a fresh worker would and time it and two
+    requests for ``path``; prints one JSON object. ``started`` is the
+    ``time.perf_counter()`` taken before any Django import.
+    """
+    from todoproject.wsgi import application
+    imported = time.perf_counter()
+    after_fork()
+    ready = time.perf_counter()
+    first_status = get(application, path)
+    first = time.perf_counter()
+    get(application, path)
+    second = time.perf_counter()
+    print(json.dumps({
+        'warmup': is_enabled(),
+        'status': first_status,
+        'import_ms': (imported - started) * 1000,
+        'fork_ms': (ready - imported) * 1000,
+        'first_request_ms': (first - ready) * 1000,
+        'second_request_ms': (second - first) * 1000,
+    }))
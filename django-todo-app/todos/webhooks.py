@@ -0,0 +1,143 @@
+"""
+Webhook delivery of outbox events.
+
+A pass collects, for every active endpoint that is not backing off, up to
+``batch_size`` events per shard after the endpoint's cursors and POSTs them
+as one JSON batch. Endpoints are delivered concurrently on a thread pool;
+only the HTTP calls run in the pool, the database is read and updated by the
+caller. A failed batch is retried with the same events after an exponential
+backoff, so delivery is at-least-once and in order per shard. Only settled
+events are read (``todos.outbox.settled``), so a cursor never moves past an
+event whose transaction has yet to commit. A new endpoint starts with every
+event still in the outbox.
+"""
+import hashlib
+import hmac
+import json
+import urllib.error
+import urllib.request
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import OutboxEvent, WebhookEndpoint
+from .outbox import settled
+from .routers import get_shards
+
+
+DELIVERY_BATCH_SIZE = 100
+DELIVERY_TIMEOUT = 5
+DELIVERY_WORKERS = 8
+BACKOFF_BASE = 10
+BACKOFF_MAX = 3600
+
+Delivery = namedtuple('Delivery', ['endpoint', 'events', 'error'])
+Lag = namedtuple('Lag', ['pending', 'seconds'])
+
+
+def backoff(failures):
+    return timedelta(seconds=min(BACKOFF_BASE * 2 ** (failures - 1), BACKOFF_MAX))
+
+
+def sign(secret, body):
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+def pending_events(endpoint, batch_size=DELIVERY_BATCH_SIZE):
+    """Return ``(events, cursors)``: the next batch and the cursors after it."""
+    events = []
+    cursors = dict(endpoint.cursors)
+    before = settled()
+    for using in get_shards():
+        rows = list(
+            OutboxEvent.objects.using(using)
+            .filter(pk__gt=cursors.get(using, 0), created_at__lt=before)
+            .order_by('pk')
+            .values('pk', 'event_type', 'payload', 'created_at')[:batch_size]
+        )
+        if rows:
+            cursors[using] = rows[-1]['pk']
+        events.extend(
+            {
+                'id': f'{using}:{row["pk"]}',
+                'type': row['event_type'],
+                'created_at': row['created_at'],
+                'data': row['payload'],
+            }
+            for row in rows
+        )
+    return events, cursors
+
+
+def endpoint_lag(endpoint, now=None):
+    """Undelivered events for ``endpoint`` and the age of the oldest, in seconds."""
+    now = now or timezone.now()
+    pending, oldest = 0, None
+    for using in get_shards():
+        undelivered = OutboxEvent.objects.using(using).filter(pk__gt=endpoint.cursors.get(using, 0))
+        pending += undelivered.count()
+        first = undelivered.order_by('pk').values_list('created_at', flat=True).first()
+        if first and (oldest is None or first < oldest):
+            oldest = first
+    return Lag(pending, (now - oldest).total_seconds() if oldest else 0)
+
+
+def post(url, body, secret='', timeout=DELIVERY_TIMEOUT):
+    """POST ``body``; returns ``None`` on a 2xx response, otherwise the error."""
+    headers = {'Content-Type': 'application/json'}
+    if secret:
+        headers['X-Todo-Signature'] = sign(secret, body)
+    request = urllib.request.Request(url, data=body, headers=headers, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=timeout):
+            return None
+    except urllib.error.HTTPError as exc:
+        return f'HTTP {exc.code}'
+    except (urllib.error.URLError, OSError) as exc:
+        return str(getattr(exc, 'reason', exc))
+
+
+def deliver_pending(batch_size=DELIVERY_BATCH_SIZE, workers=DELIVERY_WORKERS,
+                    timeout=DELIVERY_TIMEOUT, now=None):
+    """Run one delivery pass; returns a ``Delivery`` per endpoint that had events."""
+    now = now or timezone.now()
+    endpoints = WebhookEndpoint.objects.filter(is_active=True).filter(
+        Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now)
+    )
+    jobs = []
+    for endpoint in endpoints:
+        events, cursors = pending_events(endpoint, batch_size)
+        if events:
+            body = json.dumps({'events': events}, cls=DjangoJSONEncoder).encode()
+            jobs.append((endpoint, events, cursors, body))
+    if not jobs:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+        futures = [
+            pool.submit(post, endpoint.url, body, endpoint.secret, timeout)
+            for endpoint, _, _, body in jobs
+        ]
+        errors = [future.result() for future in futures]
+
+    deliveries = []
+    for (endpoint, events, cursors, _), error in zip(jobs, errors):
+        if error is None:
+            endpoint.cursors = cursors
+            endpoint.failures = 0
+            endpoint.next_attempt_at = None
+            endpoint.last_delivered_at = now
+            endpoint.last_error = ''
+        else:
+            endpoint.failures += 1
+            endpoint.next_attempt_at = now + backoff(endpoint.failures)
+            endpoint.last_error = error
+        endpoint.save(update_fields=[
+            'cursors', 'failures', 'next_attempt_at', 'last_delivered_at', 'last_error',
+        ])
+        deliveries.append(Delivery(endpoint, len(events), error))
+    return deliveries
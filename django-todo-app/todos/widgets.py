@@ -0,0 +1,68 @@
+from django import forms
+from django.core.exceptions import ValidationError
+from django.urls import reverse
+
+
+class LazyChoiceMixin:
+    """
+    Model choice widget that renders only the currently selected options.
+
+    The remaining choices are fetched on demand from the JSON endpoint named
+    by ``url_name``, so rendering the form never loads the whole table.
+    """
+
+    def __init__(self, url_name, attrs=None):
+        super().__init__(attrs)
+        self.url_name = url_name
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs=extra_attrs)
+        attrs['data-autocomplete-url'] = reverse(self.url_name)
+        return attrs
+
+    def selected_keys(self, value):
+        """The submitted values that are valid keys; junk is left to the field's own validation."""
+        field = self.choices.field
+        model_field = self.choices.queryset.model._meta.pk
+        keys = set()
+        for v in value:
+            if str(v) in field.empty_values:
+                continue
+            try:
+                key = model_field.to_python(v)
+                # Range validators: keys the database cannot store are junk too.
+                model_field.run_validators(key)
+            except (ValidationError, ValueError, TypeError):
+                continue
+            keys.add(key)
+        return keys
+
+    def optgroups(self, name, value, attr=None):
+        options = []
+        selected_choices = self.selected_keys(value)
+        if not self.is_required and not self.allow_multiple_selected:
+            options.append(self.create_option(
+                name, '', self.choices.field.empty_label or '', not selected_choices, 0,
+            ))
+        if selected_choices:
+            for obj in self.choices.queryset.filter(pk__in=selected_choices):
+                options.append(self.create_option(
+                    name,
+                    obj.pk,
+                    self.choices.field.label_from_instance(obj),
+                    True,
+                    len(options),
+                ))
+        return [(None, options, 0)]
+
+    @property
+    def media(self):
+        return forms.Media(js=['todos/js/autocomplete.js'])
+
+
+class LazySelect(LazyChoiceMixin, forms.Select):
+    pass
+
+
+class LazySelectMultiple(LazyChoiceMixin, forms.SelectMultiple):
+    pass